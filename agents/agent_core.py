@@ -1,30 +1,282 @@
-from agents.mode_student import transform as student_transform
-from agents.mode_researcher import transform as researcher_transform
-from agents.mode_professional import transform as professional_transform
-from agents.gemini_client import generate_response
-from utils.fetcher import fetch_webpage
-from utils.dom_parser import parse_webpage, get_text_content
+import asyncio
+import contextvars
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+from agents import mode_student, mode_researcher, mode_professional, long_document
+from agents.prompt_builder import build_update_prompt, format_blocks, DEFAULT_TOKEN_BUDGET
+from agents.result_format import partial_schema
+from agents.gemini_client import generate_response, generate_response_async, generate_response_stream, generate_response_stream_async, parse_json_response, JSONFieldStream, MODEL_NAME
+from agents.gemini_client import GeminiError, create_cached_context, create_cached_context_async, delete_cached_context, estimate_tokens
+from agents.gemini_client import get_metrics as get_gemini_metrics, routing_table as gemini_routing_table
+from utils.cache import TTLCache
+from utils.context_store import create_context_store
+from utils.fetcher import fetch_webpage, fetch_webpage_async, host_limiter, FETCH_PER_HOST, FETCH_TEXT_LIMIT
+from utils.fetcher import get_metrics as get_fetch_metrics
+from utils.page_cache import get_page_cache, normalize_url
+from utils.concurrency import host_of
+from utils.metrics import current_operation, operation, record_stage, register_collector, stage
+from utils.dom_parser import StreamingExtractor, cut_text
+from utils.text_index import index_page, search, format_chunks, index_chunks
+from utils.section_diff import page_blocks, block_hashes, diff_blocks, removed_title
+from utils.section_index import build_section_index, entry_text, lookup as lookup_section, normalize as normalize_label
+from utils.page_model import CompactPage
+from utils.singleflight import SingleFlight
+from utils.prefetch import Prefetcher
 
-analysis_context_cache = {}
+MODES = {
+    "student": mode_student,
+    "researcher": mode_researcher,
+    "professional": mode_professional
+}
 
-def analyze_webpage(url, mode):
-    """Main agent function to analyze a webpage based on mode"""
-    
-    html = fetch_webpage(url)
+request_flights = SingleFlight(timeout=float(os.environ.get('COALESCE_TIMEOUT', 120)))
+
+CHAT_TOP_K = int(os.environ.get('CHAT_TOP_K', 4))
+CHAT_CACHE_TTL = int(os.environ.get('CHAT_CACHE_TTL', 1800))
+CHAT_CACHE_MIN_TOKENS = int(os.environ.get('CHAT_CACHE_MIN_TOKENS', 4096))
+CHAT_CACHE_MAX_TOKENS = int(os.environ.get('CHAT_CACHE_MAX_TOKENS', 32000))
+CHAT_CACHE_EXPIRY_MARGIN = 60
+CHAT_CACHE_REJECTED_STATUSES = {400, 403, 404}
+
+INCREMENTAL_MAX_CHANGE = float(os.environ.get('INCREMENTAL_MAX_CHANGE', 0.3))
+INCREMENTAL_MAX_UPDATES = int(os.environ.get('INCREMENTAL_MAX_UPDATES', 5))
+
+LONG_DOC_MIN_TOKENS = int(os.environ.get('LONG_DOC_MIN_TOKENS', 8000))
+LONG_DOC_CONCURRENCY = int(os.environ.get('LONG_DOC_CONCURRENCY', 8))
+LONG_DOC_TEXT_LIMIT = int(os.environ.get('LONG_DOC_TEXT_LIMIT', 1024 * 1024))
+# Page text kept in the stored context and sent in a single-prompt analysis
+CONTEXT_TEXT_LIMIT = 15000
+
+# Keep only the page's main content block in parsed output when it can be found confidently
+MAIN_CONTENT_ONLY = int(os.environ.get('MAIN_CONTENT_ONLY', 1))
+
+PREFETCH_LINKS = int(os.environ.get('PREFETCH_LINKS', 3))
+PREFETCH_ANALYZE = int(os.environ.get('PREFETCH_ANALYZE', 0))
+PREFETCH_WAIT = float(os.environ.get('PREFETCH_WAIT', 30))
+PREFETCH_MAX_ACTIVE = int(os.environ.get('PREFETCH_MAX_ACTIVE', 8))
+PREFETCH_MAX_LLM_IN_FLIGHT = int(os.environ.get('PREFETCH_MAX_LLM_IN_FLIGHT', 4))
+
+chat_cache_cleanup = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-cache-cleanup')
+
+def release_chat_caches(url, context):
+    """Delete the Gemini cached contents registered for a context that is evicted or replaced"""
+    for session in (context or {}).get("chat_caches", {}).values():
+        if session.get("name"):
+            chat_cache_cleanup.submit(delete_cached_context, session["name"])
+
+context_store = create_context_store(on_evict=release_chat_caches)
+
+missing_section_stats = {"local": 0, "cached": 0, "generated": 0}
+missing_section_lock = threading.Lock()
+
+incremental_stats = {"unchanged": 0, "updated": 0, "full": 0}
+incremental_lock = threading.Lock()
+
+analysis_result_cache = TTLCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 512)),
+    ttl=int(os.environ.get('RESULT_CACHE_TTL', 3600))
+)
+
+chunk_summary_cache = TTLCache(
+    max_entries=int(os.environ.get('CHUNK_CACHE_MAX_ENTRIES', 2048)),
+    ttl=int(os.environ.get('CHUNK_CACHE_TTL', 86400))
+)
+
+def prefetch_overloaded(url):
+    """Whether speculative work should give way: Gemini busy or failing, many requests running, or the host's fetch slots nearly used"""
+    gemini = get_gemini_metrics()
+    return (
+        gemini["in_flight"] >= PREFETCH_MAX_LLM_IN_FLIGHT
+        or gemini["circuit_state"] != "closed"
+        or request_flights.get_stats()["in_flight"] >= PREFETCH_MAX_ACTIVE
+        or host_limiter.in_use(host_of(url)) >= max(FETCH_PER_HOST - 1, 1)
+    )
+
+prefetcher = Prefetcher(
+    workers=int(os.environ.get('PREFETCH_WORKERS', 2)) if PREFETCH_LINKS > 0 else 0,
+    max_queued=int(os.environ.get('PREFETCH_QUEUE', 16)),
+    ttl=int(os.environ.get('PREFETCH_TTL', 300)),
+    overloaded=prefetch_overloaded
+)
+
+def collect_pipeline_metrics():
+    """Cache hit ratios, coalescing, fetch and in-flight Gemini call gauges for /metrics"""
+    caches = {
+        "page": get_page_cache().get_stats(),
+        "result": analysis_result_cache.get_stats(),
+        "context": context_store.get_stats(),
+        "chunk": chunk_summary_cache.get_stats()
+    }
+    for stats in caches.values():
+        lookups = stats["hits"] + stats.get("revalidated", 0) + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats.get("revalidated", 0)) / lookups if lookups else 0.0
+    gemini = get_gemini_metrics()
+    routing = gemini_routing_table()
+    fetch = get_fetch_metrics()
+    flights = request_flights.get_stats()
+    prefetch = prefetcher.get_stats()
+    return [
+        ("cogniparse_cache_hit_ratio", "gauge", "Share of lookups answered from each cache",
+         [({"cache": name}, stats["hit_ratio"]) for name, stats in caches.items()]),
+        ("cogniparse_cache_entries", "gauge", "Entries currently held by each cache",
+         [({"cache": name}, stats["entries"]) for name, stats in caches.items()]),
+        ("cogniparse_llm_in_flight", "gauge", "Gemini calls currently in flight",
+         [({}, gemini["in_flight"])]),
+        ("cogniparse_llm_circuit_open", "gauge", "1 while the Gemini circuit breaker is not closed",
+         [({}, 0 if gemini["circuit_state"] == "closed" else 1)]),
+        ("cogniparse_llm_calls_total", "counter", "Gemini call attempts by outcome",
+         [({"outcome": name}, gemini[name]) for name in ("successes", "failures", "retries", "rate_limited", "circuit_rejections")]),
+        ("cogniparse_llm_hedges_total", "counter", "Duplicate Gemini requests sent after a call outlived the tail latency, and how many answered first",
+         [({"result": "sent"}, gemini["hedges"]), ({"result": "won"}, gemini["hedge_wins"])]),
+        ("cogniparse_llm_hedge_after_seconds", "gauge", "Recorded tail latency after which a call is hedged, by model and prompt size",
+         [({"model": model, "size": size}, after) for size, row in routing.items() for model, after in row["hedge_after"].items()]),
+        ("cogniparse_llm_light_calls_total", "counter", "Small free-text calls routed to the light model tier, and those retried on the full model",
+         [({"outcome": "routed"}, gemini["light_calls"]), ({"outcome": "fallback"}, gemini["route_fallbacks"])]),
+        ("cogniparse_fetch_requests_total", "counter", "Page fetches that went to the network",
+         [({}, fetch["requests"])]),
+        ("cogniparse_fetch_new_connections_total", "counter", "Connections opened for page fetches",
+         [({}, fetch["new_connections"])]),
+        ("cogniparse_coalesced_requests_total", "counter", "Requests answered by an identical in-flight run",
+         [({}, flights["coalesced"])]),
+        ("cogniparse_coalesced_in_flight", "gauge", "Distinct coalescable computations in flight",
+         [({}, flights["in_flight"])]),
+        ("cogniparse_missing_section_answers_total", "counter", "Missing-section clicks by where the answer came from",
+         [({"source": source}, count) for source, count in missing_section_stats.items()]),
+        ("cogniparse_incremental_analyses_total", "counter", "Re-analyses of a known page by how they were answered",
+         [({"outcome": outcome}, count) for outcome, count in incremental_stats.items()]),
+        ("cogniparse_prefetch_total", "counter", "Background related-link prefetches by outcome",
+         [({"outcome": name}, prefetch[name]) for name in ("scheduled", "completed", "failed", "cancelled", "shed", "host_busy")]),
+        ("cogniparse_prefetch_lookups_total", "counter", "Page loads by whether a prefetched copy was used (joined: waited for a running prefetch)",
+         [({"result": "hit"}, prefetch["hits"]), ({"result": "joined"}, prefetch["joined"]), ({"result": "miss"}, prefetch["misses"])]),
+        ("cogniparse_prefetch_used_ratio", "gauge", "Share of completed prefetches that a later request used",
+         [({}, prefetch["used_ratio"])]),
+        ("cogniparse_prefetch_pending", "gauge", "Prefetches queued or running",
+         [({}, prefetch["pending"])])
+    ]
+
+register_collector(collect_pipeline_metrics)
+
+def result_cache_key(text_content, parsed_content, mode):
+    """Hash the extracted content together with the mode, model and prompt version"""
+    digest = hashlib.sha256()
+    digest.update(text_content.encode('utf-8'))
+    digest.update(json.dumps(parsed_content, sort_keys=True).encode('utf-8'))
+    return f"{mode}:{MODEL_NAME}:{MODES[mode].PROMPT_VERSION}:{digest.hexdigest()}"
+
+def prefetched_page(url, prefetched, started):
+    """Unpack a prefetched (CompactPage, text_content) for url"""
+    record_stage("prefetched", time.perf_counter() - started)
+    page, text_content = prefetched
+    parsed_content = page.to_dict()
+    parsed_content["base_url"] = url
+    return parsed_content, text_content
+
+def prepare_page(url):
+    """Fetch and parse a page into (parsed_content, text_content), taking a prefetched copy when there is one"""
+    started = time.perf_counter()
+    prefetched = prefetcher.take(url, PREFETCH_WAIT)
+    if prefetched is not None:
+        return prefetched_page(url, prefetched, started)
+    return fetch_and_parse(url)
+
+def page_text_limit():
+    """Characters of page text after which a download stops (0 reads the whole page)
+
+    A page that reaches FETCH_TEXT_LIMIT is long enough for the long-document path, which
+    should see all of it, so with that path on the download goes on to LONG_DOC_TEXT_LIMIT.
+    """
+    if FETCH_TEXT_LIMIT <= 0 or LONG_DOC_MIN_TOKENS <= 0:
+        return FETCH_TEXT_LIMIT
+    if LONG_DOC_TEXT_LIMIT <= 0:
+        return 0
+    return max(FETCH_TEXT_LIMIT, LONG_DOC_TEXT_LIMIT)
+
+def page_text_length():
+    """Characters of text_content a parse keeps (0 keeps all of it)
+
+    The long-document path splits a long page itself, so with it on the text is
+    kept whole and only cut to CONTEXT_TEXT_LIMIT where it is stored or prompted.
+    """
+    return 0 if LONG_DOC_MIN_TOKENS > 0 else CONTEXT_TEXT_LIMIT
+
+def context_text(text_content):
+    """text_content cut for the stored context and single-prompt analyses"""
+    return cut_text(text_content, CONTEXT_TEXT_LIMIT)
+
+def fetch_and_parse(url):
+    """Fetch and parse a page, parsing while it downloads"""
+    extractor = StreamingExtractor(page_text_limit(), MAIN_CONTENT_ONLY)
+    started = time.perf_counter()
+    html = fetch_webpage(url, extractor)
+    record_stage("fetch", time.perf_counter() - started - extractor.parse_seconds)
     
-    parsed_content = parse_webpage(html)
+    parsed_content, text_content = extractor.result(html, page_text_length())
+    record_stage("parse", extractor.parse_seconds)
     parsed_content["base_url"] = url
-    text_content = get_text_content(html)
-    
-    if mode == "student":
-        result = student_transform(text_content, parsed_content)
-    elif mode == "researcher":
-        result = researcher_transform(text_content, parsed_content)
-    elif mode == "professional":
-        result = professional_transform(text_content, parsed_content)
-    else:
-        raise ValueError(f"Invalid mode: {mode}")
+    return parsed_content, text_content
+
+async def prepare_page_async(url):
+    """Non-blocking prepare_page"""
+    started = time.perf_counter()
+    prefetched = await prefetcher.take_async(url, PREFETCH_WAIT)
+    if prefetched is not None:
+        return prefetched_page(url, prefetched, started)
+    extractor = StreamingExtractor(page_text_limit(), MAIN_CONTENT_ONLY)
+    started = time.perf_counter()
+    html = await fetch_webpage_async(url, extractor)
+    record_stage("fetch", time.perf_counter() - started - extractor.parse_seconds)
     
+    parsed_content, text_content = await asyncio.to_thread(extractor.result, html, page_text_length())
+    record_stage("parse", extractor.parse_seconds)
+    parsed_content["base_url"] = url
+    return parsed_content, text_content
+
+def related_link_urls(url, result):
+    """Distinct http(s) related_links of a result other than the page itself, in the model's order"""
+    seen = {normalize_url(url)}
+    urls = []
+    for link in result.get("related_links") or []:
+        if not isinstance(link, dict) or not isinstance(link.get("url"), str):
+            continue
+        link_url = urljoin(url, link["url"].strip()).split('#')[0]
+        if urlsplit(link_url).scheme not in ('http', 'https') or normalize_url(link_url) in seen:
+            continue
+        seen.add(normalize_url(link_url))
+        urls.append(link_url)
+    return urls
+
+def prefetch_page(url, mode=None):
+    """Fetch and parse a likely next page ahead of the click and, given a mode, warm the result cache for it too"""
+    with operation("prefetch"):
+        parsed_content, text_content = fetch_and_parse(url)
+        if mode:
+            cache_key = result_cache_key(text_content, parsed_content, mode)
+            if analysis_result_cache.get(cache_key) is None:
+                cache_result(cache_key, run_transform(MODES[mode], text_content, parsed_content))
+    return CompactPage.from_dict(parsed_content), text_content
+
+def prefetch_related(url, results):
+    """Queue the top PREFETCH_LINKS related links of each result for background fetch and parse
+
+    The model lists related links most relevant first, so the first PREFETCH_ANALYZE of them
+    are also analyzed in the result's mode.
+    """
+    if PREFETCH_LINKS <= 0:
+        return
+    for mode, result in results.items():
+        for rank, link_url in enumerate(related_link_urls(url, result)[:PREFETCH_LINKS]):
+            prefetcher.submit(link_url, url, prefetch_page, link_url, mode if rank < PREFETCH_ANALYZE else None)
+
+def complete_result(url, mode, parsed_content, result, cached):
+    """Add page metadata and default fields to a mode result"""
+    result["cached"] = cached
     result["url"] = url
     result["mode"] = mode
     result["page_title"] = parsed_content.get("title", "")
@@ -40,89 +292,590 @@ def analyze_webpage(url, mode):
     if "transformed_html" not in result:
         result["transformed_html"] = ""
     
-    analysis_context_cache[url] = {
-        "text_content": text_content[:15000],
-        "parsed_content": parsed_content,
-        "analysis_result": result,
-        "mode": mode
-    }
-    
     return result
 
-def agent_followup_response(url, message, mode, context=None):
-    """Handle follow-up questions about the analyzed webpage"""
+def remember_context(url, parsed_content, text_content, results):
+    """Store the page context and the per-mode results for chat and missing-section lookups
+
+    The page text itself is not stored: the page holds its sections' text and the chunk
+    index the lines no section covers.
+    """
+    mode, result = next(iter(results.items()))
+    text_content = context_text(text_content)
+    with stage("index"):
+        chunk_index = index_page(parsed_content, text_content)
+        section_index = build_section_index(parsed_content, results)
+        section_hashes = block_hashes(page_blocks(parsed_content, text_content))
+    with stage("store_context"):
+        release_chat_caches(url, context_store.get(url))
+        context_store.set(url, {
+            "page": CompactPage.from_dict(parsed_content).to_state(),
+            "chunk_index": chunk_index,
+            "section_index": section_index,
+            "section_hashes": section_hashes,
+            "versions": {name: analysis_version(name) for name in results},
+            "analysis_result": result,
+            "analysis_results": results,
+            "mode": mode,
+            # Tells apart contexts stored by different analyses of the same URL
+            "generation": uuid.uuid4().hex
+        })
+
+def has_page_text(cached):
+    """Whether a stored context has any page text to answer from"""
+    index = cached.get("chunk_index")
+    return bool(index["chunks"] if index else cached.get("text_content"))
+
+def loose_text(cached):
+    """The text a stored context keeps besides its page: the lines no section covers (all of it in older contexts)"""
+    index = cached.get("chunk_index") or {}
+    if "loose" in index:
+        return '\n'.join(index["loose"])
+    return cached.get("text_content", "")
+
+def update_context(url, cached, key, change):
+    """Set one key of url's stored context to change(its current value), if the context is still the one cached was read from
+
+    Only that key is written, atomically, so a re-analysis stored meanwhile is neither
+    overwritten nor given state that belongs to the previous page. Returns the new
+    value, or None if the context was replaced or is gone.
+    """
+    def apply(context):
+        if context.get("generation") != cached.get("generation"):
+            return None
+        return change(context.get(key))
+    return context_store.update(url, key, apply)
+
+def build_mode_prompt(module, text_content, parsed_content):
+    """Build a mode's prompt, timed as the prompt stage"""
+    with stage("prompt"):
+        return module.build_prompt(text_content, parsed_content)
+
+def cache_result(cache_key, result):
+    """Keep a copy of a fresh result for identical requests; a degraded one is not reused"""
+    if not result.get("degraded"):
+        analysis_result_cache.set(cache_key, copy.deepcopy(result))
+
+def parse_mode_response(module, response):
+    """Parse a mode's JSON answer, fill in its defaults and render its HTML, timed as the json_parse stage"""
+    with stage("json_parse"):
+        result = module.apply_defaults(parse_json_response(response))
+        result["transformed_html"] = module.render_html(result)
+        return result
+
+def long_document_chunks(parsed_content, text_content):
+    """The page cut into map chunks if it is too long to analyze in one prompt, else None"""
+    if LONG_DOC_MIN_TOKENS <= 0:
+        return None
+    # Cheap upper bound first, so ordinary pages are not split at all
+    chars = len(text_content) + sum(len(p) for section in parsed_content.get("sections", []) for p in section.get("content", []))
+    if chars // 4 < LONG_DOC_MIN_TOKENS:
+        return None
+    with stage("split"):
+        chunks = long_document.split_document(parsed_content, text_content)
+    if len(chunks) < 2 or sum(chunk["tokens"] for chunk in chunks) < LONG_DOC_MIN_TOKENS:
+        return None
+    return chunks
+
+def chunk_cache_key(chunk):
+    """Cache key of a chunk summary: its content hash with the model and map prompt version"""
+    return f"{MODEL_NAME}:{long_document.PROMPT_VERSION}:{chunk['hash']}"
+
+def summarize_chunk(chunk, parsed_content):
+    """Map step for one chunk: its cached summary, else one from Gemini shared with identical chunks in flight"""
+    key = chunk_cache_key(chunk)
+    summary = chunk_summary_cache.get(key)
+    if summary is None:
+        summary = request_flights.do(("chunk", key), run_summarize_chunk, key, chunk, parsed_content)
+    return summary
+
+def cache_summary(key, summary):
+    """Keep a chunk summary for CHUNK_CACHE_TTL; a degraded one is asked for again next time"""
+    if not summary.get("degraded"):
+        chunk_summary_cache.set(key, summary)
+
+def run_summarize_chunk(key, chunk, parsed_content):
+    """Ask Gemini for a chunk summary and cache it unless it is degraded"""
+    prompt, system_instruction = long_document.build_prompt(chunk, parsed_content)
+    response = generate_response(prompt, system_instruction, response_schema=long_document.RESPONSE_SCHEMA)
+    summary = long_document.parse_summary(response)
+    cache_summary(key, summary)
+    return summary
+
+def map_chunks(chunks, parsed_content):
+    """Summaries of all chunks in page order, at most LONG_DOC_CONCURRENCY Gemini calls at a time"""
+    with stage("map"):
+        with ThreadPoolExecutor(max_workers=max(min(LONG_DOC_CONCURRENCY, len(chunks)), 1)) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, summarize_chunk, chunk, parsed_content)
+                for chunk in chunks
+            ]
+            return [future.result() for future in futures]
+
+def build_reduce_prompt(module, parsed_content, chunks, summaries):
+    """A mode's prompt over the chunk summaries instead of the page text, with room for all of them"""
+    with stage("prompt"):
+        page = long_document.summary_page(parsed_content, chunks, summaries)
+        return module.build_prompt("", page, long_document.reduce_budget(page, DEFAULT_TOKEN_BUDGET))
+
+def build_analysis_prompt(module, text_content, parsed_content):
+    """A mode's prompt for a full analysis; long pages are summarized chunk by chunk first and the prompt covers every summary"""
+    chunks = long_document_chunks(parsed_content, text_content)
+    if chunks is None:
+        return build_mode_prompt(module, context_text(text_content), parsed_content)
+    return build_reduce_prompt(module, parsed_content, chunks, map_chunks(chunks, parsed_content))
+
+def run_transform(module, text_content, parsed_content):
+    """module.transform with each stage timed"""
+    prompt, system_instruction = build_analysis_prompt(module, text_content, parsed_content)
+    return parse_mode_response(module, generate_response(prompt, system_instruction, response_schema=module.RESPONSE_SCHEMA))
+
+def analysis_version(mode):
+    """Model and prompt version behind a mode's analyses; an update may only build on a matching one"""
+    return f"{MODEL_NAME}:{MODES[mode].PROMPT_VERSION}"
+
+def record_incremental(outcome):
+    """Count how a re-analysis of a known page was answered"""
+    with incremental_lock:
+        incremental_stats[outcome] += 1
+
+def previous_analysis(url, use_cache=True):
+    """The stored context of url's last analysis, which an incremental update can build on"""
+    if not use_cache or INCREMENTAL_MAX_CHANGE <= 0:
+        return None
+    with stage("context"):
+        return context_store.get(url)
+
+def plan_update(previous, mode, parsed_content, text_content):
+    """(previous result, changes) if the page was analyzed in this mode before and few of its blocks changed, else None"""
+    result = (previous or {}).get("analysis_results", {}).get(mode)
+    if not result or result.get("degraded") or "section_hashes" not in previous:
+        return None
+    if previous.get("versions", {}).get(mode) != analysis_version(mode) or result.get("revision", 0) >= INCREMENTAL_MAX_UPDATES:
+        record_incremental("full")
+        return None
+    with stage("diff"):
+        blocks = page_blocks(parsed_content, context_text(text_content))
+        previous_blocks = None
+        if previous.get("page"):
+            previous_page = CompactPage.from_state(previous["page"]).to_dict()
+            previous_blocks = page_blocks(previous_page, loose_text(previous))
+        changes = diff_blocks(previous["section_hashes"], blocks, previous_blocks)
+    new_blocks = changes["changed"] + changes["added"]
+    changed = len(new_blocks) + len(changes["removed"])
+    if (changed > INCREMENTAL_MAX_CHANGE * max(len(blocks), len(previous["section_hashes"]))
+            or estimate_tokens(format_blocks(new_blocks)) > DEFAULT_TOKEN_BUDGET):
+        record_incremental("full")
+        return None
+    return result, changes
+
+def schema_fields(module, result):
+    """Copy of the fields of a result that the mode's schema defines"""
+    return {name: copy.deepcopy(value) for name, value in result.items() if name in module.RESPONSE_SCHEMA["properties"]}
+
+def has_changes(changes):
+    """Whether a diff found any changed, added or removed block"""
+    return bool(changes["changed"] or changes["added"] or changes["removed"])
+
+def build_update_request(module, previous_result, changes, parsed_content):
+    """(prompt, system_instruction) asking only for the fields the changed blocks affect"""
+    with stage("prompt"):
+        removed = [removed_title(key) for key in changes["removed"]]
+        prompt = build_update_prompt(schema_fields(module, previous_result), dict(changes, removed=removed), parsed_content)
+        return prompt, module.SYSTEM_INSTRUCTION
+
+def parse_update(response):
+    """The changed fields from an update answer; ValueError if it is not a JSON object"""
+    with stage("json_parse"):
+        update = parse_json_response(response, fallback=False)
+    if not isinstance(update, dict):
+        raise ValueError("Gemini update is not a JSON object")
+    return update
+
+def merge_update(module, previous_result, changes, update):
+    """The previous result with the updated fields replaced, re-rendered and marked with its revision"""
+    result = schema_fields(module, previous_result)
+    result.update((name, value) for name, value in update.items() if name in module.RESPONSE_SCHEMA["properties"])
+    result = module.apply_defaults(result)
+    result["transformed_html"] = module.render_html(result)
+    result["revision"] = previous_result.get("revision", 0) + (1 if has_changes(changes) else 0)
+    result["changed_sections"] = [block["title"] for block in changes["changed"] + changes["added"]]
+    result["changed_sections"] += [removed_title(key) for key in changes["removed"]]
+    return result
+
+def run_update(module, plan, text_content, parsed_content):
+    """Bring the previous result up to date by sending Gemini only the changed blocks; full transform if the answer is unusable"""
+    previous_result, changes = plan
+    update = {}
+    if has_changes(changes):
+        prompt, system_instruction = build_update_request(module, previous_result, changes, parsed_content)
+        try:
+            update = parse_update(generate_response(prompt, system_instruction, response_schema=partial_schema(module.RESPONSE_SCHEMA)))
+        except ValueError:
+            record_incremental("full")
+            return run_transform(module, text_content, parsed_content)
+    record_incremental("updated" if has_changes(changes) else "unchanged")
+    return merge_update(module, previous_result, changes, update)
+
+def transform_page(mode, text_content, parsed_content, previous=None):
+    """A fresh result for one mode: an incremental update of the previous analysis when possible, else a full transform"""
+    module = MODES[mode]
+    plan = plan_update(previous, mode, parsed_content, text_content)
+    if plan is None:
+        return run_transform(module, text_content, parsed_content)
+    return run_update(module, plan, text_content, parsed_content)
+
+def finalize_result(url, mode, parsed_content, text_content, result, cached, prefetch=True):
+    """Complete a single mode result, remember its context and, if prefetch, start prefetching its related links"""
+    result = complete_result(url, mode, parsed_content, result, cached)
+    remember_context(url, parsed_content, text_content, {mode: result})
+    if prefetch:
+        prefetch_related(url, {mode: result})
+    return result
+
+def analyze_webpage(url, mode, use_cache=True, prefetch=True):
+    """Main agent function to analyze a webpage based on mode; identical concurrent calls share one run"""
+    with operation("analyze"):
+        return request_flights.do(("analyze", url, mode, use_cache), run_analysis, url, mode, use_cache, prefetch)
+
+def run_analysis(url, mode, use_cache=True, prefetch=True):
+    """Fetch, parse and transform a page for one mode"""
     
-    cached = analysis_context_cache.get(url, {})
-    text_content = cached.get("text_content", context.get("text_content", "") if context else "")
-    analysis_result = cached.get("analysis_result", {})
+    if mode not in MODES:
+        raise ValueError(f"Invalid mode: {mode}")
+    
+    parsed_content, text_content = prepare_page(url)
+    
+    cache_key = result_cache_key(text_content, parsed_content, mode)
+    cached_result = analysis_result_cache.get(cache_key) if use_cache else None
+    
+    if cached_result is not None:
+        result = copy.deepcopy(cached_result)
+    else:
+        result = transform_page(mode, text_content, parsed_content, previous_analysis(url, use_cache))
+        cache_result(cache_key, result)
+    
+    return finalize_result(url, mode, parsed_content, text_content, result, cached_result is not None, prefetch)
+
+def analyze_webpage_multi(url, modes, use_cache=True):
+    """Analyze one page in several modes, sharing the fetch/parse and running Gemini calls concurrently"""
+    with operation("analyze"):
+        return request_flights.do(("analyze_multi", url, tuple(modes), use_cache), run_analysis_multi, url, modes, use_cache)
+
+def run_analysis_multi(url, modes, use_cache=True):
+    """Fetch and parse a page once, then transform it for each mode"""
+    
+    for mode in modes:
+        if mode not in MODES:
+            raise ValueError(f"Invalid mode: {mode}")
+    
+    parsed_content, text_content = prepare_page(url)
     
-    mode_personas = {
-        "student": """You are a helpful learning assistant. Answer questions in a clear, educational way.
+    results = {}
+    cache_keys = {}
+    pending = []
+    for mode in modes:
+        cache_keys[mode] = result_cache_key(text_content, parsed_content, mode)
+        cached_result = analysis_result_cache.get(cache_keys[mode]) if use_cache else None
+        if cached_result is not None:
+            results[mode] = complete_result(url, mode, parsed_content, copy.deepcopy(cached_result), True)
+        else:
+            pending.append(mode)
+    
+    if pending:
+        previous = previous_analysis(url, use_cache)
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            futures = {
+                mode: executor.submit(contextvars.copy_context().run, transform_page, mode, text_content, parsed_content, previous)
+                for mode in pending
+            }
+            for mode, future in futures.items():
+                result = future.result()
+                cache_result(cache_keys[mode], result)
+                results[mode] = complete_result(url, mode, parsed_content, result, False)
+    
+    results = {mode: results[mode] for mode in modes}
+    remember_context(url, parsed_content, text_content, results)
+    prefetch_related(url, results)
+    return results
+
+def analyze_webpage_stream(url, mode, use_cache=True):
+    """Analyze a webpage, yielding (event, data) pairs as each top-level result field completes"""
+    current_operation.set("analyze")
+    
+    if mode not in MODES:
+        raise ValueError(f"Invalid mode: {mode}")
+    
+    parsed_content, text_content = prepare_page(url)
+    yield "meta", {"url": url, "mode": mode, "page_title": parsed_content.get("title", "")}
+    
+    cache_key = result_cache_key(text_content, parsed_content, mode)
+    cached_result = analysis_result_cache.get(cache_key) if use_cache else None
+    
+    plan = None if cached_result is not None else plan_update(previous_analysis(url, use_cache), mode, parsed_content, text_content)
+    
+    if cached_result is not None:
+        result = copy.deepcopy(cached_result)
+        for name, value in result.items():
+            yield "field", {"name": name, "value": value}
+    elif plan is not None:
+        result = run_update(MODES[mode], plan, text_content, parsed_content)
+        cache_result(cache_key, result)
+        for name, value in result.items():
+            yield "field", {"name": name, "value": value}
+    else:
+        module = MODES[mode]
+        prompt, system_instruction = build_analysis_prompt(module, text_content, parsed_content)
+        fields = JSONFieldStream()
+        chunks = []
+        for chunk in generate_response_stream(prompt, system_instruction, response_schema=module.RESPONSE_SCHEMA):
+            chunks.append(chunk)
+            for name, value in fields.feed(chunk):
+                yield "field", {"name": name, "value": value}
+        result = parse_mode_response(module, ''.join(chunks))
+        cache_result(cache_key, result)
+    
+    yield "done", finalize_result(url, mode, parsed_content, text_content, result, cached_result is not None)
+
+def relevant_passages(cached, text_content, query):
+    """Pick the page chunks that best match query, falling back to the start of the page"""
+    with stage("retrieve"):
+        index = cached.get("chunk_index") or index_page({}, text_content)
+        page = CompactPage.from_state(cached["page"]) if cached.get("page") else None
+        chunks = search(index, query, CHAT_TOP_K, page) or index_chunks(index, page, range(min(CHAT_TOP_K, len(index["chunks"]))))
+        return format_chunks(chunks)
+
+MODE_PERSONAS = {
+    "student": """You are a helpful learning assistant. Answer questions in a clear, educational way.
 Use simple explanations and provide examples when helpful. Focus on helping the student understand concepts.""",
-        
-        "researcher": """You are an academic research assistant. Answer questions with precision and cite relevant details.
-Use formal academic language. Focus on methodology, data, findings, and research implications.""",
-        
-        "professional": """You are a business analyst assistant. Answer questions with actionable insights.
-Focus on business value, metrics, ROI, and strategic implications. Be concise and professional."""
-    }
     
-    system_instruction = mode_personas.get(mode, mode_personas["student"])
+    "researcher": """You are an academic research assistant. Answer questions with precision and cite relevant details.
+Use formal academic language. Focus on methodology, data, findings, and research implications.""",
     
-    analysis_summary = ""
-    if analysis_result:
-        analysis_summary = f"""
+    "professional": """You are a business analyst assistant. Answer questions with actionable insights.
+Focus on business value, metrics, ROI, and strategic implications. Be concise and professional."""
+}
+
+def chat_rules(mode):
+    """Ground rules for follow-up answers"""
+    return f"""IMPORTANT RULES:
+1. ONLY answer questions related to this webpage's content
+2. If the question is unrelated to the webpage, politely redirect to the webpage topic
+3. If information is not available in the content, say so clearly
+4. Stay in character as the {mode} mode assistant
+5. Be helpful and provide specific details from the content when possible"""
+
+def format_analysis_summary(analysis_result):
+    """Short recap of the previous analysis for chat prompts"""
+    if not analysis_result:
+        return ""
+    return f"""
 Previous Analysis Summary: {analysis_result.get('summary', 'N/A')}
 Key Points: {', '.join(analysis_result.get('key_points', [])[:5])}
 Highlights: {', '.join(analysis_result.get('highlights', [])[:3])}
 """
+
+def build_followup_prompt(url, message, mode, context=None, cached=None):
+    """Build the chat prompt for a follow-up question about the analyzed webpage"""
+    
+    if cached is None:
+        cached = context_store.get(url) or {}
+    text_content = cached.get("text_content", context.get("text_content", "") if context else "")
+    analysis_result = cached.get("analysis_results", {}).get(mode) or cached.get("analysis_result", {})
+    
+    system_instruction = MODE_PERSONAS.get(mode, MODE_PERSONAS["student"])
     
     prompt = f"""{system_instruction}
 
 You are an analysis agent for the webpage: {url}
 
-WEBPAGE CONTENT:
-{text_content[:8000]}
+RELEVANT WEBPAGE CONTENT:
+{relevant_passages(cached, text_content, message)}
 
-{analysis_summary}
+{format_analysis_summary(analysis_result)}
 
 USER QUESTION: {message}
 
-IMPORTANT RULES:
-1. ONLY answer questions related to this webpage's content
-2. If the question is unrelated to the webpage, politely redirect to the webpage topic
-3. If information is not available in the content, say so clearly
-4. Stay in character as the {mode} mode assistant
-5. Be helpful and provide specific details from the content when possible
+{chat_rules(mode)}
 
 Provide a helpful, focused response:"""
 
-    response = generate_response(prompt)
-    return response
+    return prompt
+
+def chat_cache_request(url, mode, cached):
+    """(contents, system_instruction) to register as cached content for a chat session, or None if not worth caching"""
+    if CHAT_CACHE_TTL <= 0 or not has_page_text(cached):
+        return None
+    index = cached.get("chunk_index")
+    if index and index.get("chunks"):
+        page = CompactPage.from_state(cached["page"]) if cached.get("page") else None
+        page_text = format_chunks(index_chunks(index, page))
+    else:
+        page_text = cached.get("text_content", "")
+    analysis_result = cached.get("analysis_results", {}).get(mode) or cached.get("analysis_result", {})
+    system_instruction = f"{MODE_PERSONAS.get(mode, MODE_PERSONAS['student'])}\n\n{chat_rules(mode)}"
+    contents = f"""You are an analysis agent for the webpage: {url}
 
-def handle_missing_section(url, section_label, mode):
-    """When an action's section doesn't exist, generate AI response about that topic"""
+WEBPAGE CONTENT:
+{page_text[:CHAT_CACHE_MAX_TOKENS * 4]}
+
+{format_analysis_summary(analysis_result)}"""
+    if estimate_tokens(system_instruction + contents) < CHAT_CACHE_MIN_TOKENS:
+        return None
+    return contents, system_instruction
+
+def live_chat_cache(cached, mode):
+    """The session record for (url, mode) if it has not expired yet"""
+    session = cached.get("chat_caches", {}).get(mode)
+    if session and session["expires_at"] > time.time():
+        return session
+    return None
+
+def save_chat_cache(url, mode, cached, name):
+    """Remember a session's cache name (None records that caching is unavailable) in the shared context
+
+    If the page was re-analyzed meanwhile the cache describes the old page, so it is deleted instead.
+    """
+    session = {
+        "name": name,
+        "expires_at": time.time() + max(CHAT_CACHE_TTL - CHAT_CACHE_EXPIRY_MARGIN, 0)
+    }
+    saved = update_context(url, cached, "chat_caches", lambda sessions: {**(sessions or {}), mode: session})
+    if saved is None and name:
+        chat_cache_cleanup.submit(delete_cached_context, name)
+
+def forget_chat_cache(url, mode, cached):
+    """Drop a session's cache name after Gemini rejected it"""
+    update_context(url, cached, "chat_caches", lambda sessions: {key: value for key, value in (sessions or {}).items() if key != mode})
+
+def chat_cache_name(url, mode, cached):
+    """Cached content for this chat session, registering it on first use; None means use the local prompt"""
+    session = live_chat_cache(cached, mode)
+    if session:
+        return session["name"]
+    return request_flights.do(("chat_cache", url, mode), register_chat_cache, url, mode, cached)
+
+def register_chat_cache(url, mode, cached):
+    """Create the session's cached content and record it in the page context"""
+    request = chat_cache_request(url, mode, cached)
+    name = None
+    if request:
+        try:
+            name = create_cached_context(*request, CHAT_CACHE_TTL)
+        except GeminiError as e:
+            if e.status not in CHAT_CACHE_REJECTED_STATUSES:
+                return None
+    if CHAT_CACHE_TTL > 0:
+        save_chat_cache(url, mode, cached, name)
+    return name
+
+def build_cached_followup_prompt(message):
+    """The per-turn prompt sent on top of the session's cached content"""
+    return f"""USER QUESTION: {message}
+
+Provide a helpful, focused response:"""
+
+def agent_followup_response(url, message, mode, context=None):
+    """Handle follow-up questions about the analyzed webpage"""
+    with operation("chat"):
+        with stage("context"):
+            cached = context_store.get(url) or {}
+        name = chat_cache_name(url, mode, cached) if cached else None
+        if name:
+            try:
+                return generate_response(build_cached_followup_prompt(message), cached_content=name)
+            except GeminiError as e:
+                if e.status not in CHAT_CACHE_REJECTED_STATUSES:
+                    raise
+                forget_chat_cache(url, mode, cached)
+        
+        response = generate_response(build_followup_prompt(url, message, mode, context, cached))
+        return response
+
+def build_missing_section_prompt(cached, section_label):
+    """Build the prompt for a section the page doesn't have"""
     
-    cached = analysis_context_cache.get(url, {})
     text_content = cached.get("text_content", "")
     
-    if not text_content:
-        return f"I don't have enough context to provide information about '{section_label}'. Please analyze a webpage first."
-    
     prompt = f"""Based on the following webpage content, please provide information about: {section_label}
 
-WEBPAGE CONTENT:
-{text_content[:8000]}
+RELEVANT WEBPAGE CONTENT:
+{relevant_passages(cached, text_content, section_label)}
 
 If this specific information ({section_label}) is not directly available in the content, provide your best analysis or explain what related information is available.
 
 Provide a helpful response:"""
 
-    response = generate_response(prompt)
+    return prompt
+
+def no_context_reply(section_label):
+    """Reply used when /missing-section arrives before the page was analyzed"""
+    return f"I don't have enough context to provide information about '{section_label}'. Please analyze a webpage first."
+
+def missing_section_reply(section_label, response):
+    """Wrap the model's answer about a missing section"""
     return f"'{section_label}' section was not found in the extracted content. Based on the webpage, here's what I found:\n\n{response}"
 
-def create_note(text, mode, context=""):
-    """Create a cleaned note from section content using Gemini"""
+def local_section_reply(cached, section_label, section_id, mode):
+    """Answer from the page's section index when the label or id names a known section or result field"""
+    with stage("section_lookup"):
+        entry = lookup_section(cached.get("section_index", []), section_label, section_id, mode)
+    if entry is None:
+        return None
+    text = entry_text(entry, cached.get("page"))
+    if entry["mode"]:
+        return f"**{entry['title']}** (from the {entry['mode']} analysis):\n\n{text}"
+    return f"From the page section **{entry['title']}**:\n\n{text}"
+
+def missing_section_key(section_label, mode):
+    """Key of a generated answer in the page context's missing_sections"""
+    return f"{mode}:{normalize_label(section_label)}"
+
+def record_missing_section(source):
+    """Count where a missing-section answer came from"""
+    with missing_section_lock:
+        missing_section_stats[source] += 1
+
+def missing_section_answer(url, section_label, section_id, mode):
+    """(source, cached context, answer or None): local index, an earlier generated answer, or nothing yet"""
+    with stage("context"):
+        cached = context_store.get(url) or {}
+    if not has_page_text(cached):
+        return "none", cached, None
+    reply = local_section_reply(cached, section_label, section_id, mode)
+    if reply is not None:
+        return "local", cached, reply
+    answer = cached.get("missing_sections", {}).get(missing_section_key(section_label, mode))
+    if answer is not None:
+        return "cached", cached, missing_section_reply(section_label, answer)
+    return "generated", cached, None
+
+def save_missing_section(url, section_label, mode, cached, answer):
+    """Remember a generated answer in the shared context so repeat clicks skip Gemini (not if the page was re-analyzed meanwhile)"""
+    key = missing_section_key(section_label, mode)
+    update_context(url, cached, "missing_sections", lambda answers: {**(answers or {}), key: answer})
+
+def handle_missing_section(url, section_label, mode, section_id=None):
+    """Answer an action whose section isn't on screen: from local page data if possible, else with Gemini"""
+    with operation("missing_section"):
+        source, cached, reply = missing_section_answer(url, section_label, section_id, mode)
+        if source == "none":
+            return no_context_reply(section_label)
+        record_missing_section(source)
+        if reply is not None:
+            return reply
+        key = ("missing_section", url, missing_section_key(section_label, mode))
+        answer = request_flights.do(key, run_missing_section, url, section_label, mode, cached)
+        return missing_section_reply(section_label, answer)
+
+def run_missing_section(url, section_label, mode, cached):
+    """Ask Gemini about a section the page doesn't have and cache the answer"""
+    answer = generate_response(build_missing_section_prompt(cached, section_label))
+    save_missing_section(url, section_label, mode, cached, answer)
+    return answer
+
+def build_note_prompt(text, mode, context=""):
+    """Build the prompt that turns saved section content into a note"""
     
     mode_instructions = {
         "student": "Format this as a concise study note that would be helpful for exam preparation.",
@@ -142,5 +895,238 @@ CONTEXT:
 
 Create a clean, well-formatted note. Keep it concise but informative. Do not include any preamble or explanation - just output the note content directly."""
 
-    response = generate_response(prompt)
+    return prompt
+
+def note_key(text, mode, context):
+    """Coalescing key for identical note requests"""
+    digest = hashlib.sha256(json.dumps([text, mode, context]).encode('utf-8')).hexdigest()
+    return ("note", digest)
+
+def create_note(text, mode, context=""):
+    """Create a cleaned note from section content using Gemini; identical concurrent requests share one call"""
+    with operation("note"):
+        return request_flights.do(note_key(text, mode, context), run_create_note, text, mode, context)
+
+def run_create_note(text, mode, context=""):
+    """Ask Gemini for the note"""
+    response = generate_response(build_note_prompt(text, mode, context))
+    return response.strip()
+
+async def summarize_chunk_async(chunk, parsed_content, limit):
+    """Non-blocking summarize_chunk; limit is the semaphore bounding this page's map calls"""
+    key = chunk_cache_key(chunk)
+    summary = chunk_summary_cache.get(key)
+    if summary is None:
+        async with limit:
+            summary = await request_flights.do_async(("chunk", key), run_summarize_chunk_async, key, chunk, parsed_content)
+    return summary
+
+async def run_summarize_chunk_async(key, chunk, parsed_content):
+    """Non-blocking run_summarize_chunk"""
+    prompt, system_instruction = long_document.build_prompt(chunk, parsed_content)
+    response = await generate_response_async(prompt, system_instruction, response_schema=long_document.RESPONSE_SCHEMA)
+    summary = long_document.parse_summary(response)
+    cache_summary(key, summary)
+    return summary
+
+async def map_chunks_async(chunks, parsed_content):
+    """Non-blocking map_chunks"""
+    limit = asyncio.Semaphore(max(LONG_DOC_CONCURRENCY, 1))
+    with stage("map"):
+        return await asyncio.gather(*[summarize_chunk_async(chunk, parsed_content, limit) for chunk in chunks])
+
+async def build_analysis_prompt_async(module, text_content, parsed_content):
+    """Non-blocking build_analysis_prompt"""
+    chunks = long_document_chunks(parsed_content, text_content)
+    if chunks is None:
+        return build_mode_prompt(module, context_text(text_content), parsed_content)
+    return build_reduce_prompt(module, parsed_content, chunks, await map_chunks_async(chunks, parsed_content))
+
+async def run_transform_async(module, text_content, parsed_content):
+    """Non-blocking run_transform"""
+    prompt, system_instruction = await build_analysis_prompt_async(module, text_content, parsed_content)
+    response = await generate_response_async(prompt, system_instruction, response_schema=module.RESPONSE_SCHEMA)
+    return parse_mode_response(module, response)
+
+async def run_update_async(module, plan, text_content, parsed_content):
+    """Non-blocking run_update"""
+    previous_result, changes = plan
+    update = {}
+    if has_changes(changes):
+        prompt, system_instruction = build_update_request(module, previous_result, changes, parsed_content)
+        try:
+            update = parse_update(await generate_response_async(prompt, system_instruction, response_schema=partial_schema(module.RESPONSE_SCHEMA)))
+        except ValueError:
+            record_incremental("full")
+            return await run_transform_async(module, text_content, parsed_content)
+    record_incremental("updated" if has_changes(changes) else "unchanged")
+    return merge_update(module, previous_result, changes, update)
+
+async def transform_page_async(mode, text_content, parsed_content, previous=None):
+    """Non-blocking transform_page"""
+    module = MODES[mode]
+    plan = await asyncio.to_thread(plan_update, previous, mode, parsed_content, text_content)
+    if plan is None:
+        return await run_transform_async(module, text_content, parsed_content)
+    return await run_update_async(module, plan, text_content, parsed_content)
+
+async def analyze_webpage_async(url, mode, use_cache=True):
+    """Non-blocking analyze_webpage for the ASGI app"""
+    with operation("analyze"):
+        return await request_flights.do_async(("analyze", url, mode, use_cache), run_analysis_async, url, mode, use_cache)
+
+async def run_analysis_async(url, mode, use_cache=True):
+    """Non-blocking run_analysis"""
+    
+    if mode not in MODES:
+        raise ValueError(f"Invalid mode: {mode}")
+    
+    parsed_content, text_content = await prepare_page_async(url)
+    
+    cache_key = result_cache_key(text_content, parsed_content, mode)
+    cached_result = analysis_result_cache.get(cache_key) if use_cache else None
+    
+    if cached_result is not None:
+        result = copy.deepcopy(cached_result)
+    else:
+        previous = await asyncio.to_thread(previous_analysis, url, use_cache)
+        result = await transform_page_async(mode, text_content, parsed_content, previous)
+        cache_result(cache_key, result)
+    
+    return await asyncio.to_thread(finalize_result, url, mode, parsed_content, text_content, result, cached_result is not None)
+
+async def analyze_webpage_multi_async(url, modes, use_cache=True):
+    """Non-blocking analyze_webpage_multi for the ASGI app"""
+    with operation("analyze"):
+        return await request_flights.do_async(("analyze_multi", url, tuple(modes), use_cache), run_analysis_multi_async, url, modes, use_cache)
+
+async def run_analysis_multi_async(url, modes, use_cache=True):
+    """Non-blocking run_analysis_multi"""
+    
+    for mode in modes:
+        if mode not in MODES:
+            raise ValueError(f"Invalid mode: {mode}")
+    
+    parsed_content, text_content = await prepare_page_async(url)
+    previous = await asyncio.to_thread(previous_analysis, url, use_cache)
+    
+    async def run_mode(mode):
+        cache_key = result_cache_key(text_content, parsed_content, mode)
+        cached_result = analysis_result_cache.get(cache_key) if use_cache else None
+        if cached_result is not None:
+            return complete_result(url, mode, parsed_content, copy.deepcopy(cached_result), True)
+        result = await transform_page_async(mode, text_content, parsed_content, previous)
+        cache_result(cache_key, result)
+        return complete_result(url, mode, parsed_content, result, False)
+    
+    results = dict(zip(modes, await asyncio.gather(*[run_mode(mode) for mode in modes])))
+    await asyncio.to_thread(remember_context, url, parsed_content, text_content, results)
+    prefetch_related(url, results)
+    return results
+
+async def analyze_webpage_stream_async(url, mode, use_cache=True):
+    """Non-blocking analyze_webpage_stream for the ASGI app"""
+    current_operation.set("analyze")
+    
+    if mode not in MODES:
+        raise ValueError(f"Invalid mode: {mode}")
+    
+    parsed_content, text_content = await prepare_page_async(url)
+    yield "meta", {"url": url, "mode": mode, "page_title": parsed_content.get("title", "")}
+    
+    cache_key = result_cache_key(text_content, parsed_content, mode)
+    cached_result = analysis_result_cache.get(cache_key) if use_cache else None
+    plan = None
+    if cached_result is None:
+        previous = await asyncio.to_thread(previous_analysis, url, use_cache)
+        plan = await asyncio.to_thread(plan_update, previous, mode, parsed_content, text_content)
+    
+    if cached_result is not None:
+        result = copy.deepcopy(cached_result)
+        for name, value in result.items():
+            yield "field", {"name": name, "value": value}
+    elif plan is not None:
+        result = await run_update_async(MODES[mode], plan, text_content, parsed_content)
+        cache_result(cache_key, result)
+        for name, value in result.items():
+            yield "field", {"name": name, "value": value}
+    else:
+        module = MODES[mode]
+        prompt, system_instruction = await build_analysis_prompt_async(module, text_content, parsed_content)
+        fields = JSONFieldStream()
+        chunks = []
+        async for chunk in generate_response_stream_async(prompt, system_instruction, response_schema=module.RESPONSE_SCHEMA):
+            chunks.append(chunk)
+            for name, value in fields.feed(chunk):
+                yield "field", {"name": name, "value": value}
+        result = parse_mode_response(module, ''.join(chunks))
+        cache_result(cache_key, result)
+    
+    yield "done", await asyncio.to_thread(finalize_result, url, mode, parsed_content, text_content, result, cached_result is not None)
+
+async def chat_cache_name_async(url, mode, cached):
+    """Non-blocking chat_cache_name"""
+    session = live_chat_cache(cached, mode)
+    if session:
+        return session["name"]
+    return await request_flights.do_async(("chat_cache", url, mode), register_chat_cache_async, url, mode, cached)
+
+async def register_chat_cache_async(url, mode, cached):
+    """Non-blocking register_chat_cache"""
+    request = await asyncio.to_thread(chat_cache_request, url, mode, cached)
+    name = None
+    if request:
+        try:
+            name = await create_cached_context_async(*request, CHAT_CACHE_TTL)
+        except GeminiError as e:
+            if e.status not in CHAT_CACHE_REJECTED_STATUSES:
+                return None
+    if CHAT_CACHE_TTL > 0:
+        await asyncio.to_thread(save_chat_cache, url, mode, cached, name)
+    return name
+
+async def agent_followup_response_async(url, message, mode, context=None):
+    """Non-blocking agent_followup_response for the ASGI app"""
+    with operation("chat"):
+        with stage("context"):
+            cached = await asyncio.to_thread(context_store.get, url) or {}
+        name = await chat_cache_name_async(url, mode, cached) if cached else None
+        if name:
+            try:
+                return await generate_response_async(build_cached_followup_prompt(message), cached_content=name)
+            except GeminiError as e:
+                if e.status not in CHAT_CACHE_REJECTED_STATUSES:
+                    raise
+                await asyncio.to_thread(forget_chat_cache, url, mode, cached)
+        
+        prompt = await asyncio.to_thread(build_followup_prompt, url, message, mode, context, cached)
+        return await generate_response_async(prompt)
+
+async def handle_missing_section_async(url, section_label, mode, section_id=None):
+    """Non-blocking handle_missing_section for the ASGI app"""
+    with operation("missing_section"):
+        source, cached, reply = await asyncio.to_thread(missing_section_answer, url, section_label, section_id, mode)
+        if source == "none":
+            return no_context_reply(section_label)
+        record_missing_section(source)
+        if reply is not None:
+            return reply
+        key = ("missing_section", url, missing_section_key(section_label, mode))
+        answer = await request_flights.do_async(key, run_missing_section_async, url, section_label, mode, cached)
+        return missing_section_reply(section_label, answer)
+
+async def run_missing_section_async(url, section_label, mode, cached):
+    """Non-blocking run_missing_section"""
+    answer = await generate_response_async(build_missing_section_prompt(cached, section_label))
+    await asyncio.to_thread(save_missing_section, url, section_label, mode, cached, answer)
+    return answer
+
+async def create_note_async(text, mode, context=""):
+    """Non-blocking create_note for the ASGI app"""
+    with operation("note"):
+        return await request_flights.do_async(note_key(text, mode, context), run_create_note_async, text, mode, context)
+
+async def run_create_note_async(text, mode, context=""):
+    """Non-blocking run_create_note"""
+    response = await generate_response_async(build_note_prompt(text, mode, context))
     return response.strip()
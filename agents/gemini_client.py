@@ -1,7 +1,36 @@
 import os
+import html
 import json
 import re
+import time
+import asyncio
+import contextvars
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import httpx
 from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types
+from utils.resilience import TokenBucket, ConcurrencyLimiter, CircuitBreaker, backoff_delay
+from utils.metrics import current_operation, histogram, prompt_chars, response_chars, record_stage, stage
+
+MODEL_NAME = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash')
+# Lighter tier for small free-text prompts (notes, chat); empty disables routing
+LIGHT_MODEL_NAME = os.environ.get('GEMINI_LIGHT_MODEL', 'gemini-2.0-flash-lite')
+LIGHT_MAX_TOKENS = int(os.environ.get('GEMINI_LIGHT_MAX_TOKENS', 2000))
+ROUTE_EXPLORE = float(os.environ.get('GEMINI_ROUTE_EXPLORE', 0.05))
+
+TAIL_PERCENTILE = float(os.environ.get('GEMINI_TAIL_PERCENTILE', 0.95))
+HEDGE_MAX_RATIO = float(os.environ.get('GEMINI_HEDGE_MAX_RATIO', 0.1))
+LATENCY_MIN_SAMPLES = int(os.environ.get('GEMINI_LATENCY_MIN_SAMPLES', 20))
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0, 12.0, 16.0, 24.0, 32.0, 60.0)
+PROMPT_SIZE_CLASSES = ((1000, "1k"), (4000, "4k"), (16000, "16k"), (64000, "64k"))
+
+MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.environ.get('GEMINI_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.environ.get('GEMINI_BACKOFF_MAX', 20))
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
 
 client = None
 
@@ -21,28 +50,607 @@ def get_client():
         init_client()
     return client
 
-def generate_response(prompt, system_instruction=None):
-    """Generate a response from Gemini"""
-    try:
-        gemini_client = get_client()
-        
-        full_prompt = prompt
-        if system_instruction:
-            full_prompt = f"{system_instruction}\n\n{prompt}"
-        
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=full_prompt
-        )
-        
+class GeminiError(Exception):
+    """A failed Gemini call, with its HTTP status and retry-after hint when known"""
+
+    def __init__(self, message, status=None, retry_after=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+class CircuitOpenError(GeminiError):
+    """Raised without calling Gemini while the circuit breaker is open"""
+
+def classify_error(error):
+    """Turn any exception raised by a backend into a GeminiError"""
+    if isinstance(error, GeminiError):
+        return error
+    if isinstance(error, genai_errors.APIError):
+        retry_after = None
+        headers = getattr(error.response, 'headers', None)
+        if headers:
+            try:
+                retry_after = float(headers.get('retry-after'))
+            except (TypeError, ValueError):
+                retry_after = None
+        return GeminiError(f"Gemini API error: {str(error)}", status=error.code,
+                           retry_after=retry_after, retryable=error.code in RETRYABLE_STATUSES)
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return GeminiError(f"Gemini API error: {str(error)}", retryable=True)
+    return GeminiError(f"Gemini API error: {str(error)}")
+
+class GeminiBackend:
+    """Talks to the real Gemini API through the google-genai client"""
+
+    def generate(self, model, contents, config=None):
+        return get_client().models.generate_content(model=model, contents=contents, config=config).text
+
+    async def generate_async(self, model, contents, config=None):
+        response = await get_client().aio.models.generate_content(model=model, contents=contents, config=config)
         return response.text
+
+    def stream(self, model, contents, config=None):
+        for chunk in get_client().models.generate_content_stream(model=model, contents=contents, config=config):
+            if chunk.text:
+                yield chunk.text
+
+    async def stream_async(self, model, contents, config=None):
+        async for chunk in await get_client().aio.models.generate_content_stream(model=model, contents=contents, config=config):
+            if chunk.text:
+                yield chunk.text
+
+    def create_cache(self, model, contents, system_instruction, ttl):
+        config = types.CreateCachedContentConfig(contents=[contents], system_instruction=system_instruction, ttl=f"{ttl}s")
+        return get_client().caches.create(model=model, config=config).name
+
+    async def create_cache_async(self, model, contents, system_instruction, ttl):
+        config = types.CreateCachedContentConfig(contents=[contents], system_instruction=system_instruction, ttl=f"{ttl}s")
+        cache = await get_client().aio.caches.create(model=model, config=config)
+        return cache.name
+
+    def delete_cache(self, name):
+        get_client().caches.delete(name=name)
+
+backend = GeminiBackend()
+
+def set_backend(new_backend):
+    """Swap the object that performs Gemini calls, e.g. for a local fake; None restores the real API"""
+    global backend
+    backend = new_backend or GeminiBackend()
+
+request_bucket = TokenBucket(int(os.environ.get('GEMINI_RPM', 0)))
+token_bucket = TokenBucket(int(os.environ.get('GEMINI_TPM', 0)))
+in_flight = ConcurrencyLimiter(int(os.environ.get('GEMINI_MAX_IN_FLIGHT', 16)))
+breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get('GEMINI_BREAKER_THRESHOLD', 5)),
+    reset_timeout=float(os.environ.get('GEMINI_BREAKER_RESET', 30))
+)
+
+llm_latency = histogram(
+    'cogniparse_llm_latency_seconds', 'Duration of successful Gemini calls by model and prompt size',
+    labels=('model', 'size'), buckets=LATENCY_BUCKETS
+)
+# Threads for synchronous hedged calls; when all are busy, calls run unhedged on the caller's thread
+HEDGE_THREADS = (in_flight.limit or 16) * 2
+hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix='gemini-hedge')
+hedge_threads = ConcurrencyLimiter(HEDGE_THREADS)
+# Set once the light model turns out not to exist for this API key
+light_model_missing = threading.Event()
+
+metrics = {
+    "calls": 0,
+    "successes": 0,
+    "failures": 0,
+    "retries": 0,
+    "rate_limited": 0,
+    "circuit_rejections": 0,
+    "cache_delete_failures": 0,
+    "light_calls": 0,
+    "route_fallbacks": 0,
+    "hedges": 0,
+    "hedge_wins": 0,
+    "throttle_wait_seconds": 0.0,
+    "latency_seconds_total": 0.0
+}
+metrics_lock = threading.Lock()
+
+def record(name, amount=1):
+    """Increment a client metric"""
+    with metrics_lock:
+        metrics[name] += amount
+
+def get_metrics():
+    """Snapshot of the client metrics, including in-flight calls and breaker state"""
+    with metrics_lock:
+        snapshot = dict(metrics)
+    snapshot["in_flight"] = in_flight.in_flight
+    snapshot["circuit_state"] = breaker.state
+    return snapshot
+
+def estimate_tokens(text):
+    """Rough local token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+def check_breaker():
+    """Fail fast while the upstream is considered down"""
+    if not breaker.allow():
+        record("circuit_rejections")
+        retry_in = breaker.retry_in()
+        raise CircuitOpenError(f"Gemini API error: service unavailable, retry in {retry_in:.0f}s",
+                               status=503, retry_after=retry_in)
+
+def admission_delay(prompt_tokens):
+    """Seconds to wait so the request and token budgets are respected"""
+    wait = max(request_bucket.reserve(1), token_bucket.reserve(prompt_tokens))
+    if wait:
+        record("throttle_wait_seconds", wait)
+    return wait
+
+def settle(error, attempt, started):
+    """Update breaker and metrics after an attempt; return the retry delay or raise"""
+    if error is None:
+        breaker.record_success()
+        record("successes")
+        record("latency_seconds_total", time.monotonic() - started)
+        return None
+    # A non-retryable error (bad request, missing model) is about the call, not the upstream's health
+    if error.retryable:
+        breaker.record_failure()
+    else:
+        breaker.release_trial()
+    if error.status == 429:
+        record("rate_limited")
+    if not error.retryable or attempt >= MAX_RETRIES:
+        record("failures")
+        raise error
+    record("retries")
+    return backoff_delay(attempt, BACKOFF_BASE, BACKOFF_MAX, error.retry_after)
+
+def call_gemini(call, prompt_text, keep_slot=False):
+    """Run a backend call under the rate limits, in-flight cap, retries and circuit breaker
+
+    With keep_slot the in-flight slot stays taken after success; the caller releases it.
+    """
+    prompt_tokens = estimate_tokens(prompt_text)
+    attempt = 0
+    while True:
+        check_breaker()
+        settled = False
+        try:
+            wait = admission_delay(prompt_tokens)
+            if wait:
+                time.sleep(wait)
+            in_flight.acquire()
+            record("calls")
+            started = time.monotonic()
+            try:
+                result = call()
+                error = None
+            except Exception as e:
+                result = None
+                error = classify_error(e)
+            if error is not None or not keep_slot:
+                in_flight.release()
+            settled = True
+            delay = settle(error, attempt, started)
+        finally:
+            if not settled:
+                breaker.release_trial()
+        if delay is None:
+            return result
+        attempt += 1
+        time.sleep(delay)
+
+async def call_gemini_async(call, prompt_text, keep_slot=False):
+    """Non-blocking call_gemini; call returns an awaitable"""
+    prompt_tokens = estimate_tokens(prompt_text)
+    attempt = 0
+    while True:
+        check_breaker()
+        settled = False
+        try:
+            wait = admission_delay(prompt_tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            await in_flight.acquire_async()
+            record("calls")
+            started = time.monotonic()
+            try:
+                result = await call()
+                error = None
+            except asyncio.CancelledError:
+                # A hedged copy that lost the race, or a client that went away
+                in_flight.release()
+                raise
+            except Exception as e:
+                result = None
+                error = classify_error(e)
+            if error is not None or not keep_slot:
+                in_flight.release()
+            settled = True
+            delay = settle(error, attempt, started)
+        finally:
+            # Cancelled (or interrupted) before the outcome was known: a half-open breaker must not wait for it forever
+            if not settled:
+                breaker.release_trial()
+        if delay is None:
+            return result
+        attempt += 1
+        await asyncio.sleep(delay)
+
+def build_full_prompt(prompt, system_instruction=None):
+    """Prefix the prompt with the system instruction, as every call does"""
+    if system_instruction:
+        return f"{system_instruction}\n\n{prompt}"
+    return prompt
+
+def request_config(cached_content=None, response_schema=None):
+    """Request config for a cached prompt prefix and/or JSON output constrained to a schema"""
+    options = {}
+    if cached_content:
+        options["cached_content"] = cached_content
+    if response_schema:
+        options["response_mime_type"] = "application/json"
+        options["response_schema"] = response_schema
+    return types.GenerateContentConfig(**options) if options else None
+
+def record_sizes(prompt_text, response_text):
+    """Count prompt and response characters for the current operation"""
+    operation = current_operation.get()
+    prompt_chars.observe(len(prompt_text), operation=operation)
+    response_chars.observe(len(response_text or ""), operation=operation)
+
+def size_class(prompt_tokens):
+    """Prompt size label under which call latencies are recorded"""
+    for limit, label in PROMPT_SIZE_CLASSES:
+        if prompt_tokens <= limit:
+            return label
+    return "larger"
+
+def tail_latency(model, size):
+    """Recorded TAIL_PERCENTILE latency of model for prompts of this size, or None until there are enough samples"""
+    if TAIL_PERCENTILE <= 0 or llm_latency.count(model=model, size=size) < LATENCY_MIN_SAMPLES:
+        return None
+    return llm_latency.quantile(TAIL_PERCENTILE, model=model, size=size)
+
+def light_tier_enabled():
+    """Whether a light model distinct from MODEL_NAME is configured and available"""
+    return bool(LIGHT_MODEL_NAME) and LIGHT_MODEL_NAME != MODEL_NAME and not light_model_missing.is_set()
+
+def choose_model(prompt_tokens, free_text):
+    """Model for a call: the light tier for small free-text prompts, unless its recorded tail latency there is worse
+
+    Structured (schema) and cached-content calls always use MODEL_NAME, which cached
+    analyses and Gemini cached contents are tied to. ROUTE_EXPLORE of small calls try
+    the other tier so both latency estimates stay current.
+    """
+    if not free_text or prompt_tokens > LIGHT_MAX_TOKENS or not light_tier_enabled():
+        return MODEL_NAME
+    size = size_class(prompt_tokens)
+    preferred, other = LIGHT_MODEL_NAME, MODEL_NAME
+    light, full = tail_latency(LIGHT_MODEL_NAME, size), tail_latency(MODEL_NAME, size)
+    if light is not None and full is not None and light > full:
+        preferred, other = other, preferred
+    return other if random.random() < ROUTE_EXPLORE else preferred
+
+def routing_table():
+    """For each prompt size: the model small free-text calls go to and the hedge delay per model"""
+    table = {}
+    for _, size in PROMPT_SIZE_CLASSES + ((None, "larger"),):
+        light, full = tail_latency(LIGHT_MODEL_NAME, size), tail_latency(MODEL_NAME, size)
+        table[size] = {
+            "light_model": light_tier_enabled() and not (light is not None and full is not None and light > full),
+            "hedge_after": {model: after for model, after in ((LIGHT_MODEL_NAME, light), (MODEL_NAME, full)) if model and after is not None}
+        }
+    return table
+
+def may_hedge():
+    """Whether a duplicate request fits the hedge budget, a closed breaker and a free in-flight slot"""
+    with metrics_lock:
+        within_budget = metrics["hedges"] < HEDGE_MAX_RATIO * metrics["calls"]
+    return within_budget and breaker.state == "closed" and (in_flight.limit <= 0 or in_flight.in_flight < in_flight.limit)
+
+def timed(model, size, call):
+    """call wrapped to record its latency for model and size when it succeeds"""
+    def run():
+        started = time.monotonic()
+        result = call()
+        llm_latency.observe(time.monotonic() - started, model=model, size=size)
+        return result
+    return run
+
+def timed_async(model, size, call):
+    """Non-blocking timed"""
+    async def run():
+        started = time.monotonic()
+        result = await call()
+        llm_latency.observe(time.monotonic() - started, model=model, size=size)
+        return result
+    return run
+
+def submit_hedged(make_call):
+    """Run make_call on a free hedge_pool thread; None if every thread is taken (the pool never queues)"""
+    if not hedge_threads.try_acquire():
+        return None
+    future = hedge_pool.submit(contextvars.copy_context().run, make_call)
+    future.add_done_callback(lambda _: hedge_threads.release())
+    return future
+
+def hedged(make_call, delay):
+    """make_call(), plus a duplicate if no answer came within delay seconds; the first success wins
+
+    The call stays on the caller's thread unless a hedge could fire: a thread blocked in
+    a synchronous HTTP call cannot also watch the clock, so only then does it move to
+    hedge_pool. A running synchronous call cannot be cancelled either, so the slower
+    copy runs to completion in the background and its answer is dropped. Until then it
+    keeps its pool thread and its in-flight slot, so it still counts against
+    GEMINI_MAX_IN_FLIGHT.
+    """
+    if delay is None or not may_hedge():
+        return make_call()
+    primary = submit_hedged(make_call)
+    if primary is None:
+        return make_call()
+    done, _ = wait([primary], timeout=delay)
+    if done or not may_hedge():
+        return primary.result()
+    hedge = submit_hedged(make_call)
+    if hedge is None:
+        return primary.result()
+    record("hedges")
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    record("hedge_wins")
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+async def hedged_async(make_call, delay):
+    """Non-blocking hedged; the slower copy is cancelled"""
+    primary = asyncio.ensure_future(make_call())
+    pending = {primary}
+    try:
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done or not may_hedge():
+            return await primary
+        record("hedges")
+        hedge = asyncio.ensure_future(make_call())
+        pending.add(hedge)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        record("hedge_wins")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+def call_model(model, full_prompt, config):
+    """One call to model, hedged once it takes longer than the model's recorded tail latency for the prompt size"""
+    size = size_class(estimate_tokens(full_prompt))
+    call = timed(model, size, lambda: backend.generate(model, full_prompt, config))
+    return hedged(lambda: call_gemini(call, full_prompt), tail_latency(model, size) if HEDGE_MAX_RATIO > 0 else None)
+
+async def call_model_async(model, full_prompt, config):
+    """Non-blocking call_model"""
+    size = size_class(estimate_tokens(full_prompt))
+    call = timed_async(model, size, lambda: backend.generate_async(model, full_prompt, config))
+    return await hedged_async(lambda: call_gemini_async(call, full_prompt), tail_latency(model, size) if HEDGE_MAX_RATIO > 0 else None)
+
+def route(full_prompt, cached_content, response_schema):
+    """Model for a call, counting calls routed to the light tier"""
+    model = choose_model(estimate_tokens(full_prompt), not cached_content and not response_schema)
+    if model != MODEL_NAME:
+        record("light_calls")
+    return model
+
+def falls_back(model, error):
+    """Whether a light-tier call failed in a way the full model might not (e.g. the model is unavailable here)"""
+    if model == MODEL_NAME or error.status not in (400, 403, 404):
+        return False
+    if error.status == 404:
+        light_model_missing.set()
+    record("route_fallbacks")
+    return True
+
+def generate_response(prompt, system_instruction=None, cached_content=None, response_schema=None):
+    """Generate a response from Gemini, optionally on top of a cached prompt prefix or as JSON matching a schema"""
+    full_prompt = build_full_prompt(prompt, system_instruction)
+    config = request_config(cached_content, response_schema)
+    model = route(full_prompt, cached_content, response_schema)
+    with stage("llm"):
+        try:
+            text = call_model(model, full_prompt, config)
+        except GeminiError as e:
+            if not falls_back(model, e):
+                raise
+            text = call_model(MODEL_NAME, full_prompt, config)
+    token_bucket.debit(estimate_tokens(text or ""))
+    record_sizes(full_prompt, text)
+    return text
+
+async def generate_response_async(prompt, system_instruction=None, cached_content=None, response_schema=None):
+    """Generate a response from Gemini without blocking the event loop"""
+    full_prompt = build_full_prompt(prompt, system_instruction)
+    config = request_config(cached_content, response_schema)
+    model = route(full_prompt, cached_content, response_schema)
+    with stage("llm"):
+        try:
+            text = await call_model_async(model, full_prompt, config)
+        except GeminiError as e:
+            if not falls_back(model, e):
+                raise
+            text = await call_model_async(MODEL_NAME, full_prompt, config)
+    token_bucket.debit(estimate_tokens(text or ""))
+    record_sizes(full_prompt, text)
+    return text
+
+def create_cached_context(contents, system_instruction, ttl):
+    """Register a prompt prefix as Gemini cached content and return its name"""
+    full_prompt = build_full_prompt(contents, system_instruction)
+    with stage("llm_cache"):
+        return call_gemini(lambda: backend.create_cache(MODEL_NAME, contents, system_instruction, ttl), full_prompt)
+
+async def create_cached_context_async(contents, system_instruction, ttl):
+    """Non-blocking create_cached_context"""
+    full_prompt = build_full_prompt(contents, system_instruction)
+    with stage("llm_cache"):
+        return await call_gemini_async(lambda: backend.create_cache_async(MODEL_NAME, contents, system_instruction, ttl), full_prompt)
+
+def delete_cached_context(name):
+    """Delete Gemini cached content; failures are ignored since the cache expires on its own"""
+    try:
+        backend.delete_cache(name)
+    except Exception:
+        record("cache_delete_failures")
+
+def generate_response_stream(prompt, system_instruction=None, response_schema=None):
+    """Generate a response from Gemini, yielding text chunks as they arrive
+
+    Retries only happen before the first chunk; later failures end the stream.
+    """
+    full_prompt = build_full_prompt(prompt, system_instruction)
+    config = request_config(response_schema=response_schema)
+    
+    def start():
+        chunks = iter(backend.stream(MODEL_NAME, full_prompt, config))
+        return next(chunks, None), chunks
+    
+    started = time.perf_counter()
+    first, chunks = call_gemini(start, full_prompt, keep_slot=True)
+    generated = 0
+    try:
+        if first is not None:
+            generated += len(first)
+            yield first
+        for chunk in chunks:
+            generated += len(chunk)
+            yield chunk
     except Exception as e:
-        raise Exception(f"Gemini API error: {str(e)}")
+        raise classify_error(e)
+    finally:
+        in_flight.release()
+        token_bucket.debit(generated // 4)
+        record_stage("llm", time.perf_counter() - started)
+        prompt_chars.observe(len(full_prompt), operation=current_operation.get())
+        response_chars.observe(generated, operation=current_operation.get())
 
-def parse_json_response(response_text):
-    """Parse JSON from Gemini response, handling markdown code blocks"""
+async def generate_response_stream_async(prompt, system_instruction=None, response_schema=None):
+    """Non-blocking generate_response_stream, yielding text chunks as they arrive"""
+    full_prompt = build_full_prompt(prompt, system_instruction)
+    config = request_config(response_schema=response_schema)
+    
+    async def start():
+        chunks = backend.stream_async(MODEL_NAME, full_prompt, config).__aiter__()
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return first, chunks
+    
+    started = time.perf_counter()
+    first, chunks = await call_gemini_async(start, full_prompt, keep_slot=True)
+    generated = 0
+    try:
+        if first is not None:
+            generated += len(first)
+            yield first
+        async for chunk in chunks:
+            generated += len(chunk)
+            yield chunk
+    except Exception as e:
+        raise classify_error(e)
+    finally:
+        in_flight.release()
+        token_bucket.debit(generated // 4)
+        record_stage("llm", time.perf_counter() - started)
+        prompt_chars.observe(len(full_prompt), operation=current_operation.get())
+        response_chars.observe(generated, operation=current_operation.get())
+
+class JSONFieldStream:
+    """Incrementally scan a streamed JSON object and report each top-level field once it is complete"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.member_start = None
+        self.finished = False
+
+    def feed(self, chunk):
+        """Consume a chunk of model output and return the (key, value) pairs it completed"""
+        self.buffer += chunk
+        fields = []
+        text = self.buffer
+        i = self.position
+        while i < len(text) and not self.finished:
+            char = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                if char == '{':
+                    self.depth = 1
+                    self.member_start = i + 1
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self._emit(text[self.member_start:i], fields)
+                    self.finished = True
+            elif char == ',' and self.depth == 1:
+                self._emit(text[self.member_start:i], fields)
+                self.member_start = i + 1
+            i += 1
+        self.position = i
+        return fields
+
+    def _emit(self, member, fields):
+        if not member.strip():
+            return
+        try:
+            fields.extend(json.loads("{" + member + "}").items())
+        except json.JSONDecodeError:
+            pass
+
+def parse_json_response(response_text, fallback=True):
+    """Parse JSON from Gemini response, handling markdown code blocks
+
+    Text that holds no JSON becomes the summary of an otherwise empty result marked
+    degraded, shown escaped in its transformed_html, or raises ValueError when
+    fallback is False.
+    """
     text = response_text.strip()
     
+    # Schema-constrained responses are bare JSON, so try that before any fallback
+    if text.startswith('{'):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+    
     json_match = re.search(r'```(?:json)?\s*([\s\S]*?)```', text)
     if json_match:
         text = json_match.group(1).strip()
@@ -58,10 +666,13 @@ def parse_json_response(response_text):
             except json.JSONDecodeError:
                 pass
         
+        if not fallback:
+            raise ValueError("Gemini response is not valid JSON")
         return {
             "summary": text,
             "key_points": [],
             "highlights": [],
             "actions": [],
-            "transformed_html": f"<div class='content'>{text}</div>"
+            "transformed_html": f"<div class='content'>{html.escape(text)}</div>",
+            "degraded": True
         }
@@ -0,0 +1,237 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from agents.agent_core import analyze_webpage
+from utils.concurrency import KeyedLimiter, host_of
+from utils.job_store import create_job_store
+
+JOB_RETENTION = 3600
+JOB_POLL_INTERVAL = 0.5
+
+def analyze_job_item(url, mode):
+    """Analyze one job item; a batch names its pages up front, so their related links are not prefetched"""
+    return analyze_webpage(url, mode, prefetch=False)
+
+def progress_summary(job_id, created_at, finished_at, counts, total, completed):
+    """Progress counters of a job as reported by the /jobs endpoints"""
+    return {
+        "job_id": job_id,
+        "status": "finished" if finished_at else "running",
+        "total": total,
+        "completed": completed,
+        **{status: counts.get(status, 0) for status in ("pending", "running", "retrying", "succeeded", "failed")},
+        "created_at": created_at,
+        "finished_at": finished_at
+    }
+
+class Job:
+    """A batch of (url, mode) items analyzed in the background"""
+
+    def __init__(self, items, store=None):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.finished_at = None
+        self.items = [
+            {"index": i, "url": item["url"], "mode": item["mode"], "status": "pending",
+             "attempts": 0, "result": None, "error": None}
+            for i, item in enumerate(items)
+        ]
+        self.completed = []
+        self.condition = threading.Condition()
+        self.store = store
+        if store is not None:
+            store.create(self.id, self.created_at, self.items)
+
+    def progress(self):
+        """Summary of how far the job has got"""
+        with self.condition:
+            counts = {}
+            for item in self.items:
+                counts[item["status"]] = counts.get(item["status"], 0) + 1
+            return progress_summary(self.id, self.created_at, self.finished_at, counts, len(self.items), len(self.completed))
+
+    def results_since(self, since=0):
+        """Completed items in completion order, starting at offset since"""
+        with self.condition:
+            return [self._public(self.items[i]) for i in self.completed[since:]]
+
+    def wait_for_results(self, since, timeout):
+        """Block until there are results past since or the job has finished"""
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.completed) > since or self.finished_at, timeout)
+        return self.results_since(since)
+
+    def _public(self, item):
+        return {key: item[key] for key in ("index", "url", "mode", "status", "attempts", "result", "error")}
+
+    def _save(self, index, position=None):
+        """Mirror an item's state to the shared store; call with the condition held"""
+        if self.store is not None:
+            self.store.update_item(self.id, self.items[index], position)
+
+class StoredJob:
+    """Read-only view of a job that another worker is running, read from the shared job store"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.id = job_id
+
+    def progress(self):
+        """Summary of how far the job has got"""
+        return progress_summary(self.id, *self.store.summary(self.id))
+
+    def results_since(self, since=0):
+        """Completed items in completion order, starting at offset since"""
+        return self.store.completed_items(self.id, since)
+
+    def wait_for_results(self, since, timeout):
+        """Poll the store until there are results past since, the job has finished or timeout has passed"""
+        deadline = time.monotonic() + timeout
+        while True:
+            results = self.results_since(since)
+            if results or self.progress()["status"] == "finished" or time.monotonic() >= deadline:
+                return results
+            time.sleep(JOB_POLL_INTERVAL)
+
+class JobManager:
+    """Runs batch jobs through a bounded worker pool with global and per-host concurrency limits
+
+    Jobs run in the process that accepted them. With a store, their state is also written
+    there, so any worker sharing the store can report progress and results.
+    """
+
+    def __init__(self, workers=8, per_host=2, max_retries=2, retry_delay=1.0, analyze=analyze_job_item, store=None):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.analyze = analyze
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+        self.host_limiter = KeyedLimiter(per_host)
+        self.jobs = {}
+        self.queue = deque()
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def submit(self, items):
+        """Create a job for a list of {"url", "mode"} items and start working on it"""
+        job = Job(items, self.store)
+        with self.lock:
+            self._prune()
+            self.jobs[job.id] = job
+            self.queue.extend((job, item["index"]) for item in job.items)
+        if not job.items:
+            self._finish(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id):
+        """Look up a job by id, falling back to the shared store for jobs other workers run"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None and self.store is not None and self.store.summary(job_id) is not None:
+            job = StoredJob(self.store, job_id)
+        return job
+
+    def _dispatch(self):
+        """Start queued items while there are free workers and their hosts have capacity"""
+        with self.lock:
+            deferred = deque()
+            while self.queue and self.running < self.workers:
+                job, index = self.queue.popleft()
+                host = host_of(job.items[index]["url"])
+                if not self.host_limiter.try_acquire(host):
+                    deferred.append((job, index))
+                    continue
+                self.running += 1
+                with job.condition:
+                    job.items[index]["status"] = "running"
+                    job._save(index)
+                self.executor.submit(self._run, job, index, host)
+            deferred.extend(self.queue)
+            self.queue = deferred
+
+    def _run(self, job, index, host):
+        item = job.items[index]
+        try:
+            result = self.analyze(item["url"], item["mode"])
+            error = None
+        except Exception as e:
+            result = None
+            error = str(e)
+        finally:
+            self.host_limiter.release(host)
+            with self.lock:
+                self.running -= 1
+
+        with job.condition:
+            item["attempts"] += 1
+            if error is None:
+                item["status"] = "succeeded"
+                item["result"] = result
+                item["error"] = None
+            elif item["attempts"] <= self.max_retries:
+                item["status"] = "retrying"
+                item["error"] = error
+            else:
+                item["status"] = "failed"
+                item["error"] = error
+            position = None
+            if item["status"] != "retrying":
+                position = len(job.completed)
+                job.completed.append(index)
+                job.condition.notify_all()
+            job._save(index, position)
+            done = len(job.completed) == len(job.items)
+
+        if item["status"] == "retrying":
+            delay = self.retry_delay * (2 ** (item["attempts"] - 1))
+            timer = threading.Timer(delay, self._requeue, (job, index))
+            timer.daemon = True
+            timer.start()
+        elif done:
+            self._finish(job)
+        self._dispatch()
+
+    def _requeue(self, job, index):
+        with job.condition:
+            job.items[index]["status"] = "pending"
+            job._save(index)
+        with self.lock:
+            self.queue.append((job, index))
+        self._dispatch()
+
+    def _finish(self, job):
+        with job.condition:
+            job.finished_at = time.time()
+            if job.store is not None:
+                job.store.finish(job.id, job.finished_at)
+            job.condition.notify_all()
+
+    def _prune(self):
+        """Forget jobs that finished more than JOB_RETENTION seconds ago"""
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [j.id for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+        if self.store is not None:
+            self.store.prune(cutoff)
+
+job_manager = None
+job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """Get or initialize the shared job manager"""
+    global job_manager
+    with job_manager_lock:
+        if job_manager is None:
+            job_manager = JobManager(
+                workers=int(os.environ.get('JOBS_WORKERS', 8)),
+                per_host=int(os.environ.get('JOBS_PER_HOST', 2)),
+                max_retries=int(os.environ.get('JOBS_MAX_RETRIES', 2)),
+                retry_delay=float(os.environ.get('JOBS_RETRY_DELAY', 1.0)),
+                store=create_job_store()
+            )
+        return job_manager
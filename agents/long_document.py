@@ -0,0 +1,139 @@
+import hashlib
+import os
+from agents.gemini_client import estimate_tokens, parse_json_response
+from agents.prompt_builder import LOW_VALUE_HEADINGS, normalize
+from agents.result_format import response_schema, string, string_list, record_list
+from utils.text_index import build_chunks
+
+# Bump whenever the prompt or schema below changes so cached chunk summaries are not reused
+PROMPT_VERSION = "1"
+
+CHUNK_TOKENS = int(os.environ.get('LONG_DOC_CHUNK_TOKENS', 6000))
+PIECE_CHARS = 1200
+# Past half a chunk, about one piece in BOUNDARY_ODDS ends the chunk early (see split_document)
+BOUNDARY_ODDS = 4
+
+RESPONSE_SCHEMA = response_schema({
+    "summary": string(),
+    "key_facts": string_list(),
+    "terms": record_list("term", "definition")
+}, required=("summary", "key_facts"))
+
+SYSTEM_INSTRUCTION = """You are summarizing one part of a long webpage.
+The summaries of all parts are combined afterwards into the final analysis, so keep every fact,
+figure, name, date, definition and conclusion this part states, and add nothing it does not.
+
+You MUST respond with valid JSON only, no other text. Use this exact structure:
+{
+    "summary": "What this part says, in at most 120 words",
+    "key_facts": ["a fact with its figures", "another fact"],
+    "terms": [{"term": "term1", "definition": "def1"}]
+}"""
+
+def digest(text):
+    """Short content hash of a chunk"""
+    return hashlib.sha256(normalize(text).encode('utf-8')).hexdigest()[:16]
+
+def make_chunk(pieces):
+    """One map chunk from consecutive pieces: its text under the section headings, a title and a hash"""
+    lines = []
+    headings = []
+    heading = None
+    for piece in pieces:
+        if piece["heading"] != heading or not lines:
+            heading = piece["heading"]
+            lines.append(f"## {heading or 'Page text'}")
+            if heading and heading not in headings:
+                headings.append(heading)
+        lines.append(piece["text"])
+    text = '\n'.join(lines)
+    if not headings:
+        title = "Page text"
+    elif len(headings) == 1:
+        title = headings[0]
+    else:
+        title = f"{headings[0]} to {headings[-1]}"
+    section_id = next((piece["id"] for piece in pieces if piece["id"]), "")
+    return {"title": title, "id": section_id, "text": text, "tokens": estimate_tokens(text), "hash": digest(text)}
+
+def split_document(parsed_content, text_content, max_tokens=CHUNK_TOKENS):
+    """Cut a page into map chunks of at most about max_tokens, along section boundaries
+
+    Sections with boilerplate headings (references, navigation, ...) are left out. Besides
+    closing when full, a chunk past half full also closes after a piece whose hash says so;
+    since those boundaries follow the content rather than positions, an edit early in a
+    page only changes the chunks around it and the rest keep their hashes.
+    """
+    chunks = []
+    current = []
+    used = 0
+    for piece in build_chunks(parsed_content, text_content, PIECE_CHARS):
+        if piece["heading"] and LOW_VALUE_HEADINGS.match(piece["heading"].strip()):
+            continue
+        cost = estimate_tokens(piece["text"])
+        if current and used + cost > max_tokens:
+            chunks.append(make_chunk(current))
+            current, used = [], 0
+        current.append(piece)
+        used += cost
+        if used >= max_tokens // 2 and int(digest(piece["text"]), 16) % BOUNDARY_ODDS == 0:
+            chunks.append(make_chunk(current))
+            current, used = [], 0
+    if current:
+        chunks.append(make_chunk(current))
+    return chunks
+
+def build_prompt(chunk, parsed_content):
+    """Build the map prompt and system instruction for one chunk"""
+    prompt = f"""Summarize this part of a long webpage:
+
+PAGE TITLE: {parsed_content.get('title', 'Unknown')}
+
+PART CONTENT:
+{chunk['text']}"""
+
+    return prompt, SYSTEM_INSTRUCTION
+
+def parse_summary(response):
+    """A chunk summary from the map answer; text without JSON becomes the summary, marked degraded"""
+    summary = parse_json_response(response)
+    if not isinstance(summary, dict):
+        summary = {"summary": str(summary), "degraded": True}
+    parsed = {
+        "summary": str(summary.get("summary") or ""),
+        "key_facts": [str(fact) for fact in summary.get("key_facts") or [] if fact],
+        "terms": [term for term in summary.get("terms") or [] if isinstance(term, dict)]
+    }
+    if summary.get("degraded"):
+        parsed["degraded"] = True
+    return parsed
+
+def summary_lines(summary):
+    """A chunk summary as paragraphs for the reduce prompt"""
+    lines = [summary["summary"]]
+    lines += [f"- {fact}" for fact in summary["key_facts"]]
+    lines += [f"{term.get('term', '')}: {term.get('definition', '')}" for term in summary["terms"]]
+    return [line for line in lines if line.strip()]
+
+def summary_page(parsed_content, chunks, summaries):
+    """parsed_content with its sections replaced by one section per chunk summary, in page order
+
+    Passed to a mode's build_prompt with empty text content, this makes the reduce
+    prompt: the mode's usual instructions, headings and links over the summaries.
+    """
+    sections = []
+    for number, (chunk, summary) in enumerate(zip(chunks, summaries), 1):
+        sections.append({
+            "heading": f"Part {number} of {len(chunks)}: {chunk['title']}",
+            "id": chunk["id"],
+            "content": summary_lines(summary)
+        })
+    return dict(parsed_content, sections=sections)
+
+def reduce_budget(page, base_budget):
+    """Token budget that leaves room for every chunk summary in the reduce prompt on top of base_budget
+
+    build_page_context gives up to a quarter of the budget to headings and links, hence the 4/3.
+    """
+    summary_tokens = sum(estimate_tokens(line) + 10 for section in page["sections"] for line in section["content"])
+    return base_budget + summary_tokens * 4 // 3
@@ -1,12 +1,32 @@
 from agents.gemini_client import generate_response, parse_json_response
+from agents.prompt_builder import build_page_context
+from agents.result_format import response_schema, string, string_list, record, record_list, ACTION_SCHEMA, LINK_SCHEMA
+from agents.result_format import render_sections, paragraph, bullet_list, table
 
-def transform(content, parsed_content):
-    """Transform content for professional/business mode"""
-    
-    links_info = format_links(parsed_content.get('links', []))
-    base_url = parsed_content.get('base_url', '')
-    
-    system_instruction = """You are an adaptive web agent helping professionals analyze business content.
+# Bump whenever the prompt or schema below changes so cached analyses are not reused
+PROMPT_VERSION = "3"
+
+PRICING_SCHEMA = record("tier", "price")
+PRICING_SCHEMA["properties"]["features"] = string_list()
+
+RESPONSE_SCHEMA = response_schema({
+    "summary": string(),
+    "key_points": string_list(),
+    "kpis": record_list("metric", "value", "trend"),
+    "pricing": {"type": "ARRAY", "items": PRICING_SCHEMA},
+    "usp": string_list(),
+    "swot": {
+        "type": "OBJECT",
+        "properties": {name: string_list() for name in ("strengths", "weaknesses", "opportunities", "threats")}
+    },
+    "competitors": string_list(),
+    "highlights": string_list(),
+    "action_items": string_list(),
+    "actions": ACTION_SCHEMA,
+    "related_links": LINK_SCHEMA
+})
+
+SYSTEM_INSTRUCTION = """You are an adaptive web agent helping professionals analyze business content.
 Transform the given webpage content into a business-focused analysis.
 
 You MUST respond with valid JSON only, no other text. Use this exact structure:
@@ -32,8 +52,7 @@ You MUST respond with valid JSON only, no other text. Use this exact structure:
     "related_links": [
         {"label": "Pricing Page", "url": "https://example.com/pricing"},
         {"label": "Contact Sales", "url": "https://example.com/contact"}
-    ],
-    "transformed_html": "<div class='professional-content'>formatted HTML</div>"
+    ]
 }
 
 Focus on:
@@ -45,30 +64,36 @@ Focus on:
 - Including related_links with REAL URLs found in the webpage for business actions
 - ONLY use URLs that actually exist in the LINKS section provided - never make up URLs"""
 
+def build_prompt(content, parsed_content, token_budget=None):
+    """Build the professional/business mode prompt and system instruction"""
+    
+    page = build_page_context(content, parsed_content, token_budget)
+    base_url = parsed_content.get('base_url', '')
+    
+    system_instruction = SYSTEM_INSTRUCTION
+
     prompt = f"""Analyze this webpage content from a business/professional perspective:
 
 TITLE: {parsed_content.get('title', 'Unknown')}
 BASE URL: {base_url}
 
 HEADINGS:
-{format_headings(parsed_content.get('headings', []))}
+{page['headings']}
 
 MAIN CONTENT:
-{content[:10000]}
-
-SECTIONS:
-{format_sections(parsed_content.get('sections', []))}
+{page['content']}
 
 LINKS ON PAGE:
-{links_info}
+{page['links']}
 
 Create a comprehensive business analysis.
 For related_links, use ONLY real URLs from the LINKS ON PAGE section above that would help professionals.
 Examples: Pricing, Contact, Demo, Features, Specifications, Support, Compare, About Us."""
 
-    response = generate_response(prompt, system_instruction)
-    result = parse_json_response(response)
-    
+    return prompt, system_instruction
+
+def apply_defaults(result):
+    """Fill in professional mode fields missing from the model's JSON"""
     if "kpis" not in result:
         result["kpis"] = []
     if "pricing" not in result:
@@ -86,20 +111,34 @@ Examples: Pricing, Contact, Demo, Features, Specifications, Support, Compare, Ab
     
     return result
 
-def format_headings(headings):
-    """Format headings for prompt"""
-    return '\n'.join([f"- [{h['level']}] {h['text']} (id: {h.get('id', 'none')})" for h in headings[:20]])
-
-def format_sections(sections):
-    """Format sections for prompt"""
-    result = []
-    for s in sections[:10]:
-        heading = s.get('heading', 'Untitled')
-        section_id = s.get('id', '')
-        content = ' '.join(s.get('content', [])[:3])[:500]
-        result.append(f"## {heading} (id: {section_id})\n{content}")
-    return '\n\n'.join(result)
-
-def format_links(links):
-    """Format links for prompt"""
-    return '\n'.join([f"- {l.get('text', 'Link')}: {l.get('url', '')}" for l in links[:30]])
+def render_swot(swot):
+    """2x2 SWOT grid"""
+    if not isinstance(swot, dict):
+        return ""
+    quadrants = [
+        f"<div class='swot-{name}'><h4>{name.title()}</h4>{bullet_list(swot.get(name))}</div>"
+        for name in ("strengths", "weaknesses", "opportunities", "threats") if swot.get(name)
+    ]
+    return f"<div class='swot'>{''.join(quadrants)}</div>" if quadrants else ""
+
+def render_html(result):
+    """Professional view of a result, rendered locally from its fields"""
+    return render_sections('professional-content', [
+        ("summary", "Executive Summary", paragraph(result.get("summary"))),
+        ("key_points", "Key Insights", bullet_list(result.get("key_points"))),
+        ("kpis", "KPIs", table(result.get("kpis"), [("metric", "Metric"), ("value", "Value"), ("trend", "Trend")])),
+        ("pricing", "Pricing", table(result.get("pricing"), [("tier", "Tier"), ("price", "Price"), ("features", "Features")])),
+        ("usp", "Unique Selling Points", bullet_list(result.get("usp"))),
+        ("swot", "SWOT", render_swot(result.get("swot"))),
+        ("competitors", "Competitors", bullet_list(result.get("competitors"))),
+        ("action_items", "Action Items", bullet_list(result.get("action_items"))),
+        ("highlights", "Highlights", bullet_list(result.get("highlights")))
+    ])
+
+def transform(content, parsed_content):
+    """Transform content for professional/business mode"""
+    prompt, system_instruction = build_prompt(content, parsed_content)
+    response = generate_response(prompt, system_instruction, response_schema=RESPONSE_SCHEMA)
+    result = apply_defaults(parse_json_response(response))
+    result["transformed_html"] = render_html(result)
+    return result
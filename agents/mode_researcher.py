@@ -1,12 +1,25 @@
 from agents.gemini_client import generate_response, parse_json_response
-
-def transform(content, parsed_content):
-    """Transform content for researcher mode"""
-    
-    links_info = format_links(parsed_content.get('links', []))
-    base_url = parsed_content.get('base_url', '')
-    
-    system_instruction = """You are an adaptive web agent helping researchers analyze content.
+from agents.prompt_builder import build_page_context
+from agents.result_format import response_schema, string, string_list, record_list, ACTION_SCHEMA, LINK_SCHEMA
+from agents.result_format import render_sections, paragraph, bullet_list, table
+
+# Bump whenever the prompt or schema below changes so cached analyses are not reused
+PROMPT_VERSION = "3"
+
+RESPONSE_SCHEMA = response_schema({
+    "summary": string(),
+    "key_points": string_list(),
+    "methodology": string(),
+    "results": string_list(),
+    "research_gaps": string_list(),
+    "statistics": record_list("metric", "value"),
+    "citations": string_list(),
+    "highlights": string_list(),
+    "actions": ACTION_SCHEMA,
+    "related_links": LINK_SCHEMA
+})
+
+SYSTEM_INSTRUCTION = """You are an adaptive web agent helping researchers analyze content.
 Transform the given webpage content into a research-focused analysis.
 
 You MUST respond with valid JSON only, no other text. Use this exact structure:
@@ -26,8 +39,7 @@ You MUST respond with valid JSON only, no other text. Use this exact structure:
     "related_links": [
         {"label": "References", "url": "https://example.com/refs"},
         {"label": "Related Research", "url": "https://example.com/related"}
-    ],
-    "transformed_html": "<div class='research-content'>formatted HTML</div>"
+    ]
 }
 
 Focus on:
@@ -38,33 +50,39 @@ Focus on:
 - Including related_links with REAL URLs found in the webpage for further research
 - ONLY use URLs that actually exist in the LINKS section provided - never make up URLs"""
 
+def build_prompt(content, parsed_content, token_budget=None):
+    """Build the researcher mode prompt and system instruction"""
+    
+    page = build_page_context(content, parsed_content, token_budget, include_tables=True)
+    base_url = parsed_content.get('base_url', '')
+    
+    system_instruction = SYSTEM_INSTRUCTION
+
     prompt = f"""Analyze this webpage content from a research perspective:
 
 TITLE: {parsed_content.get('title', 'Unknown')}
 BASE URL: {base_url}
 
 HEADINGS:
-{format_headings(parsed_content.get('headings', []))}
+{page['headings']}
 
 MAIN CONTENT:
-{content[:10000]}
-
-SECTIONS:
-{format_sections(parsed_content.get('sections', []))}
+{page['content']}
 
 TABLES/DATA:
-{format_tables(parsed_content.get('tables', []))}
+{page['tables']}
 
 LINKS ON PAGE:
-{links_info}
+{page['links']}
 
 Create a comprehensive research analysis.
 For related_links, use ONLY real URLs from the LINKS ON PAGE section above that would help researchers find more information.
 Examples: References, Citations, See Also, External Links, Further Reading, Related Topics."""
 
-    response = generate_response(prompt, system_instruction)
-    result = parse_json_response(response)
-    
+    return prompt, system_instruction
+
+def apply_defaults(result):
+    """Fill in researcher mode fields missing from the model's JSON"""
     if "methodology" not in result:
         result["methodology"] = ""
     if "results" not in result:
@@ -78,27 +96,23 @@ Examples: References, Citations, See Also, External Links, Further Reading, Rela
     
     return result
 
-def format_headings(headings):
-    """Format headings for prompt"""
-    return '\n'.join([f"- [{h['level']}] {h['text']} (id: {h.get('id', 'none')})" for h in headings[:20]])
-
-def format_sections(sections):
-    """Format sections for prompt"""
-    result = []
-    for s in sections[:10]:
-        heading = s.get('heading', 'Untitled')
-        section_id = s.get('id', '')
-        content = ' '.join(s.get('content', [])[:3])[:500]
-        result.append(f"## {heading} (id: {section_id})\n{content}")
-    return '\n\n'.join(result)
-
-def format_tables(tables):
-    """Format tables for prompt"""
-    result = []
-    for table in tables[:3]:
-        result.append('\n'.join([' | '.join(row) for row in table[:5]]))
-    return '\n\n'.join(result)
-
-def format_links(links):
-    """Format links for prompt"""
-    return '\n'.join([f"- {l.get('text', 'Link')}: {l.get('url', '')}" for l in links[:30]])
+def render_html(result):
+    """Researcher view of a result, rendered locally from its fields"""
+    return render_sections('research-content', [
+        ("summary", "Abstract", paragraph(result.get("summary"))),
+        ("key_points", "Key Findings", bullet_list(result.get("key_points"))),
+        ("methodology", "Methodology", paragraph(result.get("methodology"))),
+        ("results", "Results", bullet_list(result.get("results"))),
+        ("statistics", "Statistics", table(result.get("statistics"), [("metric", "Metric"), ("value", "Value")])),
+        ("research_gaps", "Research Gaps", bullet_list(result.get("research_gaps"))),
+        ("citations", "Citations", bullet_list(result.get("citations"))),
+        ("highlights", "Highlights", bullet_list(result.get("highlights")))
+    ])
+
+def transform(content, parsed_content):
+    """Transform content for researcher mode"""
+    prompt, system_instruction = build_prompt(content, parsed_content)
+    response = generate_response(prompt, system_instruction, response_schema=RESPONSE_SCHEMA)
+    result = apply_defaults(parse_json_response(response))
+    result["transformed_html"] = render_html(result)
+    return result
@@ -1,12 +1,23 @@
 from agents.gemini_client import generate_response, parse_json_response
+from agents.prompt_builder import build_page_context
+from agents.result_format import response_schema, string, string_list, record_list, ACTION_SCHEMA, LINK_SCHEMA
+from agents.result_format import render_sections, paragraph, bullet_list, definition_list
 
-def transform(content, parsed_content):
-    """Transform content for student mode"""
-    
-    links_info = format_links(parsed_content.get('links', []))
-    base_url = parsed_content.get('base_url', '')
-    
-    system_instruction = """You are an adaptive web agent helping students learn effectively.
+# Bump whenever the prompt or schema below changes so cached analyses are not reused
+PROMPT_VERSION = "3"
+
+RESPONSE_SCHEMA = response_schema({
+    "summary": string(),
+    "key_points": string_list(),
+    "definitions": record_list("term", "definition"),
+    "flashcards": record_list("question", "answer"),
+    "highlights": string_list(),
+    "exam_notes": string_list(),
+    "actions": ACTION_SCHEMA,
+    "related_links": LINK_SCHEMA
+})
+
+SYSTEM_INSTRUCTION = """You are an adaptive web agent helping students learn effectively.
 Transform the given webpage content into student-friendly learning materials.
 
 You MUST respond with valid JSON only, no other text. Use this exact structure:
@@ -24,8 +35,7 @@ You MUST respond with valid JSON only, no other text. Use this exact structure:
     "related_links": [
         {"label": "Related Topic", "url": "https://example.com/related"},
         {"label": "See Also", "url": "https://example.com/also"}
-    ],
-    "transformed_html": "<div class='student-content'>formatted HTML content</div>"
+    ]
 }
 
 Focus on:
@@ -36,30 +46,36 @@ Focus on:
 - Including related_links with REAL URLs found in the webpage that would help students learn more
 - ONLY use URLs that actually exist in the LINKS section provided - never make up URLs"""
 
+def build_prompt(content, parsed_content, token_budget=None):
+    """Build the student mode prompt and system instruction"""
+    
+    page = build_page_context(content, parsed_content, token_budget)
+    base_url = parsed_content.get('base_url', '')
+    
+    system_instruction = SYSTEM_INSTRUCTION
+
     prompt = f"""Analyze this webpage content and create student learning materials:
 
 TITLE: {parsed_content.get('title', 'Unknown')}
 BASE URL: {base_url}
 
 HEADINGS:
-{format_headings(parsed_content.get('headings', []))}
+{page['headings']}
 
 MAIN CONTENT:
-{content[:10000]}
-
-SECTIONS:
-{format_sections(parsed_content.get('sections', []))}
+{page['content']}
 
 LINKS ON PAGE:
-{links_info}
+{page['links']}
 
 Create comprehensive student-focused learning materials.
 For related_links, use ONLY real URLs from the LINKS ON PAGE section above that would help students learn more about this topic.
 Examples: References, See Also, Related Topics, Further Reading, etc."""
 
-    response = generate_response(prompt, system_instruction)
-    result = parse_json_response(response)
-    
+    return prompt, system_instruction
+
+def apply_defaults(result):
+    """Fill in student mode fields missing from the model's JSON"""
     if "definitions" not in result:
         result["definitions"] = []
     if "flashcards" not in result:
@@ -71,20 +87,21 @@ Examples: References, See Also, Related Topics, Further Reading, etc."""
     
     return result
 
-def format_headings(headings):
-    """Format headings for prompt"""
-    return '\n'.join([f"- [{h['level']}] {h['text']} (id: {h.get('id', 'none')})" for h in headings[:20]])
-
-def format_sections(sections):
-    """Format sections for prompt"""
-    result = []
-    for s in sections[:10]:
-        heading = s.get('heading', 'Untitled')
-        section_id = s.get('id', '')
-        content = ' '.join(s.get('content', [])[:3])[:500]
-        result.append(f"## {heading} (id: {section_id})\n{content}")
-    return '\n\n'.join(result)
-
-def format_links(links):
-    """Format links for prompt"""
-    return '\n'.join([f"- {l.get('text', 'Link')}: {l.get('url', '')}" for l in links[:30]])
+def render_html(result):
+    """Student view of a result, rendered locally from its fields"""
+    return render_sections('student-content', [
+        ("summary", "Summary", paragraph(result.get("summary"))),
+        ("key_points", "Key Points", bullet_list(result.get("key_points"))),
+        ("definitions", "Definitions", definition_list(result.get("definitions"), "term", "definition")),
+        ("flashcards", "Flashcards", definition_list(result.get("flashcards"), "question", "answer")),
+        ("highlights", "Highlights", bullet_list(result.get("highlights"))),
+        ("exam_notes", "Exam Notes", bullet_list(result.get("exam_notes")))
+    ])
+
+def transform(content, parsed_content):
+    """Transform content for student mode"""
+    prompt, system_instruction = build_prompt(content, parsed_content)
+    response = generate_response(prompt, system_instruction, response_schema=RESPONSE_SCHEMA)
+    result = apply_defaults(parse_json_response(response))
+    result["transformed_html"] = render_html(result)
+    return result
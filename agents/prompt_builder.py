@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import re
+from agents.gemini_client import estimate_tokens
+
+DEFAULT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 4000))
+
+HEADING_WEIGHTS = {"h1": 1.0, "h2": 0.9, "h3": 0.75, "h4": 0.6}
+LOW_VALUE_HEADINGS = re.compile(
+    r'^(references|notes|citations|sources|external links|see also|further reading|bibliography|'
+    r'contents|navigation menu|footnotes|works cited|cookie|privacy|legal|terms)\b',
+    re.IGNORECASE
+)
+
+def normalize(text):
+    """Collapse whitespace and case so overlapping copies of a text compare equal"""
+    return ' '.join(text.split()).lower()
+
+def section_score(section, position):
+    """Rank a section by its heading level, its text density and whether it looks like boilerplate"""
+    paragraphs = section.get('content', [])
+    chars = sum(len(p) for p in paragraphs)
+    if not chars:
+        return 0.0
+    density = math.log1p(chars) * math.log1p(chars / len(paragraphs))
+    heading = section.get('heading', '')
+    weight = HEADING_WEIGHTS.get(section.get('level', ''), 0.8)
+    if not heading or position == 0:
+        weight = 1.2
+    if heading and LOW_VALUE_HEADINGS.match(heading.strip()):
+        weight *= 0.1
+    return weight * density
+
+def section_levels(parsed_content):
+    """Attach the heading level to each section by matching headings in page order"""
+    levels = {}
+    for heading in parsed_content.get('headings', []):
+        levels.setdefault((heading['text'], heading.get('id', '')), heading['level'])
+    sections = []
+    for section in parsed_content.get('sections', []):
+        section = dict(section)
+        section['level'] = levels.get((section.get('heading', ''), section.get('id', '')), '')
+        sections.append(section)
+    return sections
+
+def take_within(lines, budget):
+    """Keep leading lines while their estimated tokens fit in budget"""
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept, used
+
+def format_headings(headings, budget):
+    """Heading outline without repeated headings, cut to budget"""
+    seen = set()
+    lines = []
+    for h in headings:
+        key = normalize(h['text'])
+        if key in seen:
+            continue
+        seen.add(key)
+        lines.append(f"- [{h['level']}] {h['text']} (id: {h.get('id') or 'none'})")
+    kept, used = take_within(lines, budget)
+    return '\n'.join(kept), used
+
+def format_links(links, base_url, budget):
+    """Unique absolute links, cut to budget"""
+    seen = {base_url}
+    lines = []
+    for link in links:
+        url = link.get('url', '')
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        lines.append(f"- {link.get('text', 'Link')}: {url}")
+    kept, used = take_within(lines, budget)
+    return '\n'.join(kept), used
+
+def format_tables(tables, budget):
+    """Leading rows of each table, cut to budget"""
+    blocks = []
+    used = 0
+    for table in tables:
+        rows = [' | '.join(row) for row in table[:8]]
+        kept, cost = take_within(rows, budget - used)
+        if not kept:
+            break
+        blocks.append('\n'.join(kept))
+        used += cost
+    return '\n\n'.join(blocks), used
+
+def format_content(text_content, parsed_content, budget):
+    """Fill budget with the highest-value sections, then with page text no section covered"""
+    sections = section_levels(parsed_content)
+    ranked = sorted(range(len(sections)), key=lambda i: section_score(sections[i], i), reverse=True)
+
+    seen = set()
+    chosen = {}
+    used = 0
+    for index in ranked:
+        section = sections[index]
+        header = f"## {section.get('heading') or 'Introduction'} (id: {section.get('id') or 'none'})"
+        header_cost = estimate_tokens(header)
+        if used + header_cost >= budget:
+            break
+        paragraphs = []
+        section_used = header_cost
+        for paragraph in section.get('content', []):
+            key = normalize(paragraph)
+            if key in seen:
+                continue
+            cost = estimate_tokens(paragraph)
+            if used + section_used + cost > budget:
+                break
+            seen.add(key)
+            paragraphs.append(paragraph)
+            section_used += cost
+        if paragraphs:
+            chosen[index] = header + '\n' + '\n'.join(paragraphs)
+            used += section_used
+
+    blocks = [chosen[i] for i in sorted(chosen)]
+
+    covered = '\n'.join(seen)
+    extra = []
+    extra_seen = {normalize(h['text']) for h in parsed_content.get('headings', [])}
+    for line in text_content.splitlines():
+        key = normalize(line)
+        if len(key) < 3 or key in extra_seen or key in covered:
+            continue
+        extra_seen.add(key)
+        extra.append(line)
+    kept, extra_used = take_within(extra, budget - used)
+    if kept:
+        blocks.append("## Other page text\n" + '\n'.join(kept))
+        used += extra_used
+
+    return '\n\n'.join(blocks), used
+
+def build_page_context(text_content, parsed_content, token_budget=None, include_tables=False):
+    """Assemble the headings, content, tables and links prompt blocks within a token budget"""
+    budget = token_budget or DEFAULT_TOKEN_BUDGET
+    base_url = parsed_content.get('base_url', '')
+
+    headings, headings_used = format_headings(parsed_content.get('headings', []), budget // 10)
+    links, links_used = format_links(parsed_content.get('links', []), base_url, budget // 8)
+    tables, tables_used = ("", 0)
+    if include_tables:
+        tables, tables_used = format_tables(parsed_content.get('tables', []), budget // 10)
+
+    content, content_used = format_content(
+        text_content, parsed_content, budget - headings_used - links_used - tables_used
+    )
+
+    return {
+        "headings": headings,
+        "content": content,
+        "tables": tables,
+        "links": links,
+        "tokens": headings_used + links_used + tables_used + content_used
+    }
+
+def format_blocks(blocks):
+    """Changed page blocks as prompt text"""
+    return '\n\n'.join(f"## {block['title']}\n{block['text']}" for block in blocks)
+
+def build_update_prompt(previous_result, changes, parsed_content):
+    """Prompt asking for the fields of an earlier analysis that a page edit makes out of date"""
+    changed = format_blocks(changes["changed"]) or "(none)"
+    added = format_blocks(changes["added"]) or "(none)"
+    removed = '\n'.join(f"- {title}" for title in changes["removed"]) or "(none)"
+    return f"""You analyzed this webpage before. Some of its sections have changed since; the rest of the page is the same.
+
+TITLE: {parsed_content.get('title', 'Unknown')}
+BASE URL: {parsed_content.get('base_url', '')}
+
+PREVIOUS ANALYSIS:
+{json.dumps(previous_result, ensure_ascii=False)}
+
+CHANGED SECTIONS (new content):
+{changed}
+
+NEW SECTIONS:
+{added}
+
+REMOVED SECTIONS:
+{removed}
+
+Update the previous analysis to match the page as it is now.
+Instead of the full structure, respond with a JSON object holding ONLY the fields whose value must change, each with its complete new value in the same format as before.
+Leave out every field that is still correct. Respond with {{}} if nothing needs to change.
+For related_links, use ONLY URLs that appear in the previous analysis or in the sections above."""
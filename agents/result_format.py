@@ -0,0 +1,89 @@
+from html import escape
+
+def string():
+    """Schema of a string field"""
+    return {"type": "STRING"}
+
+def string_list():
+    """Schema of a list of strings"""
+    return {"type": "ARRAY", "items": {"type": "STRING"}}
+
+def record(*fields):
+    """Schema of an object whose fields are all strings"""
+    return {
+        "type": "OBJECT",
+        "properties": {name: string() for name in fields},
+        "required": list(fields)
+    }
+
+def record_list(*fields):
+    """Schema of a list of string-field objects"""
+    return {"type": "ARRAY", "items": record(*fields)}
+
+def response_schema(properties, required=("summary", "key_points", "highlights")):
+    """JSON schema for a mode's answer; fields are generated in the order given"""
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": list(required),
+        "property_ordering": list(properties)
+    }
+
+def partial_schema(schema):
+    """A response schema with no required fields, for answers that carry only the fields that changed"""
+    return dict(schema, required=[])
+
+ACTION_SCHEMA = record_list("label", "section_id")
+LINK_SCHEMA = record_list("label", "url")
+
+def as_text(value):
+    """Model output as escaped text, whatever JSON type it came back as"""
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        value = ', '.join(str(v) for v in value) if isinstance(value, list) else str(value)
+    return escape(value)
+
+def as_list(value):
+    """Model output as a list, wrapping a lone value"""
+    if isinstance(value, list):
+        return value
+    return [value] if value else []
+
+def paragraph(value):
+    """<p> of a text field, or nothing when it is empty"""
+    text = as_text(value)
+    return f"<p>{text}</p>" if text else ""
+
+def bullet_list(items):
+    """<ul> of a list field, or nothing when it is empty"""
+    entries = [as_text(item) for item in as_list(items)]
+    entries = [f"<li>{entry}</li>" for entry in entries if entry]
+    return f"<ul>{''.join(entries)}</ul>" if entries else ""
+
+def definition_list(items, term_field, detail_field):
+    """<dl> of the term/detail pairs in a list of objects"""
+    entries = []
+    for item in as_list(items):
+        if isinstance(item, dict) and item.get(term_field):
+            entries.append(f"<dt>{as_text(item[term_field])}</dt><dd>{as_text(item.get(detail_field))}</dd>")
+    return f"<dl>{''.join(entries)}</dl>" if entries else ""
+
+def table(items, columns):
+    """<table> with one row per object; columns is a list of (field, header)"""
+    rows = []
+    for item in as_list(items):
+        if isinstance(item, dict):
+            rows.append('<tr>' + ''.join(f"<td>{as_text(item.get(field))}</td>" for field, header in columns) + '</tr>')
+    if not rows:
+        return ""
+    head = '<tr>' + ''.join(f"<th>{escape(header)}</th>" for field, header in columns) + '</tr>'
+    return f"<table><thead>{head}</thead><tbody>{''.join(rows)}</tbody></table>"
+
+def render_sections(css_class, sections):
+    """Wrap the non-empty (section_id, title, body) sections in a <div>, each an anchor target for actions"""
+    parts = [
+        f"<section id='{section_id}'><h3>{escape(title)}</h3>{body}</section>"
+        for section_id, title, body in sections if body
+    ]
+    return f"<div class='{css_class}'>{''.join(parts)}</div>"
@@ -0,0 +1,209 @@
+import os
+import sys
+import asyncio
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from quart import Quart, request, jsonify, render_template, Response, g
+from quart_cors import cors
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from agents.agent_core import (
+    analyze_webpage_async, analyze_webpage_multi_async, analyze_webpage_stream_async, agent_followup_response_async,
+    handle_missing_section_async, create_note_async
+)
+from agents.jobs import get_job_manager
+from agents.gemini_client import get_metrics as get_gemini_metrics
+from utils.fetcher import get_metrics as get_fetch_metrics
+from utils.api import (
+    sse_event, timing_event, parse_analyze_request, parse_stream_request, parse_chat_request, parse_missing_section_request,
+    parse_note_request, parse_job_items
+)
+from utils.metrics import start_request_timings, server_timing_header, request_seconds, render_metrics
+
+# Async twin of main.py: same routes and JSON contracts, served by an ASGI server
+# (e.g. `uvicorn asgi:app`) so one process can wait on many fetches and Gemini calls.
+app = Quart(__name__,
+            template_folder='templates',
+            static_folder='static')
+app = cors(app, allow_origin="*")
+
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+
+@app.before_request
+async def start_timing():
+    g.request_started = time.perf_counter()
+    g.stage_timings = start_request_timings()
+
+@app.after_request
+async def add_header(response):
+    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+    return response
+
+@app.after_request
+async def add_server_timing(response):
+    if 'request_started' in g:
+        total = time.perf_counter() - g.request_started
+        request_seconds.observe(total, endpoint=request.endpoint or 'unknown')
+        # A stream's stages run after its headers are sent; /analyze/stream reports them in a final timing event
+        if response.mimetype != 'text/event-stream':
+            response.headers['Server-Timing'] = server_timing_header(g.stage_timings, total)
+    return response
+
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+@app.route('/analyze', methods=['POST'])
+async def analyze():
+    try:
+        args, error = parse_analyze_request(await request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
+        
+        url = args["url"]
+        if args["modes"] is not None:
+            results = await analyze_webpage_multi_async(url, args["modes"], use_cache=args["use_cache"])
+            
+            return jsonify({"url": url, "results": results})
+        
+        result = await analyze_webpage_async(url, args["mode"], use_cache=args["use_cache"])
+        
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analyze/stream', methods=['POST'])
+async def analyze_stream():
+    args, error = parse_stream_request(await request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+    
+    timings, started = g.stage_timings, g.request_started
+    
+    async def generate():
+        try:
+            async for event, payload in analyze_webpage_stream_async(args["url"], args["mode"], use_cache=args["use_cache"]):
+                yield sse_event(event, payload).encode('utf-8')
+            yield timing_event(timings, started).encode('utf-8')
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)}).encode('utf-8')
+    
+    return generate(), 200, {'Content-Type': 'text/event-stream', 'X-Accel-Buffering': 'no'}
+
+@app.route('/chat', methods=['POST'])
+async def chat():
+    try:
+        args, error = parse_chat_request(await request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
+        
+        response = await agent_followup_response_async(args["url"], args["message"], args["mode"])
+        
+        return jsonify({"response": response})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/missing-section', methods=['POST'])
+async def missing_section():
+    try:
+        args, error = parse_missing_section_request(await request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
+        
+        response = await handle_missing_section_async(args["url"], args["section_label"], args["mode"], args["section_id"])
+        
+        return jsonify({"response": response})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/create_note', methods=['POST'])
+async def create_note_endpoint():
+    try:
+        args, error = parse_note_request(await request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
+        
+        note = await create_note_async(args["text"], args["mode"], args["context"])
+        
+        return jsonify({"note": note})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+async def create_job():
+    try:
+        items, error = parse_job_items(await request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
+        
+        job = await asyncio.to_thread(get_job_manager().submit, items)
+        
+        return jsonify(await asyncio.to_thread(job.progress)), 202
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>')
+async def job_progress(job_id):
+    job = await asyncio.to_thread(get_job_manager().get, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(await asyncio.to_thread(job.progress))
+
+@app.route('/jobs/<job_id>/results')
+async def job_results(job_id):
+    job = await asyncio.to_thread(get_job_manager().get, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    results = await asyncio.to_thread(job.results_since, since)
+    
+    return jsonify({"results": results, "next": since + len(results), **(await asyncio.to_thread(job.progress))})
+
+@app.route('/jobs/<job_id>/stream')
+async def job_stream(job_id):
+    job = await asyncio.to_thread(get_job_manager().get, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    
+    async def generate():
+        position = since
+        while True:
+            results = await asyncio.to_thread(job.wait_for_results, position, 15)
+            for result in results:
+                yield sse_event("result", result).encode('utf-8')
+            position += len(results)
+            progress = await asyncio.to_thread(job.progress)
+            if progress["status"] == "finished" and position >= progress["completed"]:
+                yield sse_event("done", progress).encode('utf-8')
+                return
+            if not results:
+                yield b": keep-alive\n\n"
+    
+    return generate(), 200, {'Content-Type': 'text/event-stream', 'X-Accel-Buffering': 'no'}
+
+@app.route('/metrics')
+async def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/health')
+async def health():
+    return jsonify({"status": "healthy", "service": "CogniParse", "gemini": get_gemini_metrics(), "fetch": get_fetch_metrics()})
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 5000))
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,52 @@
+"""Compare the single-pass extractor against the BeautifulSoup parse_webpage + get_text_content path.
+
+Usage: python -m benchmarks.bench_dom_parser [page.html ...] [--repeat N]
+Without arguments a generated Wikipedia-sized article is used.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import wikipedia_like_article
+from utils.dom_parser import parse_webpage, get_text_content, extract_page
+
+def old_path(html):
+    """Two full BeautifulSoup parses, as analyze_webpage used to do"""
+    return parse_webpage(html), get_text_content(html)
+
+def new_path(html):
+    """One lxml pass producing both outputs"""
+    return extract_page(html)
+
+def best_time(fn, html, repeat):
+    """Best wall-clock time of several runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('pages', nargs='*', help='HTML files to benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    pages = [(path, open(path, encoding='utf-8').read()) for path in args.pages]
+    if not pages:
+        pages = [('generated-article', wikipedia_like_article())]
+    
+    for name, html in pages:
+        if old_path(html) != new_path(html):
+            print(f"{name}: OUTPUT MISMATCH")
+            sys.exit(1)
+        old = best_time(old_path, html, args.repeat)
+        new = best_time(new_path, html, args.repeat)
+        print(f"{name}: {len(html) / 1024:.0f} KB  old {old * 1000:.1f} ms  new {new * 1000:.1f} ms  speedup {old / new:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare a whole-body fetch + parse against the streaming, size-capped fetch with incremental parsing.
+
+Usage: python -m benchmarks.bench_fetch [--copies N]
+A local HTTP server serves N concatenated generated articles as one very large page.
+"""
+import argparse
+import http.server
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('PAGE_CACHE_MAX_BYTES', '0')
+
+import requests
+from benchmarks.corpus import wikipedia_like_article
+from utils.dom_parser import extract_page, StreamingExtractor
+from utils.fetcher import fetch_webpage, FETCH_TEXT_LIMIT, HEADERS
+
+def serve(body):
+    """Serve body on a local port; return the server and its URL"""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/page"
+
+def old_path(url):
+    """Download the whole body, decode it, then parse it"""
+    html = requests.get(url, headers=HEADERS, timeout=30).text
+    return extract_page(html)
+
+def new_path(url):
+    """Stream the body into the incremental parser and stop once enough text is collected"""
+    extractor = StreamingExtractor(FETCH_TEXT_LIMIT)
+    html = fetch_webpage(url, extractor)
+    return extractor.result(html)
+
+def measure(fn, url):
+    """Wall-clock time and peak traced memory of one run"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(url)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--copies', type=int, default=20)
+    args = parser.parse_args()
+
+    body = (wikipedia_like_article() * args.copies).encode('utf-8')
+    server, url = serve(body)
+    try:
+        for name, fn in (("whole body", old_path), ("streaming", new_path)):
+            elapsed, peak = measure(fn, url)
+            print(f"{name}: {len(body) / 1024 / 1024:.1f} MB page  {elapsed * 1000:.0f} ms  peak {peak / 1024 / 1024:.1f} MB")
+    finally:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""Offline end-to-end benchmark suite: parsing, prompt building, context memory and /analyze + /chat throughput.
+
+Usage: python -m benchmarks.bench_suite [--output report.json] [--baseline old.json] [--concurrency 1,4,16]
+Pages come from benchmarks/fixtures/*.html plus a generated Wikipedia-sized article, served from a
+local HTTP server. Gemini is replaced by a backend that replays benchmarks/fixtures/responses.json
+after --latency seconds, so no network access or API key is needed.
+With --baseline, metrics that got worse by more than --threshold are listed and the exit status is 1.
+"""
+import argparse
+import copy
+import gc
+import http.server
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+os.environ.setdefault('PAGE_CACHE_MAX_BYTES', '0')
+# Every fixture is served from 127.0.0.1; don't let the per-host fetch limit cap the concurrency sweep
+os.environ.setdefault('FETCH_PER_HOST', '64')
+os.environ.setdefault('FETCH_POOL_SIZE', '64')
+# The recorded related_links point at real sites; keep the suite offline
+os.environ.setdefault('PREFETCH_LINKS', '0')
+
+from agents import agent_core
+from agents.gemini_client import estimate_tokens, set_backend
+from benchmarks.corpus import FIXTURES_DIR, fixture_pages
+from benchmarks.fake_gemini import FakeGeminiBackend, replay_reply
+from utils.context_store import context_size
+from utils.dom_parser import StreamingExtractor
+from utils.page_model import CompactPage
+from utils.fetcher import CHUNK_SIZE
+import main
+
+CHAT_QUESTIONS = (
+    "What is request coalescing?",
+    "How much did the changes save?",
+    "Summarize the main findings",
+    "Which results are the most surprising?",
+)
+
+# Metric names ending like this are better when larger; every other metric is better when smaller
+HIGHER_IS_BETTER = ('per_s', 'ratio')
+
+def serve(pages):
+    """Serve {path: html} on a local port; return the server and its base URL"""
+    bodies = {f"/{name}": html.encode('utf-8') for name, html in pages.items()}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            body = bodies.get(self.path.split('?')[0])
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass  # the fetcher hangs up early once it has enough text; that is expected
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def best_time(fn, repeat):
+    """Best per-call time over several batches, each long enough (>= 0.2 s) to drown timer noise"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def stream_parse(html):
+    """Parse a page the way prepare_page does: chunked feeding into the incremental extractor"""
+    extractor = StreamingExtractor(agent_core.page_text_limit(), agent_core.MAIN_CONTENT_ONLY)
+    for i in range(0, len(html), CHUNK_SIZE):
+        extractor.feed(html[i:i + CHUNK_SIZE])
+        if extractor.enough():
+            break
+    return extractor.result(html, agent_core.page_text_length())
+
+def bench_parse(pages, repeat):
+    """Parse time and throughput per page"""
+    results = {}
+    for name, html in pages:
+        seconds = best_time(lambda: stream_parse(html), repeat)
+        results[name] = {
+            "ms": round(seconds * 1000, 4),
+            "mb_per_s": round(len(html.encode('utf-8')) / seconds / 1024 / 1024, 2)
+        }
+    return results
+
+def bench_prompts(pages, repeat):
+    """Prompt build time and size per page and mode"""
+    results = {}
+    for name, html in pages:
+        parsed_content, text_content = stream_parse(html)
+        parsed_content["base_url"] = f"https://bench.invalid/{name}"
+        for mode, module in agent_core.MODES.items():
+            prompt, system_instruction = module.build_prompt(text_content, parsed_content)
+            seconds = best_time(lambda: module.build_prompt(text_content, parsed_content), repeat)
+            results[f"{name}.{mode}"] = {
+                "ms": round(seconds * 1000, 4),
+                "tokens": estimate_tokens(prompt) + estimate_tokens(system_instruction)
+            }
+    return results
+
+def retained_bytes(build):
+    """Python heap that build() and what it returns still hold once it is done"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()  # held until measured, so what build returns is counted
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return retained
+
+def bench_context_memory(pages, responses):
+    """Python heap retained and serialized size of one stored chat context per page, and of its page as a dict vs compact"""
+    results = {}
+    for name, html in pages:
+        url = f"https://bench.invalid/{name}"
+        parsed_content, text_content = stream_parse(html)
+        parsed_content["base_url"] = url
+        result = agent_core.complete_result(url, "student", parsed_content, dict(responses["student"]), False)
+        agent_core.context_store.delete(url)
+        # Copy the inputs inside the traced region so whatever the context keeps of them is counted
+        retained = retained_bytes(
+            lambda: agent_core.remember_context(url, copy.deepcopy(parsed_content), text_content, {"student": result})
+        )
+        page_dict = retained_bytes(lambda: copy.deepcopy(parsed_content))
+        page_state = retained_bytes(lambda: CompactPage.from_dict(parsed_content).to_state())
+        serialized_state = len(json.dumps(CompactPage.from_dict(parsed_content).to_state()))
+        results[name] = {
+            "heap_bytes": retained,
+            "serialized_bytes": context_size(agent_core.context_store.get(url)),
+            "page_dict_heap_bytes": page_dict,
+            "page_state_heap_bytes": page_state,
+            "page_heap_ratio": round(page_dict / page_state, 2),
+            "page_serialized_ratio": round(len(json.dumps(parsed_content)) / serialized_state, 2)
+        }
+        agent_core.context_store.delete(url)
+    return results
+
+def post(path, payload):
+    """POST through a fresh Flask test client; return (status, seconds)"""
+    client = main.app.test_client()
+    start = time.perf_counter()
+    response = client.post(path, json=payload)
+    return response.status_code, time.perf_counter() - start
+
+def run_load(concurrency, payloads, path):
+    """Send payloads to path with the given concurrency; return throughput and latency stats"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda payload: post(path, payload), payloads))
+    elapsed = time.perf_counter() - start
+    latencies = [seconds for status, seconds in outcomes if status == 200]
+    if not latencies:
+        return {"errors": len(outcomes)}
+    return {
+        "req_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "errors": len(outcomes) - len(latencies)
+    }
+
+def bench_endpoints(pages, levels, requests_per_level):
+    """/analyze then /chat throughput for each concurrency level, on pages cycled in order"""
+    server, base_url = serve(dict(pages))
+    names = [name for name, html in pages]
+    results = {}
+    try:
+        for level in levels:
+            count = max(requests_per_level, level)
+            # Distinct URLs so neither request coalescing nor the result cache hides the work
+            urls = [f"{base_url}/{names[i % len(names)]}?run={level}-{i}" for i in range(count)]
+            results[f"analyze.c{level}"] = run_load(level, [
+                {"url": url, "mode": "student", "bypass_cache": True} for url in urls
+            ], '/analyze')
+            results[f"chat.c{level}"] = run_load(level, [
+                {"url": url, "mode": "student", "message": CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]}
+                for i, url in enumerate(urls)
+            ], '/chat')
+    finally:
+        server.shutdown()
+    return results
+
+def flatten(tree, prefix=''):
+    """{a: {b: 1}} -> {'a.b': 1}"""
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        else:
+            flat[name] = value
+    return flat
+
+def compare(report, baseline, threshold):
+    """Print each metric against the baseline; return the metrics that regressed beyond threshold"""
+    current = flatten(report["results"])
+    previous = flatten(baseline["results"])
+    regressions = []
+    for name in sorted(current.keys() & previous.keys()):
+        old, new = previous[name], current[name]
+        if not old or name.endswith('errors'):
+            continue
+        change = (new - old) / old
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ''
+        if worse > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:45} {old:>12} -> {new:>12}  {change:+.1%}{flag}")
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(FIXTURES_DIR)).stdout.strip() or None
+    except OSError:
+        return None
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='bench_report.json', help='where to write the JSON report')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='relative change counted as a regression')
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds the fake Gemini takes per call')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=32, help='requests per concurrency level and endpoint')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per micro-benchmark (best is kept)')
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES_DIR, 'responses.json'), encoding='utf-8') as f:
+        responses = json.load(f)
+    set_backend(FakeGeminiBackend(reply=replay_reply(responses), latency=args.latency))
+    pages = fixture_pages()
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "concurrency": levels,
+            "requests": args.requests,
+            "pages": {name: len(html.encode('utf-8')) for name, html in pages}
+        },
+        "results": {
+            "parse": bench_parse(pages, args.repeat),
+            "prompt": bench_prompts(pages, args.repeat),
+            "context": bench_context_memory(pages, responses),
+            "endpoints": bench_endpoints(pages, levels, args.requests)
+        }
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main_cli()
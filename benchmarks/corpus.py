@@ -0,0 +1,58 @@
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+WORDS = (
+    "intelligence learning model network data system research neural training algorithm "
+    "reasoning knowledge agent language vision robot search planning probability logic "
+    "statistics optimization inference representation perception ethics safety regulation"
+).split()
+
+def sentence(rng, words=18):
+    """Build a deterministic pseudo-English sentence"""
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + '.'
+
+def wikipedia_like_article(sections=150, seed=42):
+    """Generate a large article with the markup density of a Wikipedia page"""
+    rng = random.Random(seed)
+    parts = [
+        "<!DOCTYPE html><html lang='en'><head><meta charset='utf-8'>",
+        "<title>Artificial intelligence - Wikipedia</title>",
+        "<style>.mw-parser-output{margin:0}</style><script>var RLCONF={};</script></head><body>",
+        "<header><a href='https://en.wikipedia.org/wiki/Main_Page'>Main page</a></header>",
+        "<nav>" + ''.join(f"<a href='https://en.wikipedia.org/wiki/Portal_{i}'>Portal {i}</a>" for i in range(40)) + "</nav>",
+        "<main id='content'><h1 id='firstHeading'>Artificial intelligence</h1>",
+    ]
+    for s in range(sections):
+        parts.append(f"<h2 id='Section_{s}'><span class='mw-headline'>Section {s} {rng.choice(WORDS)}</span><span class='mw-editsection'>[<a href='/w/index.php?section={s}'>edit</a>]</span></h2>")
+        for _ in range(rng.randint(3, 7)):
+            refs = ''.join(f"<sup class='reference'><a href='#cite_note-{rng.randint(1, 900)}'>[{rng.randint(1, 900)}]</a></sup>" for _ in range(rng.randint(0, 3)))
+            links = ' '.join(f"<a href='https://en.wikipedia.org/wiki/{w.title()}'>{w}</a>" for w in rng.sample(WORDS, 3))
+            parts.append(f"<p>{sentence(rng)} {links} {sentence(rng, 25)}{refs} {sentence(rng, 12)}</p>")
+        if s % 3 == 0:
+            parts.append(f"<h3 id='Sub_{s}'>Subsection {s}</h3><ul>" + ''.join(f"<li>{sentence(rng, 8)}<ul><li>{sentence(rng, 5)}</li></ul></li>" for _ in range(rng.randint(3, 8))) + "</ul>")
+        if s % 5 == 0:
+            rows = ''.join(f"<tr><th>{rng.choice(WORDS)}</th><td>{rng.randint(1, 10000)}</td><td>{sentence(rng, 4)}</td></tr>" for _ in range(rng.randint(4, 12)))
+            parts.append(f"<table class='wikitable'><tr><th>Name</th><th>Value</th><th>Notes</th></tr>{rows}</table>")
+        if s % 7 == 0:
+            parts.append(f"<div class='thumb'><img src='x.png'><div class='thumbcaption'>{sentence(rng, 10)}</div></div>")
+    parts.append("<h2 id='References'>References</h2><ol class='references'>")
+    for r in range(400):
+        parts.append(f"<li id='cite_note-{r}'><cite>{sentence(rng, 10)}</cite> <a class='external' href='https://doi.org/10.{r}/{rng.randint(1000, 9999)}'>doi</a></li>")
+    parts.append("</ol></main><aside><p>Sidebar content that should not appear in parsed sections.</p></aside>")
+    parts.append("<footer><p>Text is available under the Creative Commons Attribution-ShareAlike License.</p></footer>")
+    parts.append("<script>mw.loader.load('site');</script></body></html>")
+    return '\n'.join(parts)
+
+def fixture_pages(large_sections=150):
+    """Saved pages from the fixtures directory, smallest first, plus a generated Wikipedia-sized article as 'large'"""
+    pages = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+                pages.append((name[:-5], f.read()))
+    pages.sort(key=lambda page: len(page[1]))
+    pages.append(('large', wikipedia_like_article(sections=large_sections)))
+    return pages
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+import time
+from agents.gemini_client import GeminiError, RETRYABLE_STATUSES
+
+PROMPT_MODES = (
+    ("create student learning materials", "student"),
+    ("from a research perspective", "researcher"),
+    ("business/professional perspective", "professional"),
+)
+
+def replay_reply(responses):
+    """Reply function replaying recorded outputs: the mode's JSON for analysis prompts, else the note or chat text"""
+
+    def reply(contents):
+        for marker, mode in PROMPT_MODES:
+            if marker in contents:
+                return "```json\n" + json.dumps(responses[mode], indent=2) + "\n```"
+        if "CONTENT TO SAVE:" in contents:
+            return responses["note"]
+        return responses["chat"]
+
+    return reply
+
+class FakeGeminiBackend:
+    """Local stand-in for the Gemini API with configurable latency and scripted failures
+
+    reply(contents) produces the response text; failures is a list of HTTP statuses
+    raised by the first calls, in order (use None entries for successful calls).
+    Cached contents are kept in memory and prepended to the prompt of calls that use them.
+    """
+
+    def __init__(self, reply=None, latency=0.0, failures=None, retry_after=None, chunk_size=64):
+        self.reply = reply or (lambda contents: '{"summary": "ok"}')
+        self.latency = latency
+        self.failures = list(failures or [])
+        self.retry_after = retry_after
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.caches = {}
+        self.caches_created = 0
+        self.lock = threading.Lock()
+
+    def _next_failure(self):
+        with self.lock:
+            self.calls += 1
+            return self.failures.pop(0) if self.failures else None
+
+    def _raise_if_scripted(self):
+        status = self._next_failure()
+        if status is not None:
+            raise GeminiError(f"Gemini API error: fake {status}", status=status,
+                              retry_after=self.retry_after if status == 429 else None,
+                              retryable=status in RETRYABLE_STATUSES)
+
+    def _with_cache(self, contents, config):
+        name = getattr(config, 'cached_content', None)
+        if not name:
+            return contents
+        with self.lock:
+            prefix = self.caches.get(name)
+        if prefix is None:
+            raise GeminiError(f"Gemini API error: fake 404 cached content {name} not found", status=404)
+        return f"{prefix}\n\n{contents}"
+
+    def generate(self, model, contents, config=None):
+        time.sleep(self.latency)
+        self._raise_if_scripted()
+        return self.reply(self._with_cache(contents, config))
+
+    async def generate_async(self, model, contents, config=None):
+        await asyncio.sleep(self.latency)
+        self._raise_if_scripted()
+        return self.reply(self._with_cache(contents, config))
+
+    def _store_cache(self, contents, system_instruction):
+        self._raise_if_scripted()
+        with self.lock:
+            self.caches_created += 1
+            name = f"cachedContents/fake-{self.caches_created}"
+            self.caches[name] = f"{system_instruction}\n\n{contents}"
+        return name
+
+    def create_cache(self, model, contents, system_instruction, ttl):
+        time.sleep(self.latency)
+        return self._store_cache(contents, system_instruction)
+
+    async def create_cache_async(self, model, contents, system_instruction, ttl):
+        await asyncio.sleep(self.latency)
+        return self._store_cache(contents, system_instruction)
+
+    def delete_cache(self, name):
+        with self.lock:
+            self.caches.pop(name, None)
+
+    def stream(self, model, contents, config=None):
+        time.sleep(self.latency)
+        self._raise_if_scripted()
+        text = self.reply(contents)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+    async def stream_async(self, model, contents, config=None):
+        await asyncio.sleep(self.latency)
+        self._raise_if_scripted()
+        text = self.reply(contents)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
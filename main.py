@@ -1,15 +1,24 @@
 import os
 import sys
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from agents.agent_core import analyze_webpage, agent_followup_response, handle_missing_section, create_note
+from agents.agent_core import analyze_webpage, analyze_webpage_multi, analyze_webpage_stream, agent_followup_response, handle_missing_section, create_note
+from agents.jobs import get_job_manager
+from agents.gemini_client import get_metrics as get_gemini_metrics
+from utils.fetcher import get_metrics as get_fetch_metrics
+from utils.api import (
+    sse_event, timing_event, parse_analyze_request, parse_stream_request, parse_chat_request, parse_missing_section_request,
+    parse_note_request, parse_job_items
+)
+from utils.metrics import start_request_timings, server_timing_header, request_seconds, render_metrics
 
 app = Flask(__name__, 
             template_folder='templates',
@@ -18,6 +27,11 @@ CORS(app)
 
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 
+@app.before_request
+def start_timing():
+    g.request_started = time.perf_counter()
+    g.stage_timings = start_request_timings()
+
 @app.after_request
 def add_header(response):
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
@@ -25,6 +39,16 @@ def add_header(response):
     response.headers['Expires'] = '0'
     return response
 
+@app.after_request
+def add_server_timing(response):
+    if 'request_started' in g:
+        total = time.perf_counter() - g.request_started
+        request_seconds.observe(total, endpoint=request.endpoint or 'unknown')
+        # A stream's stages run after its headers are sent; /analyze/stream reports them in a final timing event
+        if response.mimetype != 'text/event-stream':
+            response.headers['Server-Timing'] = server_timing_header(g.stage_timings, total)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -32,46 +56,51 @@ def index():
 @app.route('/analyze', methods=['POST'])
 def analyze():
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
+        args, error = parse_analyze_request(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
         
-        url = data.get('url')
-        mode = data.get('mode', 'student')
+        url = args["url"]
+        if args["modes"] is not None:
+            results = analyze_webpage_multi(url, args["modes"], use_cache=args["use_cache"])
+            
+            return jsonify({"url": url, "results": results})
         
-        if not url:
-            return jsonify({"error": "URL is required"}), 400
-        
-        if mode not in ['student', 'researcher', 'professional']:
-            return jsonify({"error": "Invalid mode. Choose: student, researcher, professional"}), 400
-        
-        result = analyze_webpage(url, mode)
+        result = analyze_webpage(url, args["mode"], use_cache=args["use_cache"])
         
         return jsonify(result)
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    args, error = parse_stream_request(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+    
+    timings, started = g.stage_timings, g.request_started
+    
+    def generate():
+        try:
+            for event, payload in analyze_webpage_stream(args["url"], args["mode"], use_cache=args["use_cache"]):
+                yield sse_event(event, payload)
+            yield timing_event(timings, started)
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
-        
-        url = data.get('url')
-        message = data.get('message')
-        mode = data.get('mode', 'student')
-        
-        if not url:
-            return jsonify({"error": "URL is required"}), 400
+        args, error = parse_chat_request(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
         
-        if not message:
-            return jsonify({"error": "Message is required"}), 400
-        
-        response = agent_followup_response(url, message, mode)
+        response = agent_followup_response(args["url"], args["message"], args["mode"])
         
         return jsonify({"response": response})
     
@@ -81,19 +110,11 @@ def chat():
 @app.route('/missing-section', methods=['POST'])
 def missing_section():
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
-        
-        url = data.get('url')
-        section_label = data.get('section_label')
-        mode = data.get('mode', 'student')
-        
-        if not url or not section_label:
-            return jsonify({"error": "URL and section_label are required"}), 400
+        args, error = parse_missing_section_request(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
         
-        response = handle_missing_section(url, section_label, mode)
+        response = handle_missing_section(args["url"], args["section_label"], args["mode"], args["section_id"])
         
         return jsonify({"response": response})
     
@@ -103,28 +124,82 @@ def missing_section():
 @app.route('/create_note', methods=['POST'])
 def create_note_endpoint():
     try:
-        data = request.get_json()
+        args, error = parse_note_request(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
         
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
+        note = create_note(args["text"], args["mode"], args["context"])
         
-        text = data.get('text')
-        mode = data.get('mode', 'student')
-        context = data.get('context', '')
-        
-        if not text:
-            return jsonify({"error": "Text is required"}), 400
+        return jsonify({"note": note})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    try:
+        items, error = parse_job_items(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
         
-        note = create_note(text, mode, context)
+        job = get_job_manager().submit(items)
         
-        return jsonify({"note": note})
+        return jsonify(job.progress()), 202
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/jobs/<job_id>')
+def job_progress(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.progress())
+
+@app.route('/jobs/<job_id>/results')
+def job_results(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    results = job.results_since(since)
+    
+    return jsonify({"results": results, "next": since + len(results), **job.progress()})
+
+@app.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    
+    def generate():
+        position = since
+        while True:
+            results = job.wait_for_results(position, timeout=15)
+            for result in results:
+                yield sse_event("result", result)
+            position += len(results)
+            progress = job.progress()
+            if progress["status"] == "finished" and position >= progress["completed"]:
+                yield sse_event("done", progress)
+                return
+            if not results:
+                yield ": keep-alive\n\n"
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health')
 def health():
-    return jsonify({"status": "healthy", "service": "CogniParse"})
+    return jsonify({"status": "healthy", "service": "CogniParse", "gemini": get_gemini_metrics(), "fetch": get_fetch_metrics()})
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
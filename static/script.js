@@ -204,20 +204,10 @@ document.addEventListener('DOMContentLoaded', function() {
         currentMode = mode;
 
         try {
-            const response = await fetch('/analyze', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ url, mode })
+            const data = await streamAnalysis(url, mode, function(partial) {
+                displayResults(partial, mode);
             });
 
-            const data = await response.json();
-
-            if (!response.ok) {
-                throw new Error(data.error || 'Analysis failed');
-            }
-
             currentAnalysisData = data;
             displayResults(data, mode);
             showAgentChat(mode);
@@ -228,6 +218,63 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Reads the /analyze/stream Server-Sent Events and calls onField with the
+    // partial result each time another top-level field is complete.
+    async function streamAnalysis(url, mode, onField) {
+        const response = await fetch('/analyze/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ url, mode })
+        });
+
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error || 'Analysis failed');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const partial = {};
+        let buffer = '';
+        let result = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.substring(0, boundary);
+                buffer = buffer.substring(boundary + 2);
+
+                let event = 'message';
+                let payload = '';
+                message.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.substring(7);
+                    else if (line.startsWith('data: ')) payload += line.substring(6);
+                });
+                const data = payload ? JSON.parse(payload) : {};
+
+                if (event === 'error') {
+                    throw new Error(data.error || 'Analysis failed');
+                } else if (event === 'field') {
+                    partial[data.name] = data.value;
+                    onField(partial);
+                } else if (event === 'done') {
+                    result = data;
+                }
+            }
+        }
+
+        if (!result) {
+            throw new Error('Analysis stream ended unexpectedly');
+        }
+        return result;
+    }
+
     function setLoading(loading) {
         analyzeBtn.disabled = loading;
         btnText.style.display = loading ? 'none' : 'inline';
@@ -669,6 +716,7 @@ document.addEventListener('DOMContentLoaded', function() {
                             body: JSON.stringify({
                                 url: currentUrl,
                                 section_label: sectionLabel,
+                                section_id: sectionId,
                                 mode: currentMode
                             })
                         });
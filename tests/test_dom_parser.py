@@ -0,0 +1,96 @@
+from lxml import etree
+from benchmarks.corpus import fixture_pages
+from utils.dom_parser import PageExtractor, StreamingExtractor, cut_text, extract_page, get_text_content, parse_webpage
+
+CASES = [
+    "<html><head><title>T&amp;x</title></head><body><nav><p>Nav paragraph long enough text here</p></nav>"
+    "<aside><h2>Side</h2></aside><pre>  a\n  b  </pre><a href='http://x.com'>x<a href='http://y'>y</a></a></body></html>",
+    "<p>Outside <b>bold</b> paragraph text that is long enough</p><main><h1>T</h1><p>Main paragraph text that is long enough to count</p></main>",
+    "<div><h3>A</h3>text<h4 id=q>B</h4><p>Long paragraph that certainly exceeds twenty</p><p>x</p></div>",
+    "<table><tr><td>a<table><tr><td>b</td></tr></table></td></tr></table><ul><li>one<ul><li>two</li></ul></li><li>three</li></ul>",
+    "<body><template><p>In template paragraph long enough text</p></template><ruby>漢<rt>kan</rt></ruby><p>after ruby paragraph long enough text</p></body>",
+    "<p>a<br>b&nbsp;&nbsp;c long enough text paragraph here</p><textarea>  x\n</textarea><noscript><p>noscript paragraph long enough</p></noscript>",
+    "<svg><title>svgtitle</title></svg><title>Real</title><p>hello world this is long enough</p>",
+    "\N{BYTE ORDER MARK}<p>para one that is long enough to count yes<p>para two also long enough to count yes",
+]
+
+STORY = "The new bridge opened to traffic on Monday after four years of construction, linking the two halves of the city. "
+NEWS_PAGE = (
+    "<html><head><title>Bridge opens</title></head><body>"
+    "<div class='menu'><ul><li><a href='https://x.com/a'>Home</a></li><li><a href='https://x.com/b'>World</a></li></ul></div>"
+    "<div class='cookie-banner'><p>We use cookies to improve your experience on this website, accept them.</p></div>"
+    "<article class='story'><h1>Bridge opens</h1>"
+    + ''.join(f"<p>{STORY}Paragraph {i}, with more detail, numbers, and quotes.</p>" for i in range(6))
+    + "<h2 id='cost'>Cost</h2><p>" + STORY + "It cost far more than planned, officials said.</p></article>"
+    "<div class='footer'><p>Copyright 2024 The City Paper. All rights reserved, no reuse allowed.</p></div></body></html>"
+)
+DETAIL = "This jacket is made from recycled wool and keeps you warm in wind and rain, with taped seams and a hood. "
+PRODUCT_PAGE = (
+    "<html><body><div class='grid'>"
+    + ''.join(f"<div class='teaser'><a href='https://s.com/p{i}'>Other product {i}</a></div>" for i in range(12))
+    + "</div><div class='product'><h1>Wool jacket</h1><span class='price'>Price: 129 EUR</span><div class='description'>"
+    + ''.join(f"<p>{DETAIL}Detail {i}.</p>" for i in range(4))
+    + "</div></div><div class='newsletter'><p>Subscribe to our newsletter for ten percent off your next order.</p></div></body></html>"
+)
+
+def extractor_for(html):
+    extractor = PageExtractor()
+    parser = etree.HTMLParser(target=extractor, recover=True)
+    parser.feed(html)
+    parser.close()
+    return extractor
+
+def original(html, max_length=15000):
+    return parse_webpage(html.lstrip('\N{BYTE ORDER MARK}')), get_text_content(html.lstrip('\N{BYTE ORDER MARK}'), max_length)
+
+def test_extract_page_matches_beautifulsoup_on_tricky_markup():
+    for html in CASES:
+        assert extract_page(html) == original(html), html
+
+def test_extract_page_matches_beautifulsoup_on_fixture_pages():
+    for name, html in fixture_pages():
+        assert extract_page(html) == original(html), name
+
+def test_streaming_extractor_matches_extract_page():
+    html = dict(fixture_pages())["typical"]
+    extractor = StreamingExtractor()
+    for i in range(0, len(html), 500):
+        extractor.feed(html[i:i + 500])
+    assert extractor.result(html) == extract_page(html)
+
+def test_streaming_extractor_without_chunks_parses_the_html():
+    assert StreamingExtractor().result(CASES[2]) == extract_page(CASES[2])
+
+def test_text_is_cut_like_get_text_content():
+    html = dict(fixture_pages())["large"]
+    assert extract_page(html, 500)[1] == get_text_content(html, 500)
+    assert len(extract_page(html, 500)[1]) == 503
+    assert extract_page(html, 0)[1] == get_text_content(html, 0)
+
+def test_cut_text():
+    assert cut_text("abcdef", 3) == "abc..."
+    assert cut_text("abc", 3) == "abc"
+    assert cut_text("abcdef", 0) == "abcdef"
+
+def test_main_content_drops_boilerplate_around_the_article():
+    parsed, text = extract_page(NEWS_PAGE, main_content=True)
+    full, full_text = extract_page(NEWS_PAGE)
+    assert text.startswith("Bridge opens\nThe new bridge")
+    assert not any(boilerplate in text for boilerplate in ("Home", "cookies", "Copyright"))
+    assert "cookies" in full_text and "Copyright" in full_text
+    assert parsed["lists"] == [] and full["lists"]
+    assert len(parsed["paragraphs"]) == 7
+    assert [section["heading"] for section in parsed["sections"]] == ["Bridge opens", "Cost"]
+    assert parsed["links"] == full["links"]
+
+def test_main_content_widens_to_short_lines_around_the_main_text():
+    ranges = extractor_for(PRODUCT_PAGE).main_content_ranges()
+    assert len(ranges) == 1
+    text = extract_page(PRODUCT_PAGE, main_content=True)[1]
+    assert text.startswith("Wool jacket\nPrice: 129 EUR\nThis jacket")
+    assert "Other product" not in text and "newsletter" not in text
+
+def test_no_confident_main_content_keeps_the_whole_page():
+    page = "<html><body><div><p>Just one short paragraph of text on this page here.</p></div><ul><li>a</li></ul></body></html>"
+    assert extractor_for(page).main_content_ranges() is None
+    assert extract_page(page, main_content=True) == extract_page(page)
@@ -0,0 +1,73 @@
+import codecs
+from utils.fetcher import SNIFF_BYTES, BodyReader, detect_charset
+
+class Sink:
+    """Collects fed text and asks to stop once it has limit characters"""
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.text = ''
+
+    def feed(self, text):
+        self.text += text
+
+    def enough(self):
+        return self.limit > 0 and len(self.text) >= self.limit
+
+def read(body, headers=None, chunk_size=7, **kwargs):
+    reader = BodyReader(headers or {}, **kwargs)
+    for i in range(0, len(body), chunk_size):
+        if not reader.add(body[i:i + chunk_size]):
+            break
+    return reader, reader.finish()
+
+def test_byte_order_mark_wins():
+    head = codecs.BOM_UTF8 + b'<meta charset="latin-1">'
+    assert detect_charset({'Content-Type': 'text/html; charset=iso-8859-1'}, head) == 'utf-8-sig'
+    assert detect_charset({}, codecs.BOM_UTF16_LE + 'x'.encode('utf-16-le')) == 'utf-16'
+
+def test_content_type_then_meta_then_utf8():
+    meta = b'<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1251">'
+    assert detect_charset({'Content-Type': 'text/html; charset="ISO-8859-1"'}, meta) == 'ISO-8859-1'
+    assert detect_charset({'Content-Type': 'text/html'}, meta) == 'windows-1251'
+    assert detect_charset({}, b'<meta charset=shift_jis>') == 'shift_jis'
+    assert detect_charset({}, b'<html></html>') == 'utf-8'
+
+def test_unknown_charsets_are_skipped():
+    assert detect_charset({'Content-Type': 'text/html; charset=x-no-such-codec'}, b'<meta charset="koi8-r">') == 'koi8-r'
+    assert detect_charset({}, b'<meta charset="x-no-such-codec">') == 'utf-8'
+
+def test_body_is_decoded_across_chunk_boundaries():
+    text = '<p>' + 'Grüße, ångström ☀ ' * 200 + '</p>'
+    reader, body = read(text.encode('utf-8'))
+    assert body == text
+    assert not reader.truncated and not reader.stopped
+
+def test_meta_charset_is_sniffed_before_decoding():
+    text = '<meta charset="windows-1251"><p>' + 'Привет ' * 300 + '</p>'
+    assert len(text) > SNIFF_BYTES
+    assert read(text.encode('windows-1251'))[1] == text
+
+def test_byte_cap_cuts_the_body():
+    body = b'a' * 5000
+    reader, text = read(body, chunk_size=1000, max_bytes=2500)
+    assert text == 'a' * 2500
+    assert reader.truncated and reader.stopped
+    assert read(body, chunk_size=1000, max_bytes=0)[1] == 'a' * 5000
+
+def test_small_capped_body_is_still_decoded():
+    reader, text = read('ü'.encode('utf-8') * 10, chunk_size=4, max_bytes=9)
+    assert text == 'ü' * 4 + '�'
+    assert reader.truncated
+
+def test_sink_gets_the_text_and_can_stop_the_download():
+    body = ('x' * 100 + '\n').encode('ascii') * 100
+    sink = Sink()
+    reader, text = read(body, chunk_size=2000, sink=sink)
+    assert sink.text == text == body.decode('ascii')
+
+    sink = Sink(limit=3000)
+    reader, text = read(body, chunk_size=2000, sink=sink)
+    assert reader.stopped and not reader.truncated
+    assert 3000 <= len(text) < len(body)
+    assert sink.text == text
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+from agents import gemini_client
+from agents.gemini_client import LIGHT_MODEL_NAME, MODEL_NAME, choose_model, hedged, hedged_async
+
+def latencies(monkeypatch, light, full):
+    monkeypatch.setattr(gemini_client, "tail_latency", lambda model, size: light if model == LIGHT_MODEL_NAME else full)
+
+def test_only_small_free_text_goes_to_the_light_model(monkeypatch):
+    monkeypatch.setattr(gemini_client, "ROUTE_EXPLORE", 0.0)
+    latencies(monkeypatch, None, None)
+    assert choose_model(100, True) == LIGHT_MODEL_NAME
+    assert choose_model(100, False) == MODEL_NAME
+    assert choose_model(gemini_client.LIGHT_MAX_TOKENS + 1, True) == MODEL_NAME
+
+def test_a_slower_light_tail_sends_calls_to_the_full_model(monkeypatch):
+    monkeypatch.setattr(gemini_client, "ROUTE_EXPLORE", 0.0)
+    latencies(monkeypatch, 3.0, 1.0)
+    assert choose_model(100, True) == MODEL_NAME
+    latencies(monkeypatch, 1.0, 3.0)
+    assert choose_model(100, True) == LIGHT_MODEL_NAME
+
+def test_exploration_tries_the_other_tier(monkeypatch):
+    monkeypatch.setattr(gemini_client, "ROUTE_EXPLORE", 1.0)
+    latencies(monkeypatch, None, None)
+    assert choose_model(100, True) == MODEL_NAME
+
+def test_missing_light_model_disables_routing(monkeypatch):
+    monkeypatch.setattr(gemini_client, "ROUTE_EXPLORE", 0.0)
+    latencies(monkeypatch, None, None)
+    monkeypatch.setattr(gemini_client, "light_model_missing", threading.Event())
+    gemini_client.light_model_missing.set()
+    assert choose_model(100, True) == MODEL_NAME
+
+def calls(*delays):
+    """make_call whose n-th call sleeps delays[n] and returns n, raising for a negative delay"""
+    count = iter(range(len(delays)))
+    lock = threading.Lock()
+
+    def make_call():
+        with lock:
+            n = next(count)
+        time.sleep(abs(delays[n]))
+        if delays[n] < 0:
+            raise RuntimeError(f"call {n} failed")
+        return n
+    return make_call
+
+def test_fast_call_is_not_hedged(monkeypatch):
+    monkeypatch.setattr(gemini_client, "may_hedge", lambda: True)
+    hedges = gemini_client.metrics["hedges"]
+    assert hedged(calls(0.0, 0.0), 0.2) == 0
+    assert hedged(calls(0.0), None) == 0
+    assert gemini_client.metrics["hedges"] == hedges
+
+def test_slow_call_is_hedged_and_the_first_answer_wins(monkeypatch):
+    monkeypatch.setattr(gemini_client, "may_hedge", lambda: True)
+    hedges, wins = gemini_client.metrics["hedges"], gemini_client.metrics["hedge_wins"]
+    assert hedged(calls(0.5, 0.0), 0.05) == 1
+    assert gemini_client.metrics["hedges"] == hedges + 1
+    assert gemini_client.metrics["hedge_wins"] == wins + 1
+
+def test_hedge_covers_a_failed_primary(monkeypatch):
+    monkeypatch.setattr(gemini_client, "may_hedge", lambda: True)
+    assert hedged(calls(-0.2, 0.3), 0.05) == 1
+
+def test_no_hedge_outside_the_budget(monkeypatch):
+    monkeypatch.setattr(gemini_client, "may_hedge", lambda: False)
+    assert hedged(calls(0.2, 0.0), 0.05) == 0
+
+def test_async_hedge_cancels_the_slower_copy(monkeypatch):
+    monkeypatch.setattr(gemini_client, "may_hedge", lambda: True)
+    cancelled = []
+    started = []
+
+    def make_call():
+        async def run(n, delay):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(n)
+                raise
+            return n
+        started.append(None)
+        return run(len(started) - 1, 1.0 if len(started) == 1 else 0.0)
+
+    async def main():
+        result = await hedged_async(make_call, 0.05)
+        await asyncio.sleep(0)
+        return result
+    assert asyncio.run(main()) == 1
+    assert cancelled == [0]
@@ -0,0 +1,25 @@
+import time
+from utils.metrics import record_stage, server_timing_header, stage, start_request_timings, wall_clock
+
+def test_wall_clock_counts_overlaps_once():
+    assert wall_clock([]) == 0.0
+    assert wall_clock([(0.0, 1.0), (2.0, 0.5)]) == 1.5
+    assert wall_clock([(0.0, 1.0), (0.5, 1.0), (0.2, 0.3)]) == 1.5
+    assert wall_clock([(1.0, 2.0), (0.0, 1.0)]) == 3.0
+
+def test_parallel_stages_are_not_added_up():
+    timings = [("fetch", 0.0, 0.1), ("llm", 0.1, 1.0), ("llm", 0.1, 1.2), ("llm", 0.15, 0.9), ("prompt", 1.4, 0.01), ("prompt", 1.5, 0.02)]
+    assert server_timing_header(timings, 1.6) == "fetch;dur=100.0, llm;dur=1200.0, prompt;dur=30.0, total;dur=1600.0"
+
+def test_stages_land_in_the_request_timings():
+    timings = start_request_timings()
+    before = time.perf_counter()
+    with stage("parse"):
+        pass
+    record_stage("fetch", 0.25)
+    after = time.perf_counter()
+    assert [name for name, _, _ in timings] == ["parse", "fetch"]
+    assert before <= timings[0][1] <= after
+    # Recorded when it ended, so it started seconds earlier
+    assert timings[1][2] == 0.25
+    assert before - 0.25 <= timings[1][1] <= after - 0.25
@@ -0,0 +1,74 @@
+import time
+from utils.page_cache import PageCache, compute_expiry, normalize_url
+
+def make_cache(tmp_path, **options):
+    return PageCache(path=str(tmp_path / "pages.sqlite3"), **options)
+
+def test_stores_validators_and_freshness(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("https://example.com/a", "<html>a</html>",
+              {"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT", "Cache-Control": "max-age=60"})
+    entry = cache.get("https://example.com/a")
+    assert entry["body"] == "<html>a</html>"
+    assert entry["etag"] == '"v1"'
+    assert entry["last_modified"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+    assert entry["fresh"]
+
+def test_no_cache_entry_is_stale_until_revalidated(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("https://example.com/a", "body", {"ETag": '"v1"', "Cache-Control": "no-cache"})
+    assert not cache.get("https://example.com/a")["fresh"]
+    cache.revalidate("https://example.com/a", {"ETag": '"v2"', "Cache-Control": "max-age=60"})
+    entry = cache.get("https://example.com/a")
+    assert entry["fresh"]
+    assert entry["etag"] == '"v2"'
+    assert entry["body"] == "body"
+
+def test_revalidation_keeps_validators_the_304_omits(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("https://example.com/a", "body", {"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"})
+    cache.revalidate("https://example.com/a", {})
+    entry = cache.get("https://example.com/a")
+    assert entry["etag"] == '"v1"'
+    assert entry["last_modified"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+
+def test_no_store_is_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("https://example.com/a", "body", {"Cache-Control": "private, no-store"})
+    assert cache.get("https://example.com/a") is None
+
+def test_equivalent_urls_share_an_entry(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("HTTPS://Example.com:443/a?b=2&a=1#top", "body", {})
+    assert cache.get("https://example.com/a?a=1&b=2")["body"] == "body"
+    assert normalize_url("http://example.com") == "http://example.com/"
+
+def test_expiry_rules():
+    now = 1000.0
+    assert compute_expiry({"Cache-Control": "max-age=60, s-maxage=10"}, now, 300) == now + 10
+    assert compute_expiry({"Cache-Control": "max-age=bad"}, now, 300) == now
+    assert compute_expiry({"Expires": "not a date"}, now, 300) == now
+    assert compute_expiry({}, now, 300) == now + 300
+
+def test_evicts_least_recently_used_over_budget(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=250)
+    for name in "abc":
+        cache.put(f"https://example.com/{name}", name * 100, {})
+        time.sleep(0.01)
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get("https://example.com/a") is None
+    # b was stored before c, but reading it makes it the more recently used
+    cache.get("https://example.com/b")
+    time.sleep(0.01)
+    cache.put("https://example.com/d", "d" * 100, {})
+    assert cache.get("https://example.com/c") is None
+    assert cache.get("https://example.com/b") is not None
+    assert cache.get_stats()["bytes"] <= 250
+
+def test_oversized_body_and_disabled_cache_are_skipped(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10)
+    cache.put("https://example.com/a", "x" * 11, {})
+    assert cache.get("https://example.com/a") is None
+    disabled = PageCache(path=str(tmp_path / "off.sqlite3"), max_bytes=0)
+    disabled.put("https://example.com/a", "x", {})
+    assert disabled.get("https://example.com/a") is None
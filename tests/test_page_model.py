@@ -0,0 +1,56 @@
+import base64
+import json
+from utils.page_model import ARRAY_FIELDS, CompactPage
+
+PAGE = {
+    "title": "Solar power",
+    "headings": [
+        {"level": "h1", "text": "Solar power", "id": "top"},
+        {"level": "h3", "text": "Costs", "id": "costs"}
+    ],
+    "paragraphs": ["Sunlight becomes electricity.", "Panels got cheaper.", "Sunlight becomes electricity."],
+    "lists": [["Photovoltaics", "Concentrated solar"], []],
+    "tables": [[["Year", "Price"], ["2010", "2.0"], ["2020", "0.4"]], [["Only", "row"]]],
+    "links": [{"text": "Wind power", "url": "https://example.com/wind"}, {"text": "", "url": "https://example.com/"}],
+    "sections": [
+        {"heading": "Introduction", "content": ["Sunlight becomes electricity."]},
+        {"heading": "Costs", "id": "costs", "content": ["Panels got cheaper.", "Unicode: ångström ☀"]},
+        {"heading": "Empty", "id": "empty", "content": []}
+    ],
+    "base_url": "https://example.com/solar"
+}
+
+def test_from_dict_round_trips():
+    assert CompactPage.from_dict(PAGE).to_dict() == PAGE
+
+def test_state_round_trips_through_json():
+    state = json.loads(json.dumps(CompactPage.from_dict(PAGE).to_state()))
+    assert CompactPage.from_state(state).to_dict() == PAGE
+
+def test_repeated_strings_are_stored_once():
+    page = CompactPage.from_dict(PAGE)
+    assert page.text.count("Sunlight becomes electricity.") == 1
+
+def test_section_without_id_and_missing_base_url():
+    content = {key: value for key, value in PAGE.items() if key != "base_url"}
+    page = CompactPage.from_state(CompactPage.from_dict(content).to_state())
+    assert "id" not in page.section(0)
+    assert page.section(1) == PAGE["sections"][1]
+    assert "base_url" not in page
+    assert page.get("base_url", "fallback") == "fallback"
+    assert page.to_dict() == content
+
+def test_empty_page():
+    content = {"title": "", "headings": [], "paragraphs": [], "lists": [], "tables": [], "links": [], "sections": []}
+    assert CompactPage.from_state(CompactPage.from_dict(content).to_state()).to_dict() == content
+
+def test_state_is_compressed_and_older_states_still_load():
+    page = CompactPage.from_dict(PAGE)
+    assert page.to_state()["text"] != page.text
+    older = {
+        "title": page.title,
+        "base_url": page.base_url,
+        "text": page.text,
+        "arrays": {name: base64.b64encode(getattr(page, name).tobytes()).decode('ascii') for name in ARRAY_FIELDS}
+    }
+    assert CompactPage.from_state(older).to_dict() == PAGE
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from agents import gemini_client
+from agents.gemini_client import GeminiError, call_gemini, call_gemini_async
+from utils.resilience import CircuitBreaker
+
+def open_breaker(reset_timeout=0.0):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+def test_opens_after_threshold_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert 0 < breaker.retry_in() <= 60
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_lets_one_trial_through():
+    breaker = open_breaker()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+def test_successful_trial_closes():
+    breaker = open_breaker()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_failed_trial_reopens():
+    breaker = open_breaker()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_released_trial_lets_the_next_call_try():
+    breaker = open_breaker()
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+def test_release_trial_changes_nothing_when_closed_or_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.release_trial()
+    assert breaker.allow()
+    breaker.record_failure()
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = open_breaker()
+    monkeypatch.setattr(gemini_client, "breaker", breaker)
+    return breaker
+
+def test_cancelled_trial_call_frees_the_trial(breaker):
+    async def run():
+        trial = asyncio.create_task(call_gemini_async(lambda: asyncio.sleep(10), "prompt"))
+        await asyncio.sleep(0.05)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    in_flight = gemini_client.in_flight.in_flight
+    asyncio.run(run())
+    assert gemini_client.in_flight.in_flight == in_flight
+    assert breaker.allow()
+
+def test_non_retryable_error_does_not_close_the_breaker(breaker):
+    def rejected():
+        raise GeminiError("Gemini API error: bad request", status=400, retryable=False)
+
+    with pytest.raises(GeminiError):
+        call_gemini(rejected, "prompt")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    breaker.record_success()
+    assert call_gemini(lambda: "ok", "prompt") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,57 @@
+from utils.section_diff import page_blocks, block_hashes, diff_blocks, removed_title, CONDENSE_CHARS
+
+def page(sections, title="Guide"):
+    return {
+        "title": title,
+        "headings": [],
+        "paragraphs": [],
+        "lists": [],
+        "tables": [],
+        "links": [],
+        "sections": [{"heading": heading, "id": heading.lower(), "content": content} for heading, content in sections]
+    }
+
+def blocks_of(content):
+    return page_blocks(content, "")
+
+def test_unchanged_page_has_no_changes():
+    content = page([("Intro", ["Hello."]), ("Usage", ["Run it."])])
+    assert diff_blocks(block_hashes(blocks_of(content)), blocks_of(content)) == {"changed": [], "added": [], "removed": []}
+
+def test_whitespace_and_case_do_not_count_as_changes():
+    before = page([("Intro", ["Hello   world."])])
+    after = page([("Intro", ["hello world."])])
+    assert diff_blocks(block_hashes(blocks_of(before)), blocks_of(after))["changed"] == []
+
+def test_changed_added_and_removed_sections():
+    before = page([("Intro", ["Hello."]), ("Usage", ["Run it."]), ("Faq", ["None yet."])])
+    after = page([("Intro", ["Hello."]), ("Usage", ["Run it twice."]), ("Install", ["pip install."])])
+    changes = diff_blocks(block_hashes(blocks_of(before)), blocks_of(after))
+    assert [block["key"] for block in changes["changed"]] == ["section:usage"]
+    assert [block["key"] for block in changes["added"]] == ["section:install"]
+    assert changes["removed"] == ["section:faq"]
+    assert removed_title("section:faq") == "section: faq"
+
+def test_repeated_keys_are_numbered():
+    content = page([("Notes", ["One."]), ("Notes", ["Two."])])
+    assert [block["key"] for block in blocks_of(content) if block["key"].startswith("section")] == [
+        "section:notes", "section:notes#2"
+    ]
+
+def test_long_changed_block_carries_only_changed_lines():
+    lines = [f"Line {n} " + "x" * 40 for n in range(60)]
+    before = page([("Log", lines)])
+    after = page([("Log", lines[:-1] + ["A brand new line."])])
+    assert len('\n'.join(lines)) > CONDENSE_CHARS
+    changes = diff_blocks(block_hashes(blocks_of(before)), blocks_of(after), blocks_of(before))
+    text = changes["changed"][0]["text"]
+    assert "A brand new line." in text
+    assert lines[-1] in text
+    assert lines[0] not in text
+
+def test_loose_text_is_grouped_under_its_heading():
+    content = page([("Intro", ["Hello."])])
+    content["headings"] = [{"level": "h2", "text": "Extras", "id": "extras"}]
+    blocks = page_blocks(content, "Hello.\nExtras\nA footnote outside sections.")
+    assert blocks[-1]["key"] == "text:extras"
+    assert blocks[-1]["text"] == "A footnote outside sections."
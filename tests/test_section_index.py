@@ -0,0 +1,62 @@
+from utils.page_model import CompactPage
+from utils.section_index import build_section_index, entry_text, lookup, normalize
+
+PAGE = {
+    "title": "Solar power",
+    "sections": [
+        {"heading": "Introduction", "content": ["Sunlight becomes electricity."]},
+        {"heading": "Installation Costs", "id": "costs", "content": ["Panels got cheaper.", "Labour did not."]},
+        {"heading": "Empty", "id": "empty", "content": []}
+    ]
+}
+RESULTS = {
+    "student": {
+        "summary": "Solar panels turn light into power.",
+        "key_definitions": [{"term": "PV", "definition": "Photovoltaics"}],
+        "flashcards": [],
+        "actions": [{"label": "View Glossary", "section_id": "key_definitions"}],
+        "url": "https://example.com/solar",
+        "transformed_html": "<div></div>"
+    },
+    "professional": {"swot": {"strengths": ["Cheap"], "weaknesses": []}}
+}
+INDEX = build_section_index(PAGE, RESULTS)
+
+def test_normalize_drops_punctuation_action_verbs_and_plurals():
+    assert normalize("View Key-Definitions!") == "key definition"
+    assert normalize("Go to   Costs") == "cost"
+    assert normalize("bus") == "bus"
+
+def test_index_skips_meta_and_empty_fields_and_sections():
+    titles = [(entry["mode"], entry["title"]) for entry in INDEX]
+    assert ("student", "Summary") in titles
+    assert ("student", "Key Definitions") in titles
+    assert ("professional", "SWOT") in titles
+    assert not any(title in ("Flashcards", "Url", "Transformed Html", "Actions", "Empty") for _, title in titles)
+    assert (None, "Installation Costs") in titles
+
+def test_exact_and_action_label_lookups():
+    assert lookup(INDEX, "Summary", mode="student")["title"] == "Summary"
+    assert lookup(INDEX, "View Glossary", mode="student")["title"] == "Key Definitions"
+    assert lookup(INDEX, "anything", section_id="costs")["title"] == "Installation Costs"
+
+def test_fuzzy_lookup_tolerates_typos_but_not_unrelated_labels():
+    assert lookup(INDEX, "Key Defintions", mode="student")["title"] == "Key Definitions"
+    assert lookup(INDEX, "Instalation cost")["title"] == "Installation Costs"
+    assert lookup(INDEX, "Pricing breakdown", mode="student") is None
+
+def test_other_modes_fields_are_not_matched():
+    assert lookup(INDEX, "SWOT", mode="student") is None
+    assert lookup(INDEX, "SWOT", mode="professional")["mode"] == "professional"
+
+def test_result_field_wins_a_tie_with_a_page_section():
+    index = build_section_index({"sections": [{"heading": "Summary", "content": ["Page summary text."]}]}, RESULTS)
+    assert lookup(index, "Summary", mode="student")["mode"] == "student"
+    assert lookup(index, "Summary", mode="researcher")["mode"] is None
+
+def test_section_text_is_read_from_the_stored_page():
+    state = CompactPage.from_dict(PAGE).to_state()
+    entry = lookup(INDEX, "Installation Costs")
+    assert "text" not in entry
+    assert entry_text(entry, state) == "Panels got cheaper.\nLabour did not."
+    assert entry_text(lookup(INDEX, "Summary", mode="student"), state) == "Solar panels turn light into power."
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import pytest
+from utils.metrics import start_request_timings
+from utils.singleflight import SingleFlight
+
+def test_concurrent_calls_run_once():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return {"value": value}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", work, 1)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("key", work, 2))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flights.get_stats()["coalesced"] < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == [{"value": 1}] * 4
+    # Followers get copies, so one caller changing its result cannot affect another
+    assert len({id(result) for result in results}) == 4
+    assert flights.get_stats() == {"leaders": 1, "coalesced": 3, "timeouts": 0, "in_flight": 0}
+
+def test_key_is_forgotten_after_the_call():
+    flights = SingleFlight()
+    assert flights.do("key", lambda: 1) == 1
+    assert flights.do("key", lambda: 2) == 2
+    assert flights.get_stats()["leaders"] == 2
+
+def test_waiting_is_timed_as_the_coalesced_stage():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    stages = {}
+
+    def call(name):
+        timings = start_request_timings()
+        flights.do("key", lambda: started.set() or release.wait(5))
+        stages[name] = [(stage, seconds) for stage, _, seconds in timings]
+
+    leader = threading.Thread(target=call, args=("leader",))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call, args=("follower",))
+    follower.start()
+    while flights.get_stats()["coalesced"] < 1:
+        threading.Event().wait(0.01)
+    threading.Event().wait(0.05)
+    release.set()
+    for thread in (leader, follower):
+        thread.join(5)
+    assert stages["leader"] == []
+    assert [stage for stage, _ in stages["follower"]] == ["coalesced"]
+    assert stages["follower"][0][1] >= 0.05
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flights.do("key", fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flights.get_stats()["coalesced"] < 2:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ["boom"] * 3
+
+def test_waiters_time_out_without_stopping_the_leader():
+    flights = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    leader = threading.Thread(target=flights.do, args=("key", release.wait, 5))
+    leader.start()
+    while flights.get_stats()["in_flight"] == 0:
+        threading.Event().wait(0.01)
+    with pytest.raises(TimeoutError):
+        flights.do("key", release.wait, 5)
+    release.set()
+    leader.join(5)
+    assert flights.get_stats()["timeouts"] == 1
+
+def test_async_calls_run_once():
+    flights = SingleFlight()
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return [value]
+
+    async def run():
+        return await asyncio.gather(*[flights.do_async("key", work, n) for n in range(5)])
+
+    assert asyncio.run(run()) == [[0]] * 5
+    assert calls == [0]
+    assert flights.get_stats()["in_flight"] == 0
+
+def test_async_waiters_record_the_coalesced_stage():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return 1
+
+    async def request():
+        timings = start_request_timings()
+        await flights.do_async("key", work)
+        return [stage for stage, _, _ in timings]
+
+    async def run():
+        return await asyncio.gather(request(), request())
+
+    assert asyncio.run(run()) == [[], ["coalesced"]]
@@ -0,0 +1,67 @@
+from utils.page_model import CompactPage
+from utils.text_index import LOOSE, build_chunks, index_chunks, index_page, resolve_chunk, search, split_paragraphs
+
+LONG = ' '.join(f"word{i}" for i in range(120))
+PARAGRAPHS = ["First short paragraph.", "", "Second one.", LONG, "Tail after the long one.", "x" * 90]
+
+PAGE = {
+    "title": "Bees",
+    "headings": [],
+    "paragraphs": [],
+    "lists": [],
+    "tables": [],
+    "links": [],
+    "sections": [
+        {"heading": "Hives", "id": "hives", "content": ["Honey bees live in hives.", LONG]},
+        {"heading": "Food", "content": ["Bees collect nectar and pollen."]}
+    ]
+}
+TEXT = "Bees\nHives\nHoney bees live in hives.\n" + LONG + "\nFooter about beekeeping courses\nFood\nBees collect nectar and pollen."
+
+def located(paragraphs, location):
+    first, last, start, end = location
+    return '\n'.join(paragraphs[first:last])[start:end]
+
+def test_split_paragraphs_locations_find_the_text_again():
+    for max_chars in (10, 40, 200, 5000):
+        pieces = split_paragraphs(PARAGRAPHS, max_chars)
+        assert pieces
+        for text, location in pieces:
+            assert located(PARAGRAPHS, location) == text
+            assert text.strip() == text and text
+
+def test_split_paragraphs_respects_max_chars_and_loses_no_text():
+    pieces = split_paragraphs(PARAGRAPHS, 40)
+    assert all(len(text) <= 40 for text, _ in pieces)
+    assert ''.join(''.join(text.split()) for text, _ in pieces) == ''.join(''.join(paragraph.split()) for paragraph in PARAGRAPHS)
+
+def test_build_chunks_refs_resolve_to_the_chunk_text():
+    page = CompactPage.from_dict(PAGE)
+    index = index_page(PAGE, TEXT, 100)
+    chunks = build_chunks(PAGE, TEXT, 100, index["loose"])
+    assert [chunk["ref"] for chunk in chunks] == index["chunks"]
+    for chunk in chunks:
+        assert resolve_chunk(chunk["ref"], page, index["loose"]) == {"heading": chunk["heading"], "id": chunk["id"], "text": chunk["text"]}
+    assert index_chunks(index, page)[0]["heading"] == "Hives"
+
+def test_uncovered_text_becomes_loose_refs():
+    index = index_page(PAGE, TEXT)
+    loose = [ref for ref in index["chunks"] if ref[0] == LOOSE]
+    assert len(loose) == 1
+    assert "Footer about beekeeping courses" in index["loose"]
+    assert "Honey bees live in hives." not in index["loose"]
+
+def test_search_resolves_refs_from_the_page():
+    page = CompactPage.from_dict(PAGE)
+    index = index_page(PAGE, TEXT)
+    assert search(index, "nectar", 1, page)[0] == {"heading": "Food", "id": "", "text": "Bees collect nectar and pollen."}
+    assert search(index, "beekeeping courses", 1, page)[0] == {"heading": "", "id": "", "text": '\n'.join(index["loose"])}
+
+def test_search_reads_packed_and_list_postings():
+    sections = [{"heading": f"Part {i}", "content": [f"Common topic text number {i}."]} for i in range(40)]
+    content = dict(PAGE, sections=sections)
+    page = CompactPage.from_dict(content)
+    index = index_page(content, "")
+    assert isinstance(index["postings"]["common"], str)
+    assert isinstance(index["postings"]["7"], list)
+    assert search(index, "number 7", 1, page)[0]["heading"] == "Part 7"
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+from utils.metrics import server_timing_header
+
+# Request validation and response formatting shared by the Flask app (main.py) and its ASGI twin (asgi.py).
+# Each parse_* function takes the decoded JSON body and returns (arguments, error message).
+
+VALID_MODES = ['student', 'researcher', 'professional']
+INVALID_MODE = "Invalid mode. Choose: student, researcher, professional"
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def timing_event(timings, started):
+    """Last SSE message of a streamed analysis: its Server-Timing breakdown, known only once every stage has run"""
+    return sse_event("timing", {"server_timing": server_timing_header(timings, time.perf_counter() - started)})
+
+def parse_analyze_request(data):
+    """Validate an /analyze request body; modes is None for a single-mode analysis"""
+    if not data:
+        return None, "No JSON data provided"
+
+    url = data.get('url')
+    mode = data.get('mode', 'student')
+    modes = data.get('modes')
+    use_cache = not bool(data.get('bypass_cache', False))
+
+    if not url:
+        return None, "URL is required"
+
+    if modes is not None:
+        if not isinstance(modes, list) or not modes:
+            return None, "modes must be a non-empty list"
+        modes = list(dict.fromkeys(modes))
+        if any(m not in VALID_MODES for m in modes):
+            return None, INVALID_MODE
+    elif mode not in VALID_MODES:
+        return None, INVALID_MODE
+
+    return {"url": url, "mode": mode, "modes": modes, "use_cache": use_cache}, None
+
+def parse_stream_request(data):
+    """Validate an /analyze/stream request body"""
+    if not data:
+        return None, "No JSON data provided"
+
+    url = data.get('url')
+    mode = data.get('mode', 'student')
+    use_cache = not bool(data.get('bypass_cache', False))
+
+    if not url:
+        return None, "URL is required"
+
+    if mode not in VALID_MODES:
+        return None, INVALID_MODE
+
+    return {"url": url, "mode": mode, "use_cache": use_cache}, None
+
+def parse_chat_request(data):
+    """Validate a /chat request body"""
+    if not data:
+        return None, "No JSON data provided"
+
+    url = data.get('url')
+    message = data.get('message')
+    mode = data.get('mode', 'student')
+
+    if not url:
+        return None, "URL is required"
+
+    if not message:
+        return None, "Message is required"
+
+    return {"url": url, "message": message, "mode": mode}, None
+
+def parse_missing_section_request(data):
+    """Validate a /missing-section request body"""
+    if not data:
+        return None, "No JSON data provided"
+
+    url = data.get('url')
+    section_label = data.get('section_label')
+    section_id = data.get('section_id')
+    mode = data.get('mode', 'student')
+
+    if not url or not section_label:
+        return None, "URL and section_label are required"
+
+    return {"url": url, "section_label": section_label, "mode": mode, "section_id": section_id}, None
+
+def parse_note_request(data):
+    """Validate a /create_note request body"""
+    if not data:
+        return None, "No JSON data provided"
+
+    text = data.get('text')
+    mode = data.get('mode', 'student')
+    context = data.get('context', '')
+
+    if not text:
+        return None, "Text is required"
+
+    return {"text": text, "mode": mode, "context": context}, None
+
+def parse_job_items(data):
+    """Validate a /jobs request body; return (items, error message)"""
+    if not data:
+        return None, "No JSON data provided"
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return None, "items must be a non-empty list of {url, mode}"
+    if len(items) > int(os.environ.get('JOBS_MAX_ITEMS', 1000)):
+        return None, "Too many items in one job"
+
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('url'):
+            return None, "Every item needs a url"
+        mode = item.get('mode', 'student')
+        if mode not in VALID_MODES:
+            return None, INVALID_MODE
+        parsed.append({"url": item['url'], "mode": mode})
+    return parsed, None
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache with per-entry expiry and hit/miss counters"""
+
+    def __init__(self, max_entries=512, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key, default=None):
+        """Return the live value for key, refreshing its recency"""
+        now = time.monotonic()
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return default
+            value, expires_at = item
+            if expires_at <= now:
+                del self.entries[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return default
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entries beyond max_entries"""
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def delete(self, key):
+        """Remove key if present"""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_stats(self):
+        """Return counters plus the current number of entries"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
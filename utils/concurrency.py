@@ -0,0 +1,182 @@
+import asyncio
+import collections
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+def host_of(url):
+    """Lower-cased host name of a URL, used as the key for per-host limits"""
+    return (urlsplit(url).hostname or '').lower()
+
+class Waiter:
+    """A thread (with an event) or a coroutine (with a future on its loop) queued for a slot"""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.granted = False
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self):
+        """Hand the slot over and wake the waiter; False if its event loop is gone"""
+        if self.loop is None:
+            self.granted = True
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self.wake)
+        except RuntimeError:
+            return False
+        self.granted = True
+        return True
+
+    def wake(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+class WaitQueue:
+    """First-come first-served queue of threads and coroutines waiting for a slot
+
+    Its owner keeps its own counters under lock and calls enqueue and wake_next with
+    the lock held. A released slot is handed straight to the oldest waiter instead of
+    being freed, so nobody polls and later arrivals cannot overtake the queue.
+    """
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.waiters = collections.deque()
+
+    def __len__(self):
+        return len(self.waiters)
+
+    def enqueue(self, loop=None):
+        """Queue a waiter for the calling thread, or for a coroutine on loop"""
+        waiter = Waiter(loop)
+        self.waiters.append(waiter)
+        return waiter
+
+    def wake_next(self):
+        """Give the slot being released to the oldest waiter; False if nobody took it"""
+        while self.waiters:
+            if self.waiters.popleft().grant():
+                return True
+        return False
+
+    def wait(self, waiter, timeout=None):
+        """Block until waiter is granted a slot; False if timeout expired first"""
+        if waiter.event.wait(timeout):
+            return True
+        with self.lock:
+            if waiter.granted:
+                return True
+            self.waiters.remove(waiter)
+            return False
+
+    async def wait_async(self, waiter, give_back, timeout=None):
+        """Wait for waiter's slot without blocking the event loop; False on timeout
+
+        If the waiting coroutine is cancelled after its slot was granted, give_back()
+        releases the slot again.
+        """
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            with self.lock:
+                if waiter.granted:
+                    return True
+                self.waiters.remove(waiter)
+                return False
+        except asyncio.CancelledError:
+            with self.lock:
+                granted = waiter.granted
+                if not granted:
+                    self.waiters.remove(waiter)
+            if granted:
+                give_back()
+            raise
+
+class KeyedLimiter:
+    """Bounds how many callers may hold the same key (e.g. a host) at once
+
+    Waiters for a key are served in arrival order and woken when a slot is released.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = {}
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def has_room(self, key):
+        return self.active.get(key, 0) < self.limit and not self.queues.get(key)
+
+    def enqueue(self, key, loop=None):
+        """Queue a waiter for key (called with the lock held)"""
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = WaitQueue(self.lock)
+        return queue, queue.enqueue(loop)
+
+    def forget(self, key):
+        """Drop key's wait queue once nobody is waiting on it"""
+        with self.lock:
+            if key in self.queues and not self.queues[key]:
+                del self.queues[key]
+
+    def try_acquire(self, key):
+        """Take a slot for key without waiting; return whether it succeeded"""
+        with self.lock:
+            if not self.has_room(key):
+                return False
+            self.active[key] = self.active.get(key, 0) + 1
+            return True
+
+    def acquire(self, key, timeout=None):
+        """Wait for a slot for key; return False if timeout expired first"""
+        with self.lock:
+            if self.has_room(key):
+                self.active[key] = self.active.get(key, 0) + 1
+                return True
+            queue, waiter = self.enqueue(key)
+        acquired = queue.wait(waiter, timeout)
+        self.forget(key)
+        return acquired
+
+    async def acquire_async(self, key, timeout=None):
+        """Wait for a slot for key without blocking the event loop; return False on timeout"""
+        with self.lock:
+            if self.has_room(key):
+                self.active[key] = self.active.get(key, 0) + 1
+                return True
+            queue, waiter = self.enqueue(key, asyncio.get_running_loop())
+        try:
+            return await queue.wait_async(waiter, lambda: self.release(key), timeout)
+        finally:
+            self.forget(key)
+
+    def release(self, key):
+        """Give back a slot for key, handing it to the oldest waiter for key if there is one"""
+        with self.lock:
+            queue = self.queues.get(key)
+            if queue is not None and queue.wake_next():
+                return
+            count = self.active.get(key, 0) - 1
+            if count > 0:
+                self.active[key] = count
+            else:
+                self.active.pop(key, None)
+
+    def in_use(self, key):
+        """Number of slots currently held for key"""
+        with self.lock:
+            return self.active.get(key, 0)
+
+    @contextmanager
+    def hold(self, key):
+        """Context manager holding a slot for key"""
+        self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
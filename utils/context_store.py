@@ -0,0 +1,262 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_STORE_PATH = os.path.join(tempfile.gettempdir(), 'cogniparse_context_store.sqlite3')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 3600
+MMAP_SIZE = 256 * 1024 * 1024
+
+def context_size(context):
+    """Approximate the memory footprint of a context by its serialized size"""
+    return len(json.dumps(context))
+
+class MemoryContextStore:
+    """Per-process LRU context store bounded by a byte budget and a TTL"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, on_evict=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, url):
+        """Return the stored context for url, or None if missing or expired"""
+        expired = None
+        with self.lock:
+            item = self.entries.get(url)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            context, size, expires_at = item
+            if expires_at <= time.time():
+                del self.entries[url]
+                self.total_bytes -= size
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                expired = context
+            else:
+                self.entries.move_to_end(url)
+                self.stats["hits"] += 1
+        if expired is not None:
+            self._notify(url, expired)
+            return None
+        return context
+
+    def set(self, url, context):
+        """Store the context for url and evict least recently used entries over budget"""
+        size = context_size(context)
+        with self.lock:
+            previous = self.entries.pop(url, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self.entries[url] = (context, size, time.time() + self.ttl)
+            self.total_bytes += size
+            evicted = self._evict()
+        for old_url, old_context in evicted:
+            self._notify(old_url, old_context)
+
+    def update(self, url, key, change):
+        """Atomically set one key of url's context to change(context); None from change leaves it as is
+
+        change sees the context as stored right now, so a newer context stored meanwhile is
+        never replaced by a stale copy. Returns the new value, or None if nothing was written.
+        """
+        with self.lock:
+            item = self.entries.get(url)
+            if item is None or item[2] <= time.time():
+                return None
+            context, size, expires_at = item
+            value = change(context)
+            if value is None:
+                return None
+            context = dict(context)
+            context[key] = value
+            new_size = context_size(context)
+            self.entries[url] = (context, new_size, expires_at)
+            self.total_bytes += new_size - size
+            evicted = self._evict()
+        for old_url, old_context in evicted:
+            self._notify(old_url, old_context)
+        return value
+
+    def delete(self, url):
+        """Remove the context for url"""
+        with self.lock:
+            item = self.entries.pop(url, None)
+            if item is not None:
+                self.total_bytes -= item[1]
+        if item is not None:
+            self._notify(url, item[0])
+
+    def get_stats(self):
+        """Return counters plus current entry count and size"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+            stats["bytes"] = self.total_bytes
+        return stats
+
+    def _evict(self):
+        """Drop least recently used entries while over budget (lock held); return them for _notify"""
+        evicted = []
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            old_url, (old_context, old_size, _) = self.entries.popitem(last=False)
+            self.total_bytes -= old_size
+            self.stats["evictions"] += 1
+            evicted.append((old_url, old_context))
+        return evicted
+
+    def _notify(self, url, context):
+        if self.on_evict:
+            self.on_evict(url, context)
+
+class SQLiteContextStore:
+    """Context store in a memory-mapped SQLite file shared by every worker on the host"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, on_evict=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS contexts (
+            url TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS contexts_last_access ON contexts (last_access)")
+
+    def get(self, url):
+        """Return the stored context for url, or None if missing or expired"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT data, expires_at FROM contexts WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if row[1] <= now:
+                self.conn.execute("DELETE FROM contexts WHERE url = ?", (url,))
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                expired = json.loads(row[0])
+            else:
+                self.conn.execute("UPDATE contexts SET last_access = ? WHERE url = ?", (now, url))
+                self.stats["hits"] += 1
+                expired = None
+        if expired is not None:
+            self._notify(url, expired)
+            return None
+        return json.loads(row[0])
+
+    def set(self, url, context):
+        """Store the context for url and evict least recently used entries over budget"""
+        data = json.dumps(context)
+        now = time.time()
+        evicted = []
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO contexts VALUES (?, ?, ?, ?, ?)",
+                    (url, data, len(data), now + self.ttl, now)
+                )
+                for old_url, old_data in self.conn.execute(
+                    "SELECT url, data FROM contexts WHERE expires_at <= ?", (now,)
+                ).fetchall():
+                    self.conn.execute("DELETE FROM contexts WHERE url = ?", (old_url,))
+                    self.stats["expirations"] += 1
+                    evicted.append((old_url, old_data))
+                total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM contexts").fetchone()[0]
+                if total > self.max_bytes:
+                    for old_url, old_data, size in self.conn.execute(
+                        "SELECT url, data, size FROM contexts WHERE url != ? ORDER BY last_access ASC", (url,)
+                    ).fetchall():
+                        self.conn.execute("DELETE FROM contexts WHERE url = ?", (old_url,))
+                        self.stats["evictions"] += 1
+                        evicted.append((old_url, old_data))
+                        total -= size
+                        if total <= self.max_bytes:
+                            break
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        for old_url, old_data in evicted:
+            self._notify(old_url, json.loads(old_data))
+
+    def update(self, url, key, change):
+        """Atomically set one key of url's context to change(context); None from change leaves it as is
+
+        The read and the write share one IMMEDIATE transaction, so no worker can store a
+        context in between. Returns the new value, or None if nothing was written.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT data FROM contexts WHERE url = ? AND expires_at > ?", (url, now)
+                ).fetchone()
+                value = None
+                if row is not None:
+                    context = json.loads(row[0])
+                    value = change(context)
+                if value is not None:
+                    context[key] = value
+                    data = json.dumps(context)
+                    self.conn.execute(
+                        "UPDATE contexts SET data = ?, size = ?, last_access = ? WHERE url = ?",
+                        (data, len(data), now, url)
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def delete(self, url):
+        """Remove the context for url"""
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM contexts WHERE url = ?", (url,)).fetchone()
+            self.conn.execute("DELETE FROM contexts WHERE url = ?", (url,))
+        if row is not None:
+            self._notify(url, json.loads(row[0]))
+
+    def get_stats(self):
+        """Return counters plus current entry count and size"""
+        with self.lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM contexts").fetchone()
+            stats = dict(self.stats)
+        stats["entries"] = entries
+        stats["bytes"] = total
+        return stats
+
+    def _notify(self, url, context):
+        if self.on_evict:
+            self.on_evict(url, context)
+
+def create_context_store(on_evict=None):
+    """Build the context store selected by the CONTEXT_STORE environment variable"""
+    backend = os.environ.get('CONTEXT_STORE', 'memory').lower()
+    max_bytes = int(os.environ.get('CONTEXT_STORE_MAX_BYTES', DEFAULT_MAX_BYTES))
+    ttl = int(os.environ.get('CONTEXT_STORE_TTL', DEFAULT_TTL))
+    if backend == 'memory':
+        return MemoryContextStore(max_bytes=max_bytes, ttl=ttl, on_evict=on_evict)
+    if backend == 'sqlite':
+        path = os.environ.get('CONTEXT_STORE_PATH', DEFAULT_STORE_PATH)
+        return SQLiteContextStore(path=path, max_bytes=max_bytes, ttl=ttl, on_evict=on_evict)
+    raise ValueError(f"Unknown CONTEXT_STORE backend: {backend}")
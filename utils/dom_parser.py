@@ -1,5 +1,7 @@
 from bs4 import BeautifulSoup
+from lxml import etree
 import re
+import time
 
 def parse_webpage(html):
     """Parse webpage HTML and extract structured content"""
@@ -87,6 +89,12 @@ def parse_webpage(html):
     
     return content
 
+def cut_text(text, max_length=15000):
+    """Cut text to max_length characters, marking the cut with "..." (0 keeps all of it)"""
+    if max_length > 0 and len(text) > max_length:
+        return text[:max_length] + "..."
+    return text
+
 def get_text_content(html, max_length=15000):
     """Extract clean text content from HTML"""
     soup = BeautifulSoup(html, 'lxml')
@@ -98,7 +106,500 @@ def get_text_content(html, max_length=15000):
     lines = [line.strip() for line in text.splitlines() if line.strip()]
     clean_text = '\n'.join(lines)
     
-    if len(clean_text) > max_length:
-        clean_text = clean_text[:max_length] + "..."
+    return cut_text(clean_text, max_length)
+
+
+PARSE_SKIP_TAGS = {"script", "style", "nav", "footer", "header", "aside"}
+TEXT_SKIP_TAGS = {"script", "style", "nav", "footer", "header"}
+STRING_CONTAINER_TAGS = {"rt", "rp", "style", "script", "template"}
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+SECTION_HEADING_TAGS = {"h1", "h2", "h3", "h4"}
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+# Main-content scoring, after Readability: paragraphs score their parent block and half
+# their grandparent, blocks get a bonus or penalty from their tag and class/id/role
+# names, and a block's score shrinks with the share of its text that is link text
+PARAGRAPH_TAGS = {"p", "pre", "blockquote"}
+CONTAINER_TAGS = {"div", "section", "article", "main", "aside", "form", "ul", "ol", "dl", "table", "td", "li", "body"}
+BLOCK_TAGS = PARAGRAPH_TAGS | CONTAINER_TAGS | HEADING_TAGS
+TAG_WEIGHTS = {
+    "article": 10, "main": 10, "div": 5, "section": 3, "td": 3,
+    "form": -3, "ul": -3, "ol": -3, "dl": -3, "li": -3, "aside": -25
+}
+NEGATIVE_NAMES = re.compile(
+    r'banner|breadcrumb|carousel|comment|consent|cookie|foot|gdpr|legal|masthead|menu|modal|'
+    r'nav|newsletter|popup|promo|recommend|related|share|shopping|sidebar|social|sponsor|'
+    r'subscribe|tags|teaser|toolbar|widget|(^|[-_ ])ads?([-_ ]|$)',
+    re.IGNORECASE
+)
+POSITIVE_NAMES = re.compile(r'article|blog|body|content|description|entry|main|post|story|text', re.IGNORECASE)
+NEGATIVE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "dialog", "alertdialog", "menu", "menubar"}
+POSITIVE_ROLES = {"main", "article"}
+MIN_PARAGRAPH_CHARS = 25
+# Below any of these the main-content pick is not trusted and the whole page is kept
+MAIN_MIN_CHARS = 400
+MAIN_MAX_LINK_DENSITY = 0.5
+MAIN_MIN_LEAD = 2.0
+# A pick holding this much of its parent's text widens to the parent
+MAIN_PARENT_SHARE = 0.7
+
+def block_weight(tag, attrib):
+    """Score bonus or penalty of a block from its tag, role and class/id names"""
+    weight = TAG_WEIGHTS.get(tag, 0)
+    role = attrib.get('role', '').lower()
+    if role in NEGATIVE_ROLES or attrib.get('aria-modal') == 'true':
+        weight -= 25
+    elif role in POSITIVE_ROLES:
+        weight += 25
+    names = f"{attrib.get('class', '')} {attrib.get('id', '')}"
+    if names.strip():
+        if NEGATIVE_NAMES.search(names):
+            weight -= 25
+        if POSITIVE_NAMES.search(names):
+            weight += 25
+    return weight
+
+def in_ranges(position, ranges):
+    """Whether a text string position falls inside one of the (start, end) ranges"""
+    return any(start <= position < end for start, end in ranges)
+
+class Block:
+    """Text statistics of one block element, gathered while it is open and scored once it closes"""
+
+    def __init__(self, tag, parent, weight, start):
+        self.tag = tag
+        self.parent = parent
+        self.weight = weight
+        self.start = start
+        self.end = start
+        self.chars = 0
+        self.link_chars = 0
+        self.direct_chars = 0
+        self.direct_link_chars = 0
+        self.commas = 0
+        self.prose = 0
+        self.score = 0.0
+
+    def link_density(self):
+        return self.link_chars / self.chars if self.chars else 0.0
+
+    def final_score(self):
+        """Readability's candidate score: content score plus weight, scaled down by link density"""
+        return (self.score + self.weight) * (1 - self.link_density())
+
+class PageExtractor:
+    """lxml parser target that collects parse_webpage and get_text_content output in one pass
+
+    The string handling mirrors BeautifulSoup's lxml tree builder: adjacent data events
+    are merged, whitespace-only strings collapse to a single space or newline outside
+    pre/textarea, and strings inside rt/rp/script/style/template never count as text.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.pending = []
+        self.parse_skip_depth = 0
+        self.text_skip_depth = 0
+        self.container_depth = 0
+        self.preserve_depth = 0
+        self.collectors = []
+        self.text_strings = []
+        self.text_length = 0
+        self.title = None
+        self.headings = []
+        self.paragraphs = []
+        self.lists = []
+        self.tables = []
+        self.links = []
+        self.open_tables = []
+        self.open_rows = []
+        self.candidates = {"main": None, "article": None, "body": None}
+        self.open_candidates = []
+        self.open_blocks = []
+        self.blocks = []
+        self.positions = {}
+        self.link_depth = 0
+
+    def start(self, tag, attrib, nsmap=None):
+        self.flush()
+        collector = None
+        frame_flags = 0
+        
+        if tag in PARSE_SKIP_TAGS:
+            self.parse_skip_depth += 1
+            frame_flags |= 1
+        if tag in TEXT_SKIP_TAGS:
+            self.text_skip_depth += 1
+            frame_flags |= 2
+        if tag in STRING_CONTAINER_TAGS:
+            self.container_depth += 1
+            frame_flags |= 4
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+            frame_flags |= 8
+        
+        if tag in BLOCK_TAGS:
+            parent = self.open_blocks[-1] if self.open_blocks else None
+            self.open_blocks.append(Block(tag, parent, block_weight(tag, attrib), len(self.text_strings)))
+            frame_flags |= 32
+        if tag == 'a' and 'href' in attrib:
+            self.link_depth += 1
+            frame_flags |= 64
+        
+        record = None
+        if not self.parse_skip_depth:
+            if tag in HEADING_TAGS:
+                collector = []
+                record = (tag, attrib.get('id', ''), collector)
+                self.headings.append(record)
+            elif tag == 'p':
+                collector = []
+                record = ('p', '', collector)
+                self.paragraphs.append(record)
+            elif tag == 'li':
+                collector = []
+                parent = self.stack[-1][2] if self.stack else None
+                if parent is not None and parent[0] == 'list':
+                    parent[1].append(collector)
+            elif tag in ('td', 'th'):
+                collector = []
+                for row in self.open_rows:
+                    row.append(collector)
+            elif tag == 'a' and 'href' in attrib:
+                collector = []
+                self.links.append((str(attrib['href']), collector))
+            elif tag == 'title' and self.title is None:
+                collector = []
+                self.title = collector
+            
+            if record is not None and (tag == 'p' or tag in SECTION_HEADING_TAGS):
+                for elements in self.open_candidates:
+                    elements.append(record)
+            if record is not None:
+                self.positions[id(record)] = len(self.text_strings)
+        
+        marker = None
+        if not self.parse_skip_depth:
+            if tag in ('ul', 'ol'):
+                marker = ('list', [])
+                self.lists.append(marker[1])
+                self.positions[id(marker[1])] = len(self.text_strings)
+            elif tag == 'table':
+                marker = ('table', [])
+                self.tables.append(marker[1])
+                self.open_tables.append(marker[1])
+                self.positions[id(marker[1])] = len(self.text_strings)
+            elif tag == 'tr':
+                marker = ('row', [])
+                for table in self.open_tables:
+                    table.append(marker[1])
+                self.open_rows.append(marker[1])
+            if tag in self.candidates and self.candidates[tag] is None:
+                self.candidates[tag] = []
+                self.open_candidates.append(self.candidates[tag])
+                frame_flags |= 16
+        
+        if collector is not None:
+            self.collectors.append(collector)
+        self.stack.append((tag, frame_flags, marker, collector))
+
+    def end(self, tag):
+        self.flush()
+        if not self.stack:
+            return
+        name, frame_flags, marker, collector = self.stack.pop()
+        if frame_flags & 1:
+            self.parse_skip_depth -= 1
+        if frame_flags & 2:
+            self.text_skip_depth -= 1
+        if frame_flags & 4:
+            self.container_depth -= 1
+        if frame_flags & 8:
+            self.preserve_depth -= 1
+        if frame_flags & 16:
+            elements = self.candidates[name]
+            self.open_candidates = [c for c in self.open_candidates if c is not elements]
+        if frame_flags & 32:
+            self.close_block(self.open_blocks.pop())
+        if frame_flags & 64:
+            self.link_depth -= 1
+        if marker is not None:
+            if marker[0] == 'table':
+                self.open_tables.pop()
+            elif marker[0] == 'row':
+                self.open_rows.pop()
+        if collector is not None:
+            self.collectors.pop()
+
+    def data(self, data):
+        self.pending.append(data)
+
+    def comment(self, text):
+        self.flush()
+
+    def pi(self, target, data=None):
+        self.flush()
+
+    def doctype(self, *args):
+        self.flush()
+
+    def flush(self):
+        """Turn the buffered data events into one string, like BeautifulSoup's endData"""
+        if not self.pending:
+            return
+        text = ''.join(self.pending)
+        self.pending = []
+        if not self.preserve_depth and not text.strip(ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        if self.container_depth:
+            return
+        if not self.text_skip_depth:
+            self.text_strings.append(text)
+            self.text_length += len(text)
+            if self.open_blocks:
+                block = self.open_blocks[-1]
+                block.direct_chars += len(text)
+                block.commas += text.count(',')
+                if self.link_depth:
+                    block.direct_link_chars += len(text)
+        if not self.parse_skip_depth:
+            for collector in self.collectors:
+                collector.append(text)
+
+    def close_block(self, block):
+        """Score a finished block: its own text counts as a paragraph of its parent (or of itself, for containers)"""
+        block.end = len(self.text_strings)
+        block.chars += block.direct_chars
+        block.link_chars += block.direct_link_chars
+        if block.tag not in HEADING_TAGS:
+            prose = block.direct_chars - block.direct_link_chars
+            if prose >= MIN_PARAGRAPH_CHARS:
+                block.prose = prose
+                paragraph_score = 1 + block.commas + min(prose // 100, 3)
+                target = block.parent if block.tag in PARAGRAPH_TAGS else block
+                if target is not None:
+                    target.score += paragraph_score
+                    if target.parent is not None:
+                        target.parent.score += paragraph_score / 2
+        if block.parent is not None:
+            block.parent.chars += block.chars
+            block.parent.link_chars += block.link_chars
+        self.blocks.append(block)
+
+    def main_content_ranges(self):
+        """Text string ranges of the main content, or None when no block stands out confidently
+
+        The best-scoring container is kept together with its siblings that score at least a
+        fifth as well, long low-link paragraphs beside it and the headings before them. While
+        that holds most of the parent's text, the parent is kept instead, which brings back
+        titles, prices and other short lines around the main text. The pick is only trusted
+        if it has enough text, little of it link text, and scores well above any block
+        outside it.
+        """
+        containers = [block for block in self.blocks if block.tag in CONTAINER_TAGS and block.score > 0]
+        if not containers:
+            return None
+        best = max(containers, key=Block.final_score)
+        threshold = max(10, best.final_score() * 0.2)
+        selected = []
+        for block in self.blocks:
+            if block.parent is not best.parent or not block.chars:
+                continue
+            if (block is best
+                    or (block.tag in CONTAINER_TAGS and block.final_score() >= threshold)
+                    or (block.tag in PARAGRAPH_TAGS and block.prose >= 80 and block.link_density() < 0.25)):
+                selected.append(block)
+        last = max(block.end for block in selected)
+        selected += [block for block in self.blocks if block.parent is best.parent and block.tag in HEADING_TAGS and block.start < last]
+
+        parent = best.parent
+        chars = sum(block.chars for block in selected)
+        while (parent is not None and parent.parent is not None and parent.tag != 'body'
+                and chars >= MAIN_PARENT_SHARE * parent.chars):
+            selected = [parent]
+            chars = parent.chars
+            parent = parent.parent
+
+        ranges = sorted((block.start, block.end) for block in selected)
+        first, last = ranges[0][0], ranges[-1][1]
+        link_chars = sum(block.link_chars for block in selected)
+        total = sum(block.chars for block in self.blocks if block.parent is None)
+        rival = max((block.final_score() for block in containers if block.end <= first or block.start >= last), default=0)
+        if (chars < MAIN_MIN_CHARS or link_chars > MAIN_MAX_LINK_DENSITY * chars or chars >= total
+                or best.final_score() < MAIN_MIN_LEAD * rival):
+            return None
+        return ranges
+
+    def result(self, max_length=15000, main_content=False):
+        """(parse_webpage output, get_text_content output), cut to the main content if asked and it is found"""
+        ranges = self.main_content_ranges() if main_content else None
+        return self.parsed_content(ranges), self.text_content(max_length, ranges)
+
+    def close(self):
+        self.flush()
+        while self.stack:
+            self.end(self.stack[-1][0])
+        return self
+
+    def parsed_content(self, ranges=None):
+        """Assemble the parse_webpage dictionary from the collected records
+
+        With main-content ranges, only headings, paragraphs, lists, tables and sections
+        inside them are kept; the h1 and the links always are.
+        """
+        def kept(item):
+            return ranges is None or in_ranges(self.positions[id(item)], ranges)
+        
+        content = {
+            "title": ''.join(self.title).strip() if self.title is not None else "",
+            "headings": [],
+            "paragraphs": [],
+            "lists": [],
+            "tables": [],
+            "links": [],
+            "sections": []
+        }
+        
+        for record in self.headings:
+            level, heading_id, collector = record
+            text = ''.join(collector).strip()
+            if text and (level == 'h1' or kept(record)):
+                content["headings"].append({
+                    "level": level,
+                    "text": text,
+                    "id": heading_id
+                })
+        
+        for record in self.paragraphs:
+            text = ''.join(record[2]).strip()
+            if text and len(text) > 20 and kept(record):
+                content["paragraphs"].append(text)
+        
+        for collectors in self.lists:
+            if not kept(collectors):
+                continue
+            items = [text for text in (''.join(c).strip() for c in collectors) if text]
+            if items:
+                content["lists"].append(items)
+        
+        for rows in self.tables:
+            if not kept(rows):
+                continue
+            table_data = [[''.join(c).strip() for c in cells] for cells in rows if cells]
+            if table_data:
+                content["tables"].append(table_data)
+        
+        for href, collector in self.links:
+            text = ''.join(collector).strip()
+            if text and href.startswith('http'):
+                content["links"].append({
+                    "text": text,
+                    "url": href
+                })
+        
+        elements = self.candidates["main"]
+        if elements is None:
+            elements = self.candidates["article"]
+        if elements is None:
+            elements = self.candidates["body"]
+        if elements is not None:
+            current_section = {"heading": "", "content": []}
+            for record in elements:
+                if not kept(record):
+                    continue
+                name, element_id, collector = record
+                text = ''.join(collector).strip()
+                if name != 'p':
+                    if current_section["content"]:
+                        content["sections"].append(current_section)
+                    current_section = {
+                        "heading": text,
+                        "id": element_id,
+                        "content": []
+                    }
+                elif text and len(text) > 20:
+                    current_section["content"].append(text)
+            
+            if current_section["content"]:
+                content["sections"].append(current_section)
+        
+        return content
+
+    def text_content(self, max_length=15000, ranges=None):
+        """Assemble the get_text_content string from the collected strings, or from the main-content ranges of them"""
+        if ranges is None:
+            text = '\n'.join(self.text_strings)
+        else:
+            text = '\n'.join('\n'.join(self.text_strings[start:end]) for start, end in ranges)
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        clean_text = '\n'.join(lines)
+        
+        return cut_text(clean_text, max_length)
+
+def extract_page(html, max_length=15000, main_content=False):
+    """Parse HTML once and return (parse_webpage output, get_text_content output)
+
+    With main_content, boilerplate around the page's main content (menus, banners,
+    sidebars, related-item grids, legal text) is left out of both when it can be told apart.
+    """
+    if html and html[0] == '\N{BYTE ORDER MARK}':
+        html = html[1:]
     
-    return clean_text
+    extractor = PageExtractor()
+    try:
+        parser = etree.HTMLParser(target=extractor, recover=True)
+        parser.feed(html)
+        parser.close()
+    except (UnicodeDecodeError, LookupError, etree.ParserError):
+        extractor = PageExtractor()
+        parser = etree.HTMLParser(target=extractor, recover=True, encoding='utf8')
+        parser.feed(html.encode('utf8'))
+        parser.close()
+    
+    return extractor.result(max_length, main_content)
+
+class StreamingExtractor:
+    """Incremental extract_page: decoded HTML chunks are parsed as they are downloaded"""
+
+    def __init__(self, text_limit=0, main_content=False):
+        self.text_limit = text_limit
+        self.main_content = main_content
+        self.extractor = PageExtractor()
+        self.parser = etree.HTMLParser(target=self.extractor, recover=True)
+        self.started = False
+        self.failed = False
+        self.parse_seconds = 0.0
+
+    def feed(self, chunk):
+        """Parse the next piece of the document"""
+        if self.failed or not chunk:
+            return
+        if not self.started:
+            self.started = True
+            if chunk[0] == '\N{BYTE ORDER MARK}':
+                chunk = chunk[1:]
+        started = time.perf_counter()
+        try:
+            self.parser.feed(chunk)
+        except (UnicodeDecodeError, LookupError, etree.ParserError):
+            self.failed = True
+        self.parse_seconds += time.perf_counter() - started
+
+    def enough(self):
+        """Whether enough page text has been collected to stop downloading"""
+        return self.text_limit > 0 and self.extractor.text_length >= self.text_limit
+
+    def result(self, html, max_length=15000):
+        """extract_page output for the fed chunks, re-parsing html when nothing usable was fed"""
+        started = time.perf_counter()
+        try:
+            if self.started and not self.failed:
+                try:
+                    self.parser.close()
+                    return self.extractor.result(max_length, self.main_content)
+                except (UnicodeDecodeError, LookupError, etree.ParserError):
+                    pass
+            return extract_page(html, max_length, self.main_content)
+        finally:
+            self.parse_seconds += time.perf_counter() - started
@@ -1,17 +1,315 @@
+import asyncio
+import codecs
+import http.cookiejar
+import os
+import re
+import threading
+import time
+import httpx
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+from utils.concurrency import KeyedLimiter, host_of
+from utils.page_cache import get_page_cache
 
-def fetch_webpage(url):
-    """Fetch webpage HTML content from URL"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Encoding': ', '.join(ACCEPT_ENCODING.split(','))
+}
+
+FETCH_TIMEOUT = 30
+FETCH_PER_HOST = int(os.environ.get('FETCH_PER_HOST', 4))
+FETCH_POOL_HOSTS = int(os.environ.get('FETCH_POOL_HOSTS', 32))
+FETCH_POOL_SIZE = int(os.environ.get('FETCH_POOL_SIZE', 4))
+
+FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 5 * 1024 * 1024))
+FETCH_TEXT_LIMIT = int(os.environ.get('FETCH_TEXT_LIMIT', 128 * 1024))
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 1024
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16')
+)
+CONTENT_TYPE_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+async_clients = {}
+
+session = None
+session_lock = threading.Lock()
+host_limiter = KeyedLimiter(FETCH_PER_HOST)
+
+metrics = {
+    "requests": 0,
+    "new_connections": 0,
+    "host_waits": 0,
+    "host_wait_seconds": 0.0
+}
+metrics_lock = threading.Lock()
+
+def record(name, amount=1):
+    """Increment a fetch metric"""
+    with metrics_lock:
+        metrics[name] += amount
+
+def get_metrics():
+    """Snapshot of the fetch metrics, including how often a pooled connection was reused"""
+    with metrics_lock:
+        snapshot = dict(metrics)
+    reused = max(snapshot["requests"] - snapshot["new_connections"], 0)
+    snapshot["reused_connections"] = reused
+    snapshot["connection_reuse_ratio"] = reused / snapshot["requests"] if snapshot["requests"] else 0.0
+    return snapshot
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        record("new_connections")
+        return super()._new_conn()
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        record("new_connections")
+        return super()._new_conn()
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose keep-alive pools count the connections they open"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool
         }
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        return response.text
+
+def parse_host_pool_sizes(value):
+    """Parse FETCH_HOST_POOL_SIZES ("host=size,host=size") into a dict"""
+    sizes = {}
+    for part in (value or '').split(','):
+        host, _, size = part.partition('=')
+        if host.strip() and size.strip().isdigit():
+            sizes[host.strip().lower()] = int(size)
+    return sizes
+
+def create_session():
+    """Build a keep-alive session with per-host pool sizes and no cookie persistence"""
+    new_session = requests.Session()
+    new_session.headers.update(HEADERS)
+    new_session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    adapter = PooledAdapter(pool_connections=FETCH_POOL_HOSTS, pool_maxsize=FETCH_POOL_SIZE)
+    new_session.mount('http://', adapter)
+    new_session.mount('https://', adapter)
+    for host, size in parse_host_pool_sizes(os.environ.get('FETCH_HOST_POOL_SIZES')).items():
+        host_adapter = PooledAdapter(pool_connections=1, pool_maxsize=size)
+        new_session.mount(f'http://{host}/', host_adapter)
+        new_session.mount(f'https://{host}/', host_adapter)
+    return new_session
+
+def get_session():
+    """Get or initialize the shared HTTP session, whose connection pools are thread-safe"""
+    global session
+    with session_lock:
+        if session is None:
+            session = create_session()
+        return session
+
+def acquire_host(host):
+    """Wait for a per-host fetch slot, failing after FETCH_TIMEOUT seconds"""
+    if host_limiter.try_acquire(host):
+        return
+    record("host_waits")
+    started = time.monotonic()
+    acquired = host_limiter.acquire(host, FETCH_TIMEOUT)
+    record("host_wait_seconds", time.monotonic() - started)
+    if not acquired:
+        raise Exception(f"Failed to fetch webpage: too many concurrent fetches to {host}")
+
+async def acquire_host_async(host):
+    """Non-blocking acquire_host"""
+    if host_limiter.try_acquire(host):
+        return
+    record("host_waits")
+    started = time.monotonic()
+    acquired = await host_limiter.acquire_async(host, FETCH_TIMEOUT)
+    record("host_wait_seconds", time.monotonic() - started)
+    if not acquired:
+        raise Exception(f"Failed to fetch webpage: too many concurrent fetches to {host}")
+
+async def trace_connections(event, info):
+    """httpx trace hook counting newly opened connections"""
+    if event == "connection.connect_tcp.complete":
+        record("new_connections")
+
+def known_codec(name):
+    """Return name if Python can decode it, else None"""
+    try:
+        codecs.lookup(name)
+        return name
+    except LookupError:
+        return None
+
+def detect_charset(headers, head):
+    """Pick the body encoding: byte order mark, then Content-Type charset, then <meta> tag, then UTF-8"""
+    for bom, name in BOMS:
+        if head.startswith(bom):
+            return name
+    match = CONTENT_TYPE_CHARSET.search(headers.get('Content-Type') or '')
+    if match and known_codec(match.group(1)):
+        return match.group(1)
+    match = META_CHARSET.search(head[:4096])
+    if match and known_codec(match.group(1).decode('ascii', 'ignore')):
+        return match.group(1).decode('ascii')
+    return 'utf-8'
+
+class BodyReader:
+    """Decodes a streamed response body within a byte budget, passing the text to an optional sink
+
+    The sink (e.g. a StreamingExtractor) gets each decoded piece through feed() and can end
+    the download early by returning True from enough(); stopped then tells the body is partial.
+    """
+
+    def __init__(self, headers, sink=None, max_bytes=FETCH_MAX_BYTES):
+        self.headers = headers
+        self.sink = sink
+        self.max_bytes = max_bytes
+        self.head = b''
+        self.decoder = None
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+        self.stopped = False
+
+    def add(self, chunk):
+        """Take one downloaded chunk; return False once the download should stop"""
+        if self.max_bytes > 0 and self.size + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.size]
+            self.truncated = True
+        self.size += len(chunk)
+        if self.decoder is None:
+            self.head += chunk
+            if len(self.head) < SNIFF_BYTES and not self.truncated:
+                return True
+            chunk = self._start()
+        self._emit(self.decoder.decode(chunk))
+        self.stopped = self.truncated or (self.sink is not None and self.sink.enough())
+        return not self.stopped
+
+    def finish(self):
+        """Decode whatever is left and return the body text"""
+        chunk = self._start() if self.decoder is None else b''
+        self._emit(self.decoder.decode(chunk, final=True))
+        return ''.join(self.parts)
+
+    def _start(self):
+        charset = detect_charset(self.headers, self.head)
+        self.decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        head, self.head = self.head, b''
+        return head
+
+    def _emit(self, text):
+        if text:
+            self.parts.append(text)
+            if self.sink is not None:
+                self.sink.feed(text)
+
+def build_request_headers(cached):
+    """Request headers, with conditional validators when a stale cached copy exists"""
+    headers = dict(HEADERS)
+    if cached:
+        if cached["etag"]:
+            headers['If-None-Match'] = cached["etag"]
+        if cached["last_modified"]:
+            headers['If-Modified-Since'] = cached["last_modified"]
+    return headers
+
+def fetch_webpage(url, sink=None):
+    """Fetch webpage HTML content from URL, answering from the page cache when possible
+
+    The body is streamed, capped at FETCH_MAX_BYTES and fed to sink as it arrives. Only
+    complete bodies are cached; one cut short by the byte cap or by the sink is not.
+    """
+    cache = get_page_cache()
+    cached = cache.get(url)
+    if cached and cached["fresh"]:
+        cache.record("hits")
+        return cached["body"]
+    
+    host = host_of(url)
+    acquire_host(host)
+    try:
+        record("requests")
+        with get_session().get(url, headers=build_request_headers(cached), timeout=FETCH_TIMEOUT, stream=True) as response:
+            if cached and response.status_code == 304:
+                cache.revalidate(url, response.headers)
+                cache.record("revalidated")
+                return cached["body"]
+            response.raise_for_status()
+            reader = BodyReader(response.headers, sink)
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if not reader.add(chunk):
+                    break
+            body = reader.finish()
     except requests.RequestException as e:
         raise Exception(f"Failed to fetch webpage: {str(e)}")
+    finally:
+        host_limiter.release(host)
+    
+    cache.record("misses")
+    # A partial body must not be stored under the full page's validators
+    if not reader.stopped:
+        cache.put(url, body, response.headers)
+    return body
+
+def get_async_client():
+    """Get or initialize the non-blocking HTTP client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = async_clients.get(loop)
+    if client is None or client.is_closed:
+        for other_loop in [l for l in async_clients if l.is_closed()]:
+            del async_clients[other_loop]
+        limits = httpx.Limits(max_connections=FETCH_POOL_HOSTS * FETCH_POOL_SIZE,
+                              max_keepalive_connections=FETCH_POOL_HOSTS * FETCH_POOL_SIZE)
+        client = httpx.AsyncClient(timeout=FETCH_TIMEOUT, follow_redirects=True, limits=limits)
+        async_clients[loop] = client
+    return client
+
+async def fetch_webpage_async(url, sink=None):
+    """Non-blocking fetch_webpage for the ASGI app; sink and the page cache are used off the event loop"""
+    cache = get_page_cache()
+    cached = await asyncio.to_thread(cache.get, url)
+    if cached and cached["fresh"]:
+        cache.record("hits")
+        return cached["body"]
+    
+    host = host_of(url)
+    await acquire_host_async(host)
+    try:
+        record("requests")
+        async with get_async_client().stream('GET', url, headers=build_request_headers(cached),
+                                             extensions={"trace": trace_connections}) as response:
+            if cached and response.status_code == 304:
+                await asyncio.to_thread(cache.revalidate, url, response.headers)
+                cache.record("revalidated")
+                return cached["body"]
+            response.raise_for_status()
+            reader = BodyReader(response.headers, sink)
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                if not await asyncio.to_thread(reader.add, chunk):
+                    break
+            body = await asyncio.to_thread(reader.finish)
+    except httpx.HTTPError as e:
+        raise Exception(f"Failed to fetch webpage: {str(e)}")
+    finally:
+        host_limiter.release(host)
+    
+    cache.record("misses")
+    # A partial body must not be stored under the full page's validators
+    if not reader.stopped:
+        await asyncio.to_thread(cache.put, url, body, response.headers)
+    return body
 
 def get_page_title(html):
     """Extract page title from HTML"""
@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+DEFAULT_STORE_PATH = os.path.join(tempfile.gettempdir(), 'cogniparse_job_store.sqlite3')
+
+class SQLiteJobStore:
+    """Batch job state in a SQLite file, so every worker on the host can report on any job"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS job_items (
+            job_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            result TEXT,
+            error TEXT,
+            position INTEGER,
+            PRIMARY KEY (job_id, idx)
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS job_items_position ON job_items (job_id, position)")
+
+    def create(self, job_id, created_at, items):
+        """Store a new job and its pending items"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("INSERT INTO jobs VALUES (?, ?, NULL)", (job_id, created_at))
+                self.conn.executemany(
+                    "INSERT INTO job_items VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, NULL)",
+                    [(job_id, item["index"], item["url"], item["mode"], item["status"], item["attempts"]) for item in items]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def update_item(self, job_id, item, position=None):
+        """Record an item's status; position is its offset in completion order once it has completed"""
+        result = json.dumps(item["result"]) if item["result"] is not None else None
+        with self.lock:
+            self.conn.execute(
+                "UPDATE job_items SET status = ?, attempts = ?, result = ?, error = ?, position = ? WHERE job_id = ? AND idx = ?",
+                (item["status"], item["attempts"], result, item["error"], position, job_id, item["index"])
+            )
+
+    def finish(self, job_id, finished_at):
+        """Mark a job finished"""
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET finished_at = ? WHERE id = ?", (finished_at, job_id))
+
+    def summary(self, job_id):
+        """(created_at, finished_at, status counts, total, completed) of a job, or None if it is unknown"""
+        with self.lock:
+            row = self.conn.execute("SELECT created_at, finished_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            counts = dict(self.conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            completed = self.conn.execute(
+                "SELECT COUNT(*) FROM job_items WHERE job_id = ? AND position IS NOT NULL", (job_id,)
+            ).fetchone()[0]
+        return row[0], row[1], counts, sum(counts.values()), completed
+
+    def completed_items(self, job_id, since=0):
+        """Completed items of a job in completion order, starting at offset since"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT idx, url, mode, status, attempts, result, error FROM job_items "
+                "WHERE job_id = ? AND position >= ? ORDER BY position", (job_id, since)
+            ).fetchall()
+        return [
+            {"index": index, "url": url, "mode": mode, "status": status, "attempts": attempts,
+             "result": json.loads(result) if result is not None else None, "error": error}
+            for index, url, mode, status, attempts, result, error in rows
+        ]
+
+    def prune(self, cutoff):
+        """Forget jobs that finished before cutoff"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "DELETE FROM job_items WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)", (cutoff,)
+                )
+                self.conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+def create_job_store():
+    """Build the job store selected by the JOBS_STORE environment variable; None keeps jobs in process memory"""
+    backend = os.environ.get('JOBS_STORE', 'memory').lower()
+    if backend == 'memory':
+        return None
+    if backend == 'sqlite':
+        return SQLiteJobStore(path=os.environ.get('JOBS_STORE_PATH', DEFAULT_STORE_PATH))
+    raise ValueError(f"Unknown JOBS_STORE backend: {backend}")
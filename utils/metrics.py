@@ -0,0 +1,192 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+current_timings = contextvars.ContextVar('current_timings', default=None)
+current_operation = contextvars.ContextVar('current_operation', default='other')
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=None):
+    """Render a {name="value",...} label set"""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Prometheus-style cumulative histogram with a fixed set of labels"""
+
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation"""
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self, **labels):
+        """Number of observations in one series"""
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            return series["count"] if series else 0
+
+    def quantile(self, q, **labels):
+        """Estimated q-quantile of one series, interpolated within its bucket like PromQL's histogram_quantile; None if empty"""
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            if not series or not series["count"]:
+                return None
+            counts = list(series["counts"])
+            total = series["count"]
+        rank = q * total
+        lower = 0.0
+        below = 0
+        for bound, cumulative in zip(self.buckets, counts):
+            if cumulative >= rank:
+                inside = cumulative - below
+                return lower + (bound - lower) * ((rank - below) / inside if inside else 1.0)
+            lower, below = bound, cumulative
+        # The quantile lies in the +Inf bucket; the largest finite bound is the best estimate
+        return self.buckets[-1]
+
+    def render(self):
+        """Lines of the text exposition format"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((key, dict(value, counts=list(value["counts"]))) for key, value in self.series.items())
+        for key, data in series:
+            for bound, count in zip(self.buckets, data["counts"]):
+                labels = format_labels(self.labels, key, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {data['count']}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(data['sum'])}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {data['count']}")
+        return lines
+
+histograms = []
+collectors = []
+
+def histogram(name, help_text, labels=(), buckets=DURATION_BUCKETS):
+    """Create and register a histogram"""
+    new_histogram = Histogram(name, help_text, labels, buckets)
+    histograms.append(new_histogram)
+    return new_histogram
+
+def register_collector(collect):
+    """Register a function returning [(name, type, help, [(labels dict, value)])] read at scrape time"""
+    collectors.append(collect)
+
+def render_metrics():
+    """The whole registry in the Prometheus text exposition format"""
+    lines = []
+    for registered in histograms:
+        lines.extend(registered.render())
+    for collect in collectors:
+        for name, kind, help_text, samples in collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels.keys(), labels.values())} {format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+stage_seconds = histogram(
+    'cogniparse_stage_duration_seconds', 'Time spent in each pipeline stage', labels=('operation', 'stage')
+)
+request_seconds = histogram(
+    'cogniparse_request_duration_seconds', 'Time until the response headers were ready', labels=('endpoint',)
+)
+prompt_chars = histogram(
+    'cogniparse_prompt_chars', 'Characters sent to Gemini per call', labels=('operation',), buckets=SIZE_BUCKETS
+)
+response_chars = histogram(
+    'cogniparse_response_chars', 'Characters received from Gemini per call', labels=('operation',), buckets=SIZE_BUCKETS
+)
+
+def start_request_timings():
+    """Begin collecting stage timings for the current request and return the list they go into"""
+    timings = []
+    current_timings.set(timings)
+    return timings
+
+def record_stage(name, seconds, started=None):
+    """Record a stage duration in the histogram and in the current request's timings
+
+    The request's timings keep when the stage ran (perf_counter at its start, by default
+    seconds before now), so stages that ran side by side are not added up.
+    """
+    stage_seconds.observe(seconds, operation=current_operation.get(), stage=name)
+    timings = current_timings.get()
+    if timings is not None:
+        if started is None:
+            started = time.perf_counter() - seconds
+        timings.append((name, started, seconds))
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as a pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started, started)
+
+@contextmanager
+def operation(name):
+    """Label the stages recorded inside the block with an operation (analyze, chat, ...)"""
+    token = current_operation.set(name)
+    try:
+        yield
+    finally:
+        current_operation.reset(token)
+
+def wall_clock(intervals):
+    """Seconds covered by (start, seconds) intervals, counting overlaps once"""
+    covered = 0.0
+    end = None
+    for start, seconds in sorted(intervals):
+        if end is None or start > end:
+            covered += seconds
+            end = start + seconds
+        elif start + seconds > end:
+            covered += start + seconds - end
+            end = start + seconds
+    return covered
+
+def server_timing_header(timings, total=None):
+    """Server-Timing header value; a stage that ran more than once reports the wall-clock time it was running"""
+    intervals = {}
+    for name, started, seconds in timings:
+        intervals.setdefault(name, []).append((started, seconds))
+    totals = {name: wall_clock(spans) for name, spans in intervals.items()}
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(entries)
@@ -0,0 +1,195 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'cogniparse_page_cache.sqlite3')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 300
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def normalize_url(url):
+    """Normalize a URL so equivalent spellings share one cache entry"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into a dict of directives"""
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') or True
+    return directives
+
+def compute_expiry(headers, now, default_ttl):
+    """Work out until when a response may be served without revalidation"""
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return now
+    for name in ('s-maxage', 'max-age'):
+        if name in directives:
+            try:
+                return now + max(int(directives[name]), 0)
+            except (TypeError, ValueError):
+                return now
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return now
+    return now + default_ttl
+
+def is_storable(headers):
+    """Check whether a response may be stored at all"""
+    return 'no-store' not in parse_cache_control(headers.get('Cache-Control'))
+
+class PageCache:
+    """Disk-backed, size-bounded LRU cache of fetched pages with HTTP validators"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, default_ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+            url_key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            body TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            cache_control TEXT,
+            stored_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            size INTEGER NOT NULL
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+
+    def get(self, url):
+        """Return the cached entry for a URL (fresh or stale) or None"""
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, body, etag, last_modified, cache_control, stored_at, expires_at FROM pages WHERE url_key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE pages SET last_access = ? WHERE url_key = ?", (now, key))
+        return {
+            "url": row[0],
+            "body": row[1],
+            "etag": row[2],
+            "last_modified": row[3],
+            "cache_control": row[4],
+            "stored_at": row[5],
+            "expires_at": row[6],
+            "fresh": now < row[6]
+        }
+
+    def put(self, url, body, headers):
+        """Store a fetched page along with its validators"""
+        if self.max_bytes <= 0 or not is_storable(headers):
+            return
+        size = len(body.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), url, body, headers.get('ETag'), headers.get('Last-Modified'),
+                 headers.get('Cache-Control'), now, compute_expiry(headers, now, self.default_ttl), now, size)
+            )
+            self.stats["stores"] += 1
+            self._evict()
+
+    def revalidate(self, url, headers):
+        """Refresh an entry's freshness after the origin answered 304 Not Modified"""
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, cache_control FROM pages WHERE url_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return
+            etag = headers.get('ETag') or row[0]
+            last_modified = headers.get('Last-Modified') or row[1]
+            cache_control = headers.get('Cache-Control') or row[2]
+            merged = {'Cache-Control': cache_control, 'Expires': headers.get('Expires')}
+            self.conn.execute(
+                "UPDATE pages SET etag = ?, last_modified = ?, cache_control = ?, stored_at = ?, expires_at = ?, last_access = ? WHERE url_key = ?",
+                (etag, last_modified, cache_control, now, compute_expiry(merged, now, self.default_ttl), now, key)
+            )
+
+    def delete(self, url):
+        """Drop the entry for a URL"""
+        with self.lock:
+            self.conn.execute("DELETE FROM pages WHERE url_key = ?", (normalize_url(url),))
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.conn.execute("DELETE FROM pages")
+
+    def record(self, event):
+        """Increment one of the hit/miss counters"""
+        with self.lock:
+            self.stats[event] += 1
+
+    def get_stats(self):
+        """Return counters plus the current size of the cache"""
+        with self.lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["entries"] = entries
+        stats["bytes"] = total
+        stats["hit_ratio"] = (stats["hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+        return stats
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits its byte budget"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT url_key, size FROM pages ORDER BY last_access ASC").fetchall():
+            self.conn.execute("DELETE FROM pages WHERE url_key = ?", (key,))
+            self.stats["evictions"] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+page_cache = None
+page_cache_lock = threading.Lock()
+
+def get_page_cache():
+    """Get or initialize the shared page cache"""
+    global page_cache
+    with page_cache_lock:
+        if page_cache is None:
+            page_cache = PageCache(
+                path=os.environ.get('PAGE_CACHE_PATH', DEFAULT_CACHE_PATH),
+                max_bytes=int(os.environ.get('PAGE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+                default_ttl=int(os.environ.get('PAGE_CACHE_TTL', DEFAULT_TTL))
+            )
+        return page_cache
@@ -0,0 +1,189 @@
+import base64
+import zlib
+from array import array
+
+HEADING_LEVELS = ("h1", "h2", "h3", "h4", "h5", "h6")
+NO_ID = 0xFFFFFFFF
+ARRAY_FIELDS = (
+    "spans", "headings", "paragraphs", "list_items", "list_bounds", "cells", "row_bounds",
+    "table_bounds", "links", "section_heads", "section_paragraphs", "section_bounds"
+)
+FIELDS = ("title", "headings", "paragraphs", "lists", "tables", "links", "sections")
+STATE_ENCODING = "zlib"
+
+class StringTable:
+    """Assigns each distinct string an id and appends it once to a shared buffer"""
+
+    def __init__(self):
+        self.ids = {}
+        self.parts = []
+        self.spans = array('I', [0])
+
+    def add(self, text):
+        """Id of text, storing it on first sight"""
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.parts)
+            self.parts.append(text)
+            self.spans.append(self.spans[-1] + len(text))
+        return string_id
+
+def pack(data):
+    """bytes as zlib-compressed base64 text"""
+    return base64.b64encode(zlib.compress(data)).decode('ascii')
+
+def unpack(text):
+    """bytes back from pack"""
+    return zlib.decompress(base64.b64decode(text))
+
+def runs(groups, add):
+    """Flatten groups of strings into (ids, cumulative bounds)"""
+    ids = array('I')
+    bounds = array('I', [0])
+    for group in groups:
+        ids.extend(add(text) for text in group)
+        bounds.append(len(ids))
+    return ids, bounds
+
+class CompactPage:
+    """parse_webpage output packed into one deduplicated text buffer plus integer arrays
+
+    Every distinct string is stored once in text; string i is text[spans[i]:spans[i + 1]].
+    Records are runs of string ids in typed arrays, with cumulative bounds arrays for
+    variable-length groups. Fields are rebuilt into the usual dict shape only when read,
+    so the object can be handed to any code that calls parsed_content.get(...).
+    """
+
+    __slots__ = ("title", "base_url", "text") + ARRAY_FIELDS
+
+    @classmethod
+    def from_dict(cls, content):
+        """Pack a parse_webpage dictionary"""
+        strings = StringTable()
+        add = strings.add
+        page = cls.__new__(cls)
+        page.title = content.get("title", "")
+        page.base_url = content.get("base_url")
+
+        page.headings = array('I')
+        for heading in content.get("headings", []):
+            page.headings.extend((HEADING_LEVELS.index(heading["level"]), add(heading["text"]), add(heading["id"])))
+        page.paragraphs = array('I', (add(text) for text in content.get("paragraphs", [])))
+        page.list_items, page.list_bounds = runs(content.get("lists", []), add)
+        rows = [row for table in content.get("tables", []) for row in table]
+        page.cells, page.row_bounds = runs(rows, add)
+        page.table_bounds = array('I', [0])
+        for table in content.get("tables", []):
+            page.table_bounds.append(page.table_bounds[-1] + len(table))
+        page.links = array('I')
+        for link in content.get("links", []):
+            page.links.extend((add(link["text"]), add(link["url"])))
+        page.section_heads = array('I')
+        for section in content.get("sections", []):
+            section_id = add(section["id"]) if "id" in section else NO_ID
+            page.section_heads.extend((add(section["heading"]), section_id))
+        page.section_paragraphs, page.section_bounds = runs(
+            (section["content"] for section in content.get("sections", [])), add
+        )
+
+        page.text = ''.join(strings.parts)
+        page.spans = strings.spans
+        return page
+
+    def string(self, string_id):
+        """The string with this id"""
+        return self.text[self.spans[string_id]:self.spans[string_id + 1]]
+
+    def strings(self, ids, start=0, end=None):
+        """The strings for a slice of an id array"""
+        return [self.string(i) for i in ids[start:end]]
+
+    def get_headings(self):
+        """Headings as [{"level", "text", "id"}]"""
+        h = self.headings
+        return [
+            {"level": HEADING_LEVELS[h[i]], "text": self.string(h[i + 1]), "id": self.string(h[i + 2])}
+            for i in range(0, len(h), 3)
+        ]
+
+    def get_paragraphs(self):
+        """Paragraph texts"""
+        return self.strings(self.paragraphs)
+
+    def get_lists(self):
+        """Lists as lists of item texts"""
+        bounds = self.list_bounds
+        return [self.strings(self.list_items, bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+    def get_tables(self):
+        """Tables as lists of rows of cell texts"""
+        rows = [self.strings(self.cells, self.row_bounds[i], self.row_bounds[i + 1]) for i in range(len(self.row_bounds) - 1)]
+        bounds = self.table_bounds
+        return [rows[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    def get_links(self):
+        """Links as [{"text", "url"}]"""
+        links = self.links
+        return [{"text": self.string(links[i]), "url": self.string(links[i + 1])} for i in range(0, len(links), 2)]
+
+    def section(self, index):
+        """One section as {"heading", "id", "content"}, without building the others"""
+        heading_id, section_id = self.section_heads[2 * index], self.section_heads[2 * index + 1]
+        section = {"heading": self.string(heading_id)}
+        if section_id != NO_ID:
+            section["id"] = self.string(section_id)
+        section["content"] = self.strings(self.section_paragraphs, self.section_bounds[index], self.section_bounds[index + 1])
+        return section
+
+    def get_sections(self):
+        """Sections as [{"heading", "id", "content"}]"""
+        return [self.section(i) for i in range(len(self.section_heads) // 2)]
+
+    def get(self, key, default=None):
+        """Materialize one field of the parse_webpage dictionary"""
+        if key == "title":
+            return self.title
+        if key == "base_url":
+            return default if self.base_url is None else self.base_url
+        if key in FIELDS:
+            return getattr(self, f"get_{key}")()
+        return default
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self.get(key)
+
+    def __contains__(self, key):
+        return key in FIELDS or (key == "base_url" and self.base_url is not None)
+
+    def to_dict(self):
+        """The full parse_webpage dictionary"""
+        content = {key: self.get(key) for key in FIELDS}
+        if self.base_url is not None:
+            content["base_url"] = self.base_url
+        return content
+
+    def to_state(self):
+        """JSON-serializable form for the context store: the buffer and the arrays, each zlib-compressed"""
+        return {
+            "title": self.title,
+            "base_url": self.base_url,
+            "encoding": STATE_ENCODING,
+            "text": pack(self.text.encode('utf-8')),
+            "arrays": {name: pack(getattr(self, name).tobytes()) for name in ARRAY_FIELDS}
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a page stored with to_state, including the uncompressed states stored before it packed them"""
+        compressed = state.get("encoding") == STATE_ENCODING
+        page = cls.__new__(cls)
+        page.title = state["title"]
+        page.base_url = state["base_url"]
+        page.text = unpack(state["text"]).decode('utf-8') if compressed else state["text"]
+        for name in ARRAY_FIELDS:
+            values = array('I')
+            values.frombytes(unpack(state["arrays"][name]) if compressed else base64.b64decode(state["arrays"][name]))
+            setattr(page, name, values)
+        return page
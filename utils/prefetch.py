@@ -0,0 +1,181 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.cache import TTLCache
+from utils.concurrency import KeyedLimiter, host_of
+from utils.page_cache import normalize_url
+
+class PrefetchTask:
+    """One queued or running prefetch"""
+
+    def __init__(self, group):
+        self.group = group
+        self.future = None
+        self.cancelled = False
+
+class Prefetcher:
+    """Runs speculative per-URL work on a small background pool and holds the results until someone takes them
+
+    At most per_host tasks touch a host at once and at most max_queued wait; queuing more
+    drops the oldest waiting task, since newer links are the likelier next clicks.
+    overloaded(url) is asked before queuing and again before running, and a True answer
+    cancels everything still waiting, so speculative work gives way to real requests.
+    Results are single use: take() removes them.
+    """
+
+    def __init__(self, workers=2, max_queued=16, per_host=1, ttl=300, overloaded=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch') if workers > 0 else None
+        self.max_queued = max_queued
+        self.hosts = KeyedLimiter(per_host)
+        self.results = TTLCache(max_entries=max(max_queued, 1) * 4, ttl=ttl)
+        self.overloaded = overloaded or (lambda url: False)
+        self.tasks = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            "scheduled": 0, "completed": 0, "failed": 0, "cancelled": 0, "shed": 0, "host_busy": 0,
+            "hits": 0, "joined": 0, "misses": 0
+        }
+
+    def record(self, event, amount=1):
+        """Increment a prefetch counter"""
+        with self.lock:
+            self.stats[event] += amount
+
+    def submit(self, url, group, fn, *args):
+        """Queue fn(*args) to produce url's result; return whether it was queued"""
+        if self.executor is None:
+            return False
+        if self.overloaded(url):
+            self.record("shed")
+            self.cancel()
+            return False
+        key = normalize_url(url)
+        if self.results.get(key) is not None:
+            return False
+        with self.lock:
+            if key in self.tasks:
+                return False
+            queued = [(k, task) for k, task in self.tasks.items() if not task.future.running()]
+            for old_key, old_task in queued[:max(len(queued) - self.max_queued + 1, 0)]:
+                self._cancel(old_key, old_task)
+            task = self.tasks[key] = PrefetchTask(group)
+            task.future = self.executor.submit(self.run, key, url, task, fn, args)
+            self.stats["scheduled"] += 1
+        return True
+
+    def run(self, key, url, task, fn, args):
+        """Worker body: skip if cancelled, overloaded or the host is busy; otherwise store fn's result"""
+        try:
+            if task.cancelled:
+                return None
+            if self.overloaded(url):
+                self.record("shed")
+                self.cancel()
+                return None
+            host = host_of(url)
+            if not self.hosts.try_acquire(host):
+                self.record("host_busy")
+                return None
+            try:
+                result = fn(*args)
+            except Exception:
+                self.record("failed")
+                return None
+            finally:
+                self.hosts.release(host)
+            if task.cancelled:
+                return None
+            self.results.set(key, result)
+            self.record("completed")
+            return result
+        finally:
+            with self.lock:
+                if self.tasks.get(key) is task:
+                    del self.tasks[key]
+
+    def _cancel(self, key, task):
+        """Cancel one task; the lock must be held"""
+        task.cancelled = True
+        task.future.cancel()
+        del self.tasks[key]
+        self.stats["cancelled"] += 1
+
+    def cancel(self, group=None):
+        """Cancel the tasks of one group (all if None): waiting ones never run, running ones are discarded"""
+        with self.lock:
+            matching = [(key, task) for key, task in self.tasks.items() if group is None or task.group == group]
+            for key, task in matching:
+                self._cancel(key, task)
+            return len(matching)
+
+    def pending(self):
+        """Number of queued or running tasks"""
+        with self.lock:
+            return len(self.tasks)
+
+    def _lookup(self, url):
+        """(key, finished result, running future) for url"""
+        key = normalize_url(url)
+        result = self.results.get(key)
+        if result is not None:
+            self.results.delete(key)
+            return key, result, None
+        with self.lock:
+            task = self.tasks.get(key)
+            if task is None:
+                return key, None, None
+            if not task.future.running():
+                # Not started yet: the caller is about to do the work itself
+                self._cancel(key, task)
+                return key, None, None
+            return key, None, task.future
+
+    def _joined(self, key, finished):
+        """Result of a running task the caller waited for"""
+        if not finished:
+            self.record("misses")
+            return None
+        self.results.delete(key)
+        self.record("joined")
+        return finished
+
+    def take(self, url, wait=None):
+        """Remove and return url's prefetched result, waiting up to wait seconds for a running task; None on a miss"""
+        key, result, future = self._lookup(url)
+        if result is not None:
+            self.record("hits")
+            return result
+        if future is None:
+            self.record("misses")
+            return None
+        try:
+            finished = future.result(wait)
+        except Exception:
+            finished = None
+        return self._joined(key, finished)
+
+    async def take_async(self, url, wait=None):
+        """Non-blocking take"""
+        key, result, future = self._lookup(url)
+        if result is not None:
+            self.record("hits")
+            return result
+        if future is None:
+            self.record("misses")
+            return None
+        try:
+            finished = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), wait)
+        except Exception:
+            finished = None
+        return self._joined(key, finished)
+
+    def get_stats(self):
+        """Counters plus queue depth and how often prefetched results were used"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["pending"] = len(self.tasks)
+        used = stats["hits"] + stats["joined"]
+        lookups = used + stats["misses"]
+        stats["hit_ratio"] = used / lookups if lookups else 0.0
+        stats["used_ratio"] = min(used / stats["completed"], 1.0) if stats["completed"] else 0.0
+        return stats
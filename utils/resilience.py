@@ -0,0 +1,150 @@
+import asyncio
+import random
+import threading
+import time
+from utils.concurrency import WaitQueue
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate; a rate of 0 disables it"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take amount tokens, going into debt if needed; return seconds to wait before proceeding"""
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def debit(self, amount):
+        """Charge tokens after the fact (e.g. for generated output) without waiting"""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            self.tokens = max(self.tokens - amount, -self.capacity)
+
+class ConcurrencyLimiter:
+    """Counting semaphore on in-flight calls usable from threads and coroutines
+
+    Waiters are served in arrival order and woken when a slot is released.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.waiters = WaitQueue(self.lock)
+
+    def has_room(self):
+        return (self.limit <= 0 or self.in_flight < self.limit) and not self.waiters
+
+    def try_acquire(self):
+        """Take a slot without waiting; return whether it succeeded"""
+        with self.lock:
+            if not self.has_room():
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self):
+        """Wait for a free slot"""
+        with self.lock:
+            if self.has_room():
+                self.in_flight += 1
+                return
+            waiter = self.waiters.enqueue()
+        self.waiters.wait(waiter)
+
+    async def acquire_async(self):
+        """Wait for a free slot without blocking the event loop"""
+        with self.lock:
+            if self.has_room():
+                self.in_flight += 1
+                return
+            waiter = self.waiters.enqueue(asyncio.get_running_loop())
+        await self.waiters.wait_async(waiter, self.release)
+
+    def release(self):
+        """Give a slot back, handing it to the oldest waiter if there is one"""
+        with self.lock:
+            if not self.waiters.wake_next():
+                self.in_flight -= 1
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, then lets a single trial call through"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may proceed right now"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def retry_in(self):
+        """Seconds until an open breaker lets a trial call through"""
+        with self.lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """Let another call be the trial when the trial ended without telling whether the upstream recovered
+
+        Used when a call is cancelled or fails in a way that says nothing about the upstream
+        (e.g. a rejected prompt); in the closed or open state it changes nothing.
+        """
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+
+def backoff_delay(attempt, base=0.5, cap=20.0, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than a server-provided retry-after"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
@@ -0,0 +1,117 @@
+import hashlib
+
+LINK_LIMIT = 50
+# Changed blocks longer than this are described by their changed lines rather than in full
+CONDENSE_CHARS = 1500
+
+def normalize(text):
+    """Collapse whitespace and case so trivially different copies of a text compare equal"""
+    return ' '.join(text.split()).lower()
+
+def digest(text):
+    """Short content hash of a block"""
+    return hashlib.sha256(normalize(text).encode('utf-8')).hexdigest()[:16]
+
+def page_blocks(parsed_content, text_content):
+    """The page cut into diffable blocks, each {"key", "title", "text", "hash"}
+
+    Blocks are the title, each section (keyed by its id or heading), table (keyed by its
+    first row), list (by its first item), the leading links, and any page text outside
+    those, grouped under the heading it follows. Keys stay put when only the content
+    changes, so a diff can tell a changed section from an added or removed one.
+    """
+    blocks = []
+    counts = {}
+
+    def add(kind, name, title, text):
+        key = f"{kind}:{normalize(name)[:80]}"
+        counts[key] = counts.get(key, 0) + 1
+        if counts[key] > 1:
+            key = f"{key}#{counts[key]}"
+        blocks.append({"key": key, "title": title, "text": text, "hash": digest(f"{title}\n{text}")})
+
+    title = parsed_content.get("title", "")
+    add("title", "", "Page title", title)
+    covered = {normalize(title)}
+    for section in parsed_content.get("sections", []):
+        heading = section.get("heading") or "Introduction"
+        add("section", section.get("id") or heading, heading, '\n'.join(section.get("content", [])))
+        covered.update(normalize(paragraph) for paragraph in section.get("content", []))
+    for table in parsed_content.get("tables", []):
+        header = ' | '.join(table[0])
+        add("table", header, f"Table: {header[:60]}", '\n'.join(' | '.join(row) for row in table))
+        covered.update(normalize(cell) for row in table for cell in row)
+    for items in parsed_content.get("lists", []):
+        add("list", items[0], f"List: {items[0][:60]}", '\n'.join(f"- {item}" for item in items))
+        covered.update(normalize(item) for item in items)
+
+    seen_urls = set()
+    links = []
+    for link in parsed_content.get("links", []):
+        if link["url"] not in seen_urls and len(links) < LINK_LIMIT:
+            seen_urls.add(link["url"])
+            links.append(f"- {link['text']}: {link['url']}")
+    add("links", "", "Links on page", '\n'.join(links))
+
+    headings = {normalize(h["text"]): h["text"] for h in parsed_content.get("headings", [])}
+    covered_text = '\n'.join(covered)
+    loose = {}
+    current = "Introduction"
+    for line in text_content.splitlines():
+        key = normalize(line)
+        if key in headings:
+            current = headings[key]
+            continue
+        if len(key) < 3 or key in covered or key in covered_text:
+            continue
+        loose.setdefault(current, []).append(line.strip())
+    for heading, lines in loose.items():
+        add("text", heading, f"Text under {heading}", '\n'.join(lines))
+    return blocks
+
+def block_hashes(blocks):
+    """{key: hash} of a page's blocks, the form kept with an analysis"""
+    return {block["key"]: block["hash"] for block in blocks}
+
+def changed_lines(old_text, new_text):
+    """Only the lines that differ between two versions of a block"""
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+    old_set = set(old_lines)
+    new_set = set(new_lines)
+    added = [line for line in new_lines if line not in old_set]
+    removed = [line for line in old_lines if line not in new_set]
+    parts = []
+    if added:
+        parts.append("Added or changed lines:\n" + '\n'.join(added))
+    if removed:
+        parts.append("Lines no longer on the page:\n" + '\n'.join(removed))
+    return '\n'.join(parts)
+
+def diff_blocks(previous_hashes, blocks, previous_blocks=None):
+    """Compare blocks with the hashes stored for the previous version of the page
+
+    Returns {"changed": [block], "added": [block], "removed": [key]}. Given the previous
+    version's blocks, changed blocks longer than CONDENSE_CHARS only carry their
+    changed lines as text.
+    """
+    old_texts = {block["key"]: block["text"] for block in previous_blocks or []}
+    current = set()
+    changed = []
+    added = []
+    for block in blocks:
+        current.add(block["key"])
+        previous = previous_hashes.get(block["key"])
+        if previous is None:
+            added.append(block)
+        elif previous != block["hash"]:
+            if len(block["text"]) > CONDENSE_CHARS and block["key"] in old_texts:
+                block = dict(block, text=changed_lines(old_texts[block["key"]], block["text"]) or block["text"])
+            changed.append(block)
+    removed = [key for key in previous_hashes if key not in current]
+    return {"changed": changed, "added": added, "removed": removed}
+
+def removed_title(key):
+    """Readable name of a removed block, recovered from its key"""
+    kind, _, name = key.partition(':')
+    return f"{kind}: {name.split('#')[0]}" if name else kind
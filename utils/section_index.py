@@ -0,0 +1,106 @@
+import difflib
+import re
+from utils.page_model import CompactPage
+
+MATCH_CUTOFF = 0.8
+SECTION_TEXT_LIMIT = 4000
+
+# Result fields that describe the response rather than the page
+META_FIELDS = frozenset(("url", "mode", "cached", "page_title", "transformed_html", "actions", "revision", "changed_sections"))
+FIELD_TITLES = {"kpis": "KPIs", "usp": "Unique Selling Points", "swot": "SWOT"}
+ACTION_PREFIX = re.compile(r'^(view|show|see|open|go to|jump to|read)\s+')
+
+def normalize(text):
+    """Lowercase words without punctuation, a leading action verb or plural endings"""
+    text = re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).strip()
+    text = ACTION_PREFIX.sub('', text)
+    return ' '.join(word[:-1] if len(word) > 3 and word.endswith('s') else word for word in text.split())
+
+def format_item(item):
+    """One list entry as text; objects become 'first: rest, ...'"""
+    if not isinstance(item, dict):
+        return str(item)
+    values = [', '.join(map(str, v)) if isinstance(v, list) else str(v) for v in item.values() if v]
+    if len(values) > 1:
+        return f"{values[0]}: {', '.join(values[1:])}"
+    return values[0] if values else ""
+
+def format_value(value):
+    """Plain-text (markdown) rendering of a result field"""
+    if isinstance(value, dict):
+        return '\n\n'.join(
+            f"{key.replace('_', ' ').title()}:\n{format_value(item)}" for key, item in value.items() if item
+        )
+    if isinstance(value, list):
+        return '\n'.join(f"- {format_item(item)}" for item in value if item)
+    return str(value)
+
+def has_content(value):
+    """Whether a field holds anything worth showing"""
+    if isinstance(value, dict):
+        return any(has_content(item) for item in value.values())
+    return bool(value)
+
+def build_section_index(parsed_content, results):
+    """JSON-serializable list of each mode's result fields and the page's sections, with normalized names"""
+    entries = []
+    for mode, result in results.items():
+        labels = {}
+        for action in result.get("actions") or []:
+            if isinstance(action, dict) and action.get("section_id") and action.get("label"):
+                labels.setdefault(action["section_id"], []).append(action["label"])
+        for field, value in result.items():
+            if field in META_FIELDS or not has_content(value):
+                continue
+            names = {normalize(field)} | {normalize(label) for label in labels.get(field, [])}
+            entries.append({
+                "names": sorted(name for name in names if name),
+                "mode": mode,
+                "title": FIELD_TITLES.get(field, field.replace('_', ' ').title()),
+                "text": format_value(value)
+            })
+
+    for position, section in enumerate(parsed_content.get("sections", [])):
+        if not section.get("content"):
+            continue
+        names = {normalize(section.get("heading", "")), normalize(section.get("id", ""))}
+        entries.append({
+            "names": sorted(name for name in names if name),
+            "mode": None,
+            "title": section.get("heading") or "Introduction",
+            "section": position
+        })
+    return entries
+
+def entry_text(entry, page_state):
+    """Text of a matched entry; page sections are read from the stored page rather than copied into the index"""
+    if "text" in entry:
+        return entry["text"]
+    section = CompactPage.from_state(page_state).section(entry["section"])
+    return '\n'.join(section["content"])[:SECTION_TEXT_LIMIT]
+
+def lookup(index, label, section_id=None, mode=None, cutoff=MATCH_CUTOFF):
+    """Entry best matching an action's section id or label, or None if nothing is close enough
+
+    Exact normalized matches score 1, others their difflib ratio; the mode's own
+    result fields win ties against page sections.
+    """
+    queries = {normalize(query) for query in (section_id, label) if query}
+    matchers = [difflib.SequenceMatcher(None, '', query) for query in queries if query]
+    best = None
+    best_key = None
+    for entry in index:
+        if entry["mode"] not in (None, mode):
+            continue
+        for name in entry["names"]:
+            for matcher in matchers:
+                matcher.set_seq1(name)
+                score = 1.0 if name == matcher.b else 0.0
+                if not score and matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                    score = matcher.ratio()
+                if score < cutoff:
+                    continue
+                key = (score, entry["mode"] is not None)
+                if best_key is None or key > best_key:
+                    best, best_key = entry, key
+    return best
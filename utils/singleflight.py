@@ -0,0 +1,104 @@
+import asyncio
+import copy
+import threading
+from utils.metrics import stage
+
+class Flight:
+    """One in-flight computation shared by every caller with the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into a single execution
+
+    The first caller (the leader) runs the function; callers arriving while it is in
+    flight wait for it and get a copy of its result, or its exception. Once it
+    finishes the key is forgotten, so later calls run again. Waiters give up after
+    timeout seconds with a TimeoutError; the leader itself is never interrupted. A
+    waiter's wait is timed as its request's coalesced stage.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.flights = {}
+        self.tasks = {}
+        self.lock = threading.Lock()
+        self.stats = {"leaders": 0, "coalesced": 0, "timeouts": 0}
+
+    def do(self, key, fn, *args):
+        """Run fn(*args), or wait for the identical call already running"""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+                self.stats["leaders"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if leader:
+            try:
+                flight.result = fn(*args)
+            except Exception as e:
+                flight.error = e
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.done.set()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        with stage("coalesced"):
+            finished = flight.done.wait(self.timeout)
+        if not finished:
+            self._timed_out()
+        if flight.error is not None:
+            raise flight.error
+        return copy.deepcopy(flight.result)
+
+    async def do_async(self, key, fn, *args):
+        """Await fn(*args), or the identical coroutine already running on this event loop"""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            task = self.tasks.get(key)
+            leader = task is None or task.get_loop() is not loop
+            if leader:
+                task = loop.create_task(fn(*args))
+                self.tasks[key] = task
+                task.add_done_callback(lambda done: self._forget_task(key, done))
+                self.stats["leaders"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if leader:
+            return await asyncio.shield(task)
+        try:
+            with stage("coalesced"):
+                result = await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            self._timed_out()
+        return copy.deepcopy(result)
+
+    def get_stats(self):
+        """Counters plus the number of computations currently in flight"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self.flights) + len(self.tasks)
+        return stats
+
+    def _timed_out(self):
+        with self.lock:
+            self.stats["timeouts"] += 1
+        raise TimeoutError(f"Timed out after {self.timeout}s waiting for an identical request in progress")
+
+    def _forget_task(self, key, task):
+        with self.lock:
+            if self.tasks.get(key) is task:
+                del self.tasks[key]
+        if not task.cancelled():
+            task.exception()
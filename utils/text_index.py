@@ -0,0 +1,181 @@
+import base64
+import math
+import re
+import zlib
+from array import array
+from collections import Counter
+
+DEFAULT_CHUNK_CHARS = 1200
+# Section position of a chunk ref into the lines no section covers
+LOOSE = -1
+# Postings at least this long are stored compressed
+PACK_POSTINGS = 32
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'\w+')
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my of on or our so than that the their them then there these they this to was we
+were what when where which who why will with you your about please tell explain
+""".split())
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+def make_piece(parts, first, last, start):
+    """A piece of grouped paragraph text with its location (see split_paragraphs)"""
+    text = '\n'.join(parts)
+    return text, [first, last, start, start + len(text)]
+
+def split_paragraphs(paragraphs, max_chars):
+    """Group consecutive paragraphs into pieces of at most max_chars, splitting oversized ones
+
+    Returns (text, location) pairs. A location [first, last, start, end] finds the text
+    again as '\n'.join(paragraphs[first:last])[start:end], so it can be stored in place
+    of the text wherever the paragraphs are kept anyway.
+    """
+    pieces = []
+    current = []
+    size = 0
+    first = start = 0
+    for i, paragraph in enumerate(paragraphs):
+        offset = 0
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                pieces.append(make_piece(current, first, i, start))
+                current, size = [], 0
+            pieces.append((paragraph[:cut], [i, i + 1, offset, offset + cut]))
+            rest = paragraph[cut:]
+            paragraph = rest.lstrip()
+            offset += cut + len(rest) - len(paragraph)
+        if current and (not paragraph or size + len(paragraph) > max_chars):
+            pieces.append(make_piece(current, first, i, start))
+            current, size = [], 0
+        if paragraph:
+            if not current:
+                first, start = i, offset
+            current.append(paragraph)
+            size += len(paragraph) + 1
+    if current:
+        pieces.append(make_piece(current, first, len(paragraphs), start))
+    return pieces
+
+def uncovered_lines(parsed_content, text_content):
+    """Lines of text_content that no section of the page covers"""
+    covered = '\n'.join(paragraph for section in parsed_content.get('sections', []) for paragraph in section.get('content', []))
+    return [line.strip() for line in text_content.splitlines() if line.strip() and line.strip() not in covered]
+
+def build_chunks(parsed_content, text_content, max_chars=DEFAULT_CHUNK_CHARS, loose=None):
+    """Cut a page into section-aligned chunks, plus chunks of the text no section covered
+
+    Every chunk carries a "ref" to where its text sits (see split_paragraphs): [section,
+    first, last, start, end] in the page's sections, or [LOOSE, first, last, start, end]
+    in the uncovered lines, which may be passed in as loose if already known.
+    """
+    chunks = []
+    for position, section in enumerate(parsed_content.get('sections', [])):
+        for text, location in split_paragraphs(section.get('content', []), max_chars):
+            chunks.append({"heading": section.get('heading', ''), "id": section.get('id', ''), "text": text, "ref": [position] + location})
+
+    if loose is None:
+        loose = uncovered_lines(parsed_content, text_content)
+    for text, location in split_paragraphs(loose, max_chars):
+        chunks.append({"heading": "", "id": "", "text": text, "ref": [LOOSE] + location})
+    return chunks
+
+def pack_postings(flat):
+    """A term's postings for the index: long ones zlib-compressed as base64 text, short ones as the list"""
+    if len(flat) < PACK_POSTINGS:
+        return flat
+    return base64.b64encode(zlib.compress(array('I', flat).tobytes())).decode('ascii')
+
+def build_index(chunks, loose=()):
+    """Build a JSON-serializable BM25 inverted index over chunks
+
+    Each term's postings are one flat [chunk, tf, chunk, tf, ...] list rather than a
+    list of pairs, and long ones are packed (see pack_postings), which keeps a stored
+    index several times smaller. Chunks are stored as their ref alone: section text is
+    read from the page stored next to the index, and loose refs from the uncovered
+    lines, kept in the index once.
+    """
+    postings = {}
+    lengths = []
+    for i, chunk in enumerate(chunks):
+        terms = Counter(tokenize(chunk["heading"] + ' ' + chunk["text"]))
+        lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            postings.setdefault(term, []).extend((i, tf))
+    return {
+        "chunks": [chunk["ref"] for chunk in chunks],
+        "loose": list(loose),
+        "postings": {term: pack_postings(flat) for term, flat in postings.items()},
+        "lengths": lengths,
+        "avg_length": sum(lengths) / len(lengths) if lengths else 0.0
+    }
+
+def index_page(parsed_content, text_content, max_chars=DEFAULT_CHUNK_CHARS):
+    """BM25 index over a page's chunks, with the uncovered lines its loose refs need"""
+    loose = uncovered_lines(parsed_content, text_content)
+    return build_index(build_chunks(parsed_content, text_content, max_chars, loose), loose)
+
+def resolve_chunk(stored, page, loose=()):
+    """A stored index chunk as {"heading", "id", "text"}; section refs are read from page (a CompactPage)"""
+    if isinstance(stored, dict):
+        return stored
+    position, first, last, start, end = stored
+    if position == LOOSE:
+        return {"heading": "", "id": "", "text": '\n'.join(loose[first:last])[start:end]}
+    section = page.section(position)
+    text = '\n'.join(section["content"][first:last])[start:end]
+    return {"heading": section["heading"], "id": section.get("id", ""), "text": text}
+
+def index_chunks(index, page, positions=None):
+    """Resolved chunks of an index: the given positions, else all of them in page order"""
+    chunks = index.get("chunks", [])
+    if positions is None:
+        positions = range(len(chunks))
+    loose = index.get("loose", ())
+    return [resolve_chunk(chunks[i], page, loose) for i in positions]
+
+def term_postings(stored):
+    """A term's flat chunk, tf, ... postings from the index, unpacking packed ones"""
+    if isinstance(stored, list):
+        return stored
+    postings = array('I')
+    postings.frombytes(zlib.decompress(base64.b64decode(stored)))
+    return postings
+
+def search(index, query, k=4, page=None):
+    """Return the k chunks scoring highest for query under BM25, best first; page resolves stored refs"""
+    chunks = index.get("chunks", [])
+    if not chunks:
+        return []
+    scores = {}
+    total = len(chunks)
+    avg_length = index["avg_length"] or 1.0
+    for term in set(tokenize(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        postings = term_postings(postings)
+        df = len(postings) // 2
+        idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        for i, tf in zip(postings[::2], postings[1::2]):
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * index["lengths"][i] / avg_length)
+            scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+    best = sorted(scores, key=lambda i: (-scores[i], i))[:k]
+    return index_chunks(index, page, best)
+
+def format_chunks(chunks):
+    """Render chunks for a prompt, labelled with their section heading"""
+    blocks = []
+    for chunk in chunks:
+        if chunk["heading"]:
+            blocks.append(f"## {chunk['heading']}\n{chunk['text']}")
+        else:
+            blocks.append(chunk["text"])
+    return '\n\n'.join(blocks)